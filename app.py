@@ -1,11 +1,58 @@
+import argparse
 import os
 from pathlib import Path
 from src.assistants.query_assistant import QueryAssistant
 from src.config.config import Config
 
 
+def parse_args() -> argparse.Namespace:
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="Hybrid RAG query system")
+    parser.add_argument("--serve", action="store_true", help="Run as HTTP service instead of interactive CLI")
+    parser.add_argument("--host", default=os.getenv('SERVICE_HOST', '127.0.0.1'), help="HTTP service host")
+    parser.add_argument("--port", type=int, default=int(os.getenv('SERVICE_PORT', '8000')), help="HTTP service port")
+    parser.add_argument("--workers", type=int, default=int(os.getenv('SERVICE_WORKERS', '1')),
+                        help="Number of HTTP service worker processes sharing one text index in shared memory")
+    parser.add_argument("--index-shard", metavar="NUMBER/COUNT",
+                        help="Run as index shard server owning one slice of the prepared articles, e.g. 0/4")
+    parser.add_argument("--add-articles", type=Path, metavar="FILE",
+                        help="Add or replace articles from a JSON or JSONL file with id, title and text in the text segments")
+    parser.add_argument("--delete-articles", metavar="IDS", help="Delete comma separated article ids from the text segments")
+    parser.add_argument("--export-snapshot", type=Path, metavar="FILE",
+                        help="Package the prepared data into a compressed snapshot for installing on other nodes")
+    parser.add_argument("--advise-indexes", action="store_true",
+                        help="Propose indexes for the logged SQL workload, validated with timings on a working copy of the database")
+    parser.add_argument("--apply-indexes", action="store_true", help="Create the indexes proposed by --advise-indexes in the database")
+    parser.add_argument("--replay", type=Path, metavar="QUERY_LOG",
+                        help="Replay the questions of a query log with the recorded API responses and report the local stage timings")
+    parser.add_argument("--baseline", type=Path, metavar="REPORT", help="Replay or benchmark report of an earlier run to compare the timings with")
+    parser.add_argument("--benchmark-search", metavar="SIZES",
+                        help="Measure index load and search on synthetic corpora of comma separated chunk counts, without API calls")
+    parser.add_argument("--benchmark-dimensions", type=int, default=1536, help="Embedding dimensions of the synthetic corpora")
+    parser.add_argument("--evaluate-recall", type=Path, metavar="QUESTIONS",
+                        help="Measure recall and latency of the approximate semantic search settings against the exact search for questions from a JSONL or CSV file")
+    parser.add_argument("--top-k", type=int, default=10, help="Number of search results compared with the exact search by --evaluate-recall")
+    parser.add_argument("--prepare-only", action="store_true",
+                        help="Prepare the data the application needs and report the duration of each preparation stage")
+    parser.add_argument("--batch", type=Path, metavar="INPUT", help="Answer questions from a JSONL or CSV file")
+    parser.add_argument("--output", type=Path, help="JSONL output file for batch mode, resumed if it exists, or JSON report file for replay, benchmark and recall evaluation")
+    parser.add_argument("--concurrency", type=int, default=4, help="Number of questions processed at the same time in batch mode")
+    return parser.parse_args()
+
+
+def parse_rate_limits(value: str) -> dict[str, tuple[int, int]]:
+    """Parse rate limits in format 'model=rpm:tpm,model=rpm:tpm'."""
+    limits = {}
+    for item in filter(None, (part.strip() for part in value.split(','))):
+        model, limit = item.split('=')
+        requests_per_minute, tokens_per_minute = limit.split(':')
+        limits[model.strip()] = (int(requests_per_minute), int(tokens_per_minute))
+    return limits
+
+
 def main():
     """Main entry point for the application."""
+    args = parse_args()
 
     folder_data = Path(__file__).parent / "data"
     folder_ready = folder_data / "ready"
@@ -24,14 +71,117 @@ def main():
         file_articles_sentences=folder_ready / "articles_by_sentence_with_embeddings.json",
         file_articles_length=folder_ready / "articles_by_length_with_embeddings.json",
         file_articles_raw=folder_ready / 'articles_raw.json',
+        file_articles_idf=folder_ready / 'articles_idf.json',
         sql_search_debug=os.getenv('SQL_SEARCH_DEBUG', 'false').lower() in ('true', '1', 'yes'),
         text_search_debug=os.getenv('TEXT_SEARCH_DEBUG', 'false').lower() in ('true', '1', 'yes'),
+        use_combined_planner=os.getenv('USE_COMBINED_PLANNER', 'false').lower() in ('true', '1', 'yes'),
+        text_fast_mode=os.getenv('TEXT_FAST_MODE', 'false').lower() in ('true', '1', 'yes'),
+        expansion_latency_budget=float(os.getenv('EXPANSION_LATENCY_BUDGET', '0')) or None,
+        embeddings_batch_wait=float(os.getenv('EMBEDDINGS_BATCH_WAIT_MS', '0')) / 1000 or None,
+        rate_limits=parse_rate_limits(os.getenv('OPENAI_RATE_LIMITS', '')),
+        semantic_search_shards=int(os.getenv('SEMANTIC_SEARCH_SHARDS', '1')),
+        text_index_shards=[url.strip() for url in os.getenv('TEXT_INDEX_SHARDS', '').split(',') if url.strip()],
+        text_local_shards=int(os.getenv('TEXT_LOCAL_SHARDS', '0')),
+        shard_timeout=float(os.getenv('SHARD_TIMEOUT', '2.0')),
+        semantic_aggregation=os.getenv('SEMANTIC_AGGREGATION') or None,
+        folder_text_segments=folder_ready / "segments",
+        folder_text_index=folder_ready / "text_index",
+        file_index_snapshot=Path(os.getenv('INDEX_SNAPSHOT')) if os.getenv('INDEX_SNAPSHOT') else None,
+        coarse_dimensions=int(os.getenv('COARSE_DIMENSIONS', '0')) or None,
+        coarse_method=os.getenv('COARSE_METHOD', 'truncate'),
+        coarse_candidates=int(os.getenv('COARSE_CANDIDATES', '200')),
+        file_sql_workload=folder_ready / "sql_workload.jsonl" if os.getenv('SQL_WORKLOAD_LOG', 'false').lower() in ('true', '1', 'yes') else None,
+        sql_auto_index=os.getenv('SQL_AUTO_INDEX', 'false').lower() in ('true', '1', 'yes'),
+        sql_auto_index_queries=int(os.getenv('SQL_AUTO_INDEX_QUERIES', '100')),
+        file_query_log=folder_ready / "query_log.jsonl" if os.getenv('QUERY_LOG', 'false').lower() in ('true', '1', 'yes') else None,
+        sql_summary_tables=os.getenv('SQL_SUMMARY_TABLES', 'true').lower() in ('true', '1', 'yes'),
+        hedge_percentile=float(os.getenv('HEDGE_PERCENTILE', '0')) or None,
+        speculative_retrieval=os.getenv('SPECULATIVE_RETRIEVAL', 'false').lower() in ('true', '1', 'yes'),
+        profile_questions=int(os.getenv('PROFILE_QUESTIONS', '0')),
+        coarse_quantization=os.getenv('COARSE_QUANTIZATION') or None,
     )
 
     try:
+        if args.export_snapshot:
+            from src.data_processing.index_snapshot import IndexSnapshot
+            IndexSnapshot(config).export(args.export_snapshot)
+            return
+
+        if args.prepare_only:
+            from openai import OpenAI
+            from src.data_processing.prep_pipeline import PrepPipeline
+            from src.models.rate_limiter import PRIORITY_BULK, RateLimiter
+            client = RateLimiter(config.rate_limits, max_retries=config.api_max_retries).client(
+                OpenAI(api_key=config.open_ai_api_key, max_retries=0), PRIORITY_BULK)
+            PrepPipeline.for_config(client, config).run(PrepPipeline.targets(config), report=True)
+            return
+
+        if args.benchmark_search:
+            from src.service.search_benchmark import SearchBenchmark
+            sizes = [int(size) for size in args.benchmark_search.split(',') if size.strip()]
+            SearchBenchmark(config, folder_data / "benchmark", dimensions=args.benchmark_dimensions).run(sizes, args.output, args.baseline)
+            return
+
+        if args.evaluate_recall:
+            from src.service.recall_benchmark import RecallBenchmark
+            RecallBenchmark(config, args.evaluate_recall, top_k=args.top_k).run(args.output)
+            return
+
+        if args.advise_indexes or args.apply_indexes:
+            from src.assistants.sql_index_advisor import SqlIndexAdvisor, SqlWorkloadLog
+            workload = SqlWorkloadLog(folder_ready / "sql_workload.jsonl").read()
+            if not workload:
+                print("No logged SQL queries, set SQL_WORKLOAD_LOG=true to log them")
+                return
+            advisor = SqlIndexAdvisor(config.file_db, folder_ready / "northwind_advisor.db")
+            proposals = advisor.analyze(workload)
+            advisor.print_report(proposals)
+            if args.apply_indexes and proposals:
+                advisor.apply(proposals)
+            return
+
+        if args.replay:
+            from src.service.workload_replay import WorkloadReplay
+            WorkloadReplay(config, args.replay).run(args.output, args.baseline)
+            return
+
+        if args.add_articles or args.delete_articles:
+            from src.data_processing.text_data_preparator import TextDataPreparator
+            client = None
+            if args.add_articles:
+                from openai import OpenAI
+                client = OpenAI(api_key=config.open_ai_api_key)
+            preparator = TextDataPreparator(client, config)
+            if args.delete_articles:
+                preparator.delete_articles([article_id.strip() for article_id in args.delete_articles.split(',') if article_id.strip()])
+            if args.add_articles:
+                preparator.add_articles(preparator.read_articles(args.add_articles))
+            return
+
+        if args.index_shard:
+            from src.service.index_shard_server import IndexShardServer, load_shard_index
+            shard_number, shard_count = (int(part) for part in args.index_shard.split('/'))
+            server = IndexShardServer(load_shard_index(config, shard_number, shard_count), host=args.host, port=args.port)
+            server.watch_segments(config, shard_number, shard_count)
+            server.serve_forever()
+            return
+
+        if args.serve and args.workers > 1:
+            from src.service.query_service import serve_with_workers
+            serve_with_workers(config, args.host, args.port, args.workers)
+            return
+
         # Initialize and run the query assistant
         assistant = QueryAssistant(config=config)
-        assistant.run()
+        if args.serve:
+            from src.service.query_service import QueryService
+            QueryService(assistant, host=args.host, port=args.port).serve_forever()
+        elif args.batch:
+            from src.service.batch_runner import BatchRunner
+            output = args.output or args.batch.with_suffix('.answers.jsonl')
+            BatchRunner(assistant, concurrency=args.concurrency).run(args.batch, output)
+        else:
+            assistant.run()
     except Exception as e:
         print(f"An unexpected error occurred: {e}")
         raise
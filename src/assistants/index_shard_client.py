@@ -0,0 +1,89 @@
+import threading
+from concurrent.futures import Future, wait
+
+import numpy as np
+import requests
+
+
+class IndexShardClient:
+    """Scatter-gather client sending searches to all index shard servers and merging their top-k results."""
+
+    def __init__(self, urls: list[str], timeout: float = 2.0):
+        """
+        Initialize the IndexShardClient.
+
+        Args:
+            urls: Base URLs of the shard servers
+            timeout: Seconds to wait for each shard, slower shards are left out of the results
+        """
+        self.urls = urls
+        self.timeout = timeout
+
+    def _search_shard(self, url: str, payload: dict) -> dict:
+        """Send the search to one shard."""
+        response = requests.post(f"{url}/search", json=payload, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def _start_search(self, url: str, payload: dict) -> Future:
+        """
+        Send the search to one shard from its own thread, started right away, so the timeout counts from sending the request.
+        A shared pool would queue the requests of concurrent questions behind each other and behind slow shards.
+        """
+        future = Future()
+
+        def run():
+            try:
+                future.set_result(self._search_shard(url, payload))
+            except Exception as e:
+                future.set_exception(e)
+
+        threading.Thread(target=run, name="index-shard", daemon=True).start()
+        return future
+
+    def search(self, queries: np.ndarray, keywords: list[str], top_k: int,
+               aggregation: str = None) -> tuple[list[dict], list[dict], list[str]]:
+        """
+        Search all shards in parallel and merge their local results into the global top_k.
+
+        Args:
+            queries: Matrix of normalized query embeddings, one row per query version
+            keywords: Keywords for the keyword search
+            top_k: Number of top results to return for each search method
+            aggregation: Pool chunk similarities per article with 'max' or 'sum', chunk-level results if None
+
+        Returns:
+            Tuple of (semantic_results, keyword_results, failed shard URLs)
+        """
+        payload = {
+            "embeddings": queries.tolist() if queries is not None else [],
+            "keywords": keywords,
+            "top_k": top_k,
+            "aggregation": aggregation
+        }
+        futures = {url: self._start_search(url, payload) for url in self.urls}
+        # The request timeout applies to each socket operation, so also bound the total wait
+        wait(futures.values(), timeout=self.timeout)
+
+        semantic_results = []
+        keyword_results = []
+        failed = []
+        for url, future in futures.items():
+            if not future.done():
+                print(f"Index shard {url} exceeded {self.timeout}s, returning partial results")
+                failed.append(url)
+                continue
+            try:
+                result = future.result()
+            except Exception as e:
+                print(f"Index shard {url} failed: {e}")
+                failed.append(url)
+                continue
+            semantic_results.extend(result['semantic'])
+            keyword_results.extend(result['keyword'])
+
+        # All chunks of an article are on the same shard, so article scores of different shards are comparable,
+        # with 'sum' each shard pools over its own candidate chunks
+        semantic_results.sort(key=lambda x: x.get('article_score', x['similarity']), reverse=True)
+        keyword_results.sort(key=lambda x: x['match_count'], reverse=True)
+        return semantic_results[:top_k], keyword_results[:top_k], failed
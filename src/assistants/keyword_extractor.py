@@ -0,0 +1,102 @@
+import json
+import math
+import re
+from pathlib import Path
+
+
+class KeywordExtractor:
+    """Local keyword extraction based on corpus inverse document frequency, no API calls."""
+
+    # Words that never make good search keywords, regardless of the corpus statistics
+    STOP_WORDS = frozenset("""
+        a about above after again against all am an and any are as at be because been before being below between both but by
+        can could did do does doing down during each few for from further had has have having he her here hers herself him
+        himself his how i if in into is it its itself just me more most my myself no nor not now of off on once only or other
+        our ours ourselves out over own same she should so some such than that the their theirs them themselves then there
+        these they this those through to too under until up very was we were what when where which while who whom why will
+        with would you your yours yourself yourselves tell know give show find list many much happened happen
+    """.split())
+
+    TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:['-][a-z0-9]+)*")
+
+    def __init__(self, idf_path: Path, max_document_ratio: float = 0.5):
+        """
+        Initialize the KeywordExtractor.
+
+        Args:
+            idf_path: Path to the JSON file with corpus IDF statistics
+            max_document_ratio: Terms found in a larger share of the documents are too common to be keywords
+        """
+        try:
+            with open(idf_path, 'r', encoding='utf-8') as f:
+                statistics = json.load(f)
+        except FileNotFoundError:
+            print(f"Error: Keyword statistics file not found at {idf_path}")
+            raise
+
+        self.idf = statistics['idf']
+        documents = statistics['documents']
+        # IDF below this value means the term is in more than max_document_ratio of the documents
+        self.min_idf = math.log((documents + 1) / (documents * max_document_ratio + 1)) + 1
+
+    @classmethod
+    def tokenize(cls, text: str) -> list[str]:
+        """
+        Split text into lowercase word tokens.
+
+        Args:
+            text: Text to split
+
+        Returns:
+            List of tokens
+        """
+        return cls.TOKEN_PATTERN.findall(text.lower())
+
+    @classmethod
+    def compute_idf(cls, texts: list[str]) -> dict:
+        """
+        Compute inverse document frequency for each term in the corpus.
+
+        Args:
+            texts: Full texts of all documents
+
+        Returns:
+            Dictionary with number of documents and IDF value per term
+        """
+        document_frequency = {}
+        for text in texts:
+            for term in set(cls.tokenize(text)):
+                document_frequency[term] = document_frequency.get(term, 0) + 1
+
+        documents = len(texts)
+        idf = {
+            term: round(math.log((documents + 1) / (count + 1)) + 1, 4)
+            for term, count in document_frequency.items()
+        }
+        return {"documents": documents, "idf": idf}
+
+    def extract(self, query: str, max_keywords: int = 5) -> list[str]:
+        """
+        Extract the rarest corpus terms of the query as keywords.
+
+        Args:
+            query: User query
+            max_keywords: Maximum number of keywords to return
+
+        Returns:
+            List of keywords ordered from most to least specific
+        """
+        candidates = {}
+        for term in self.tokenize(query):
+            if len(term) < 3 or term in self.STOP_WORDS:
+                continue
+
+            # Terms missing from the corpus cannot match anything in the keyword search
+            idf = self.idf.get(term)
+            if idf is None or idf < self.min_idf:
+                continue
+
+            candidates[term] = idf
+
+        keywords = sorted(candidates, key=candidates.get, reverse=True)
+        return keywords[:max_keywords]
@@ -1,82 +1,221 @@
 import os
+import threading
 import time
-from openai import OpenAI
+import zlib
+from pathlib import Path
 
 from src.models.gpt_model import ApiStatistics
-from src.assistants.sql_query_assistant import SQLQueryAssistant
-from src.assistants.text_query_assistant import TextQueryAssistant
-from src.data_processing.sql_data_preparator import SqlDataPreparator
-from src.data_processing.text_data_preparator import TextDataPreparator
 from src.config.config import Config
 
 
 class QueryAssistant:
     """Main query assistant class for handling user questions."""
 
-    def __init__(self, config: Config):
+    def __init__(self, config: Config, openai_client: 'OpenAI' = None):
         """
         Initialize the QueryAssistant.
+        Clients, data and assistants are loaded in the background unless background startup is disabled,
+        questions wait until loading completes.
 
         Args:
             config: Application configuration including models, paths, and settings
+            openai_client: Client used instead of an OpenAI client created with the API key, e.g. replaying recorded responses
         """
         # Store config
         self.config = config
+        self.openai_client = openai_client
 
         # Get API key
-        if not config.open_ai_api_key:
+        if not config.open_ai_api_key and not openai_client:
             raise ValueError(
                 "OpenAI API key not provided. "
                 "Please generate one at: https://platform.openai.com/docs/quickstart "
                 "and set it with: export OPENAI_API_KEY='your_api_key_here'"
             )
 
-        # Initialize OpenAI client
-        self.client = OpenAI(api_key=config.open_ai_api_key)
-
-        # Prepare data if needed
-        self._prepare_data()
+        # Set by the startup
+        self.rate_limiter = None
+        self.client = None
+        self.bulk_client = None
+        self.sql_assistant = None
+        self.text_assistant = None
+        self.planner = None
+        self.recording_client = None
+        self.query_log = None
+
+        # Questions are profiled on request, reports are written to the data folder
+        from src.service.question_profiler import QuestionProfiler
+        self.profiler = QuestionProfiler(Path(config.folder_data) / "profiles", config.profile_questions)
+
+        self.startup_timings = {}
+        self._startup_error = None
+        self._ready = threading.Event()
+        self._startup_time = time.time()
+
+        if config.background_startup:
+            threading.Thread(target=self._start, name="query-assistant-startup", daemon=True).start()
+        else:
+            self._start()
+            self.wait_until_ready()
 
-        # Initialize SQL Query Assistant
+    def _start(self):
+        """Load clients, data and assistants, recording how long each step takes."""
         try:
-            self.sql_assistant = SQLQueryAssistant(self.client, self.config)
-        except Exception as e:
-            raise RuntimeError(f"Error initializing SQL assistant: {e}")
+            # Heavy imports are deferred, so the application starts accepting questions immediately
+            step_start = time.time()
+            from openai import OpenAI
+            from src.models.rate_limiter import PRIORITY_BULK, PRIORITY_INTERACTIVE, RateLimiter
+            from src.assistants.query_planner import QueryPlanner
+            from src.assistants.sql_query_assistant import SQLQueryAssistant
+            from src.assistants.text_query_assistant import TextQueryAssistant
+            self.startup_timings['imports'] = time.time() - step_start
+
+            # Initialize OpenAI client, retries are handled by the shared scheduler
+            self.rate_limiter = RateLimiter(self.config.rate_limits, max_retries=self.config.api_max_retries)
+            openai_client = self.openai_client or OpenAI(api_key=self.config.open_ai_api_key, max_retries=0)
+            interactive_client = openai_client
+            if self.config.file_query_log:
+                # Responses to questions are recorded for replaying the workload
+                from src.models.recorded_client import RecordingClient
+                from src.service.query_log import QueryLog
+                self.query_log = QueryLog(Path(self.config.file_query_log))
+                self.recording_client = RecordingClient(openai_client, self.query_log)
+                interactive_client = self.recording_client
+            self.client = self.rate_limiter.client(interactive_client, PRIORITY_INTERACTIVE)
+            if self.config.hedge_percentile:
+                # Slow completions of questions get a duplicate request, both go through the scheduler
+                from src.models.hedged_client import HedgedClient, HedgingPolicy
+                self.client = HedgedClient(self.client, HedgingPolicy(self.config.hedge_percentile, self.config.hedge_min_samples))
+            # Data preparation waits behind interactive questions
+            self.bulk_client = self.rate_limiter.client(openai_client, PRIORITY_BULK)
+
+            # Prepare data if needed
+            step_start = time.time()
+            self._prepare_data()
+            self.startup_timings['prepare data'] = time.time() - step_start
+
+            # Initialize SQL Query Assistant
+            step_start = time.time()
+            try:
+                sql_assistant = SQLQueryAssistant(self.client, self.config)
+            except Exception as e:
+                raise RuntimeError(f"Error initializing SQL assistant: {e}")
+            self.startup_timings['SQL assistant'] = time.time() - step_start
+
+            # Initialize Text Query Assistant
+            step_start = time.time()
+            try:
+                text_assistant = TextQueryAssistant(self.client, self.config, use_sentence_chunks=False)
+            except Exception as e:
+                raise RuntimeError(f"Error initializing text assistant: {e}")
+            self.startup_timings['text assistant'] = time.time() - step_start
+
+            # Initialize combined planner, it reuses the metadata loaded by the SQL assistant
+            if self.config.use_combined_planner:
+                self.planner = QueryPlanner(self.client, self.config, sql_assistant.metadata_str)
+
+            self.sql_assistant = sql_assistant
+            self.text_assistant = text_assistant
+            self.startup_timings['total'] = time.time() - self._startup_time
+
+            breakdown = ", ".join(f"{step} {seconds:.2f}s" for step, seconds in self.startup_timings.items() if step != 'total')
+            print(f"\n🚀 Ready in {self.startup_timings['total']:.2f}s ({breakdown})")
 
-        # Initialize Text Query Assistant
-        try:
-            self.text_assistant = TextQueryAssistant(self.client, self.config, use_sentence_chunks=False)
         except Exception as e:
-            raise RuntimeError(f"Error initializing text assistant: {e}")
+            self._startup_error = e
+            print(f"\n❌ Startup failed: {e}")
+        finally:
+            self._ready.set()
+
+    @property
+    def is_ready(self) -> bool:
+        """Whether the startup has completed successfully."""
+        return self._ready.is_set() and self._startup_error is None
+
+    @property
+    def startup_error(self) -> Exception:
+        """Error of a failed startup, None while starting or after a successful startup."""
+        return self._startup_error
+
+    def wait_until_ready(self):
+        """Block until the startup has completed, raising if it failed."""
+        if not self._ready.is_set():
+            print("\n⏳ Waiting for startup to complete...")
+            self._ready.wait()
+
+        if self._startup_error:
+            raise RuntimeError(f"Query assistant is not available: {self._startup_error}")
 
     def _prepare_data(self):
-        """Prepare database and article data if not already prepared."""
-        if not os.path.exists(self.config.file_sql_metadata):
-            data_prep = SqlDataPreparator(self.client, self.config)
-            data_prep.prepare_sql_data()
+        """Prepare the data unless the process that started this one has prepared it."""
+        if self.config.prepare_data:
+            self.prepare_data(self.config, self.bulk_client)
+
+    @staticmethod
+    def prepare_data(config: Config, client: 'OpenAI'):
+        """
+        Prepare the database and article data the assistants need if not up to date, installing the index snapshot if configured.
+
+        Args:
+            config: Application configuration
+            client: Client for the API calls of the data preparation
+        """
+        from src.data_processing.prep_pipeline import PrepPipeline
+        if config.file_index_snapshot and os.path.exists(config.file_index_snapshot):
+            from src.data_processing.index_snapshot import IndexSnapshot
+            if IndexSnapshot(config).install(config.file_index_snapshot):
+                # Installed files are adopted as up to date instead of being compared with an earlier preparation
+                (Path(config.folder_ready) / PrepPipeline.STATE_FILE).unlink(missing_ok=True)
 
-        if not os.path.exists(self.config.file_articles_sentences) or not os.path.exists(self.config.file_articles_length):
-            text_preparator = TextDataPreparator(self.client, self.config)
-            text_preparator.prepare_articles()
+        PrepPipeline.for_config(client, config).run(PrepPipeline.targets(config))
 
-    def process_sql_query(self, question: str) -> tuple[str, str, ApiStatistics]:
+    def plan_question(self, question: str) -> tuple[dict, ApiStatistics]:
+        """
+        Plan SQL subtasks and text search expansion with a single call if the combined planner is enabled.
+
+        Args:
+            question: User's question
+
+        Returns:
+            Tuple of (plan: dict or None, statistics: ApiStatistics)
+        """
+        if not self.planner:
+            return None, ApiStatistics.empty()
+
+        print("\n⏳ Planning your question...")
+        plan, plan_stats = self.planner.plan(question)
+        if not plan:
+            print("\n❌ Failed to plan the question, falling back to separate analysis.")
+        return plan, plan_stats
+
+    def process_sql_query(self, question: str, sql_analysis: dict = None, trace: dict = None) -> tuple[str, str, ApiStatistics]:
         """
         Process question using SQL assistant.
 
         Args:
             question: User's question
+            sql_analysis: Analysis from the combined planner, question is analyzed if not provided
+            trace: Dictionary filled with the generated SQL queries, stage timings and errors (None to skip)
 
         Returns:
             ApiStatistics for the SQL operations
         """
+        timings = trace.setdefault('timings', {}) if trace is not None else {}
         stats = ApiStatistics.empty()
-        print("\n⏳ Analyzing your question with SQL...")
-        sql_analysis, sql_analysis_stats = self.sql_assistant.analyze_question(question)
-        stats = stats.sum(sql_analysis_stats)
+        if not sql_analysis:
+            print("\n⏳ Analyzing your question with SQL...")
+            stage_start = time.perf_counter()
+            sql_analysis, sql_analysis_stats = self.sql_assistant.analyze_question(question)
+            timings['sql analysis'] = time.perf_counter() - stage_start
+            stats = stats.sum(sql_analysis_stats)
 
         if sql_analysis:
             sql_debug = []
+            stage_start = time.perf_counter()
             sql_debug_info, sql_gpt_input = self.sql_assistant.process_analysis(sql_analysis)
+            timings['sql execution'] = time.perf_counter() - stage_start
+            if trace is not None:
+                trace['sql_queries'] = [subtask.get('sql_query') for subtask in sql_analysis.get('subtasks', [])]
 
             sql_debug.append("\n" + "="*80)
             sql_debug.append("DETAILED SQL ANALYSIS")
@@ -87,23 +226,35 @@ class QueryAssistant:
             return "\n".join(sql_gpt_input), "\n".join(sql_debug), stats
         else:
             print("\n❌ Failed to analyze the question with SQL.")
-            return "No SQL information available", ApiStatistics.empty()
+            if trace is not None:
+                trace.setdefault('errors', []).append("SQL analysis failed")
+            return "No SQL information available", "", stats
 
-    def process_text_query(self, question: str, top_k: int = 5) -> tuple[str, str, ApiStatistics]:
+    def process_text_query(self, question: str, top_k: int = 5, query_versions: list[str] = None, keywords: list[str] = None,
+                           fast_mode: bool = None, trace: dict = None) -> tuple[str, str, ApiStatistics, dict]:
         """
         Process question using text assistant.
 
         Args:
             question: User's question
             top_k: Number of top results to return
+            query_versions: Query versions from the combined planner, question is expanded if not provided
+            keywords: Keywords from the combined planner
+            fast_mode: Whether to expand the question locally without API call, defaults to the configured mode
+            trace: Dictionary filled with the search inputs, retrieved chunk ids and stage timings (None to skip)
 
         Returns:
-            ApiStatistics for the text search operations
+            Tuple of (text_prompt, text_debug, statistics, retrieval results without texts)
         """
         stats = ApiStatistics.empty()
         print("\n⏳ Searching articles...")
-        semantic_results, keyword_results, query_debug, text_search_stats = self.text_assistant.search(question, top_k)
+        semantic_results, keyword_results, query_debug, text_search_stats = self.text_assistant.search(
+            question, top_k, query_versions=query_versions, keywords=keywords, fast_mode=fast_mode, trace=trace)
         stats = stats.sum(text_search_stats)
+        if trace is not None:
+            # Chunks have no stored id, the article id and text checksum identify them across index rebuilds
+            trace['chunks'] = [f"{result['id']}:{zlib.crc32(result['text'].encode('utf-8')):08x}" for result in semantic_results]
+            trace['keyword_articles'] = [result['id'] for result in keyword_results]
 
         semantic_article_ids = []
         text_prompt = []
@@ -140,15 +291,27 @@ class QueryAssistant:
             text_debug.append(f"   Matches: {result['match_count']} ({', '.join(result['matched_keywords'])})")
             text_debug.append(f"   Text: {result['text'][:100]}...")
 
-        return "\n".join(text_prompt), "\n".join(text_debug), stats
+        retrieval = {
+            "semantic": [
+                {"id": result['id'], "title": result['title'], "similarity": float(result['similarity'])}
+                for result in semantic_results
+            ],
+            "keyword": [
+                {"id": result['id'], "title": result['title'], "match_count": result['match_count']}
+                for result in keyword_results
+            ]
+        }
 
-    def generate_answer(self, question: str, sql_prompt: str, text_prompt: str) -> tuple[str, ApiStatistics]:
+        return "\n".join(text_prompt), "\n".join(text_debug), stats, retrieval
+
+    def generate_answer(self, question: str, sql_prompt: str, text_prompt: str, trace: dict = None) -> tuple[str, ApiStatistics]:
         """
         Generate a natural language answer based on SQL query results.
 
         Args:
             question: User's original question
             sql_results: List of strings containing SQL query results
+            trace: Dictionary the error is added to if the answer cannot be generated (None to skip)
 
         Returns:
             Tuple of (answer: str, statistics: ApiStatistics)
@@ -203,8 +366,95 @@ Do not reference to other data sources."""
             return answer, statistics
 
         except Exception as e:
+            if trace is not None:
+                trace.setdefault('errors', []).append(f"Answer generation failed: {e}")
             return f"Error generating answer: {str(e)}", ApiStatistics.empty()
 
+    def ask(self, question: str, top_k: int = 5, fast_mode: bool = None) -> dict:
+        """
+        Answer a question using both SQL and text search.
+
+        Args:
+            question: User's question
+            top_k: Number of top text search results to use
+            fast_mode: Whether to expand the question locally without API call, defaults to the configured mode
+
+        Returns:
+            Dictionary with:
+            - question: the user's question
+            - answer: natural language answer
+            - sql_debug: detailed SQL analysis
+            - text_debug: detailed text search analysis
+            - retrieval: semantic and keyword search results without texts
+            - trace: search inputs, generated SQL, retrieved chunk ids and stage timings in seconds
+            - statistics: ApiStatistics for all API calls
+            - errors: failed stages, the answer is incomplete or an error message if not empty
+            - profile: path of the profile report, only if the question was profiled
+        """
+        self.wait_until_ready()
+        return self.profiler.answer(question, lambda: self._answer(question, top_k, fast_mode))
+
+    def _answer(self, question: str, top_k: int, fast_mode: bool) -> dict:
+        """Answer a question, see ask()."""
+        if self.recording_client:
+            self.recording_client.start_capture()
+
+        try:
+            # Track statistics
+            stats = ApiStatistics.empty()
+            trace = {"timings": {}}
+            timings = trace['timings']
+            start_time = time.perf_counter()
+
+            # Plan both SQL and text search in one call if enabled
+            plan, plan_stats = self.plan_question(question)
+            stats = stats.sum(plan_stats)
+            if self.planner:
+                timings['plan'] = time.perf_counter() - start_time
+
+            # Process SQL query
+            sql_prompt, sql_debug, sql_stats = self.process_sql_query(question, sql_analysis=plan, trace=trace)
+            stats = stats.sum(sql_stats)
+
+            # Process text query
+            text_prompt, text_debug, text_stats, retrieval = self.process_text_query(
+                question, top_k=top_k,
+                query_versions=plan['query_versions'] if plan else None,
+                keywords=plan['keywords'] if plan else None,
+                fast_mode=fast_mode, trace=trace)
+            stats = stats.sum(text_stats)
+
+            # Generate natural language answer
+            print("\n⏳ Generating answer...")
+            stage_start = time.perf_counter()
+            answer, answer_stats = self.generate_answer(question, sql_prompt, text_prompt, trace=trace)
+            timings['answer'] = time.perf_counter() - stage_start
+            stats = stats.sum(answer_stats)
+            timings['total'] = time.perf_counter() - start_time
+        finally:
+            # The capture is closed even if a stage raised, so it does not leak into the next question of the thread
+            captured_calls = self.recording_client.stop_capture() if self.recording_client else []
+
+        if self.query_log:
+            self.query_log.add_question({
+                "question": question,
+                "top_k": top_k,
+                "fast_mode": fast_mode,
+                "trace": trace,
+                "llm": captured_calls
+            })
+
+        return {
+            "question": question,
+            "answer": answer,
+            "sql_debug": sql_debug,
+            "text_debug": text_debug,
+            "retrieval": retrieval,
+            "trace": trace,
+            "statistics": stats,
+            "errors": trace.get('errors', [])
+        }
+
     def run(self):
         """Main CLI loop for the query assistant."""
         # Display welcome message
@@ -212,6 +462,8 @@ Do not reference to other data sources."""
         print("QUERY ASSISTANT")
         print("="*80)
         print("\nWelcome! Ask questions about our company data.")
+        print("\nStart the question with '/fast' to search articles without query expansion.")
+        print("\nType '/profile N' to profile the next N questions.")
         print("\nType 'exit' or 'quit' to end the session.\n")
 
         # Main loop
@@ -227,21 +479,22 @@ Do not reference to other data sources."""
                     print("\nGoodbye! 👋")
                     break
 
-                # Track statistics
-                stats = ApiStatistics.empty()
-
-                # Process SQL query
-                sql_prompt, sql_debug, sql_stats = self.process_sql_query(question)
-                stats = stats.sum(sql_stats)
-
-                # Process text query
-                text_prompt, text_debug, text_stats = self.process_text_query(question, top_k=5)
-                stats = stats.sum(text_stats)
+                if question.lower().startswith('/profile'):
+                    count = question[len('/profile'):].strip()
+                    self.profiler.request(int(count) if count.isdigit() else 1)
+                    continue
 
-                # Generate natural language answer
-                print("\n⏳ Generating answer...")
-                answer, answer_stats = self.generate_answer(question, sql_prompt, text_prompt)
-                stats = stats.sum(answer_stats)
+                # Fast mode requested for this question only
+                fast_mode = None
+                if question.lower().startswith('/fast '):
+                    fast_mode = True
+                    question = question[len('/fast '):].strip()
+
+                result = self.ask(question, top_k=5, fast_mode=fast_mode)
+                answer = result['answer']
+                stats = result['statistics']
+                sql_debug = result['sql_debug']
+                text_debug = result['text_debug']
 
                 # Display the answer
                 print("\n" + "="*80)
@@ -0,0 +1,145 @@
+import json
+import time
+from openai import OpenAI
+
+from src.models.gpt_model import ApiStatistics
+from src.config.config import Config
+
+
+# Structured output format for the combined SQL and text search plan
+PLAN_RESPONSE_FORMAT = {
+    "name": "question_plan",
+    "strict": True,
+    "schema": {
+        "type": "object",
+        "properties": {
+            "explanation": {
+                "type": "string",
+                "description": "Clear explanation of what the user is asking"
+            },
+            "relevant_tables": {
+                "type": "array",
+                "description": "Tables needed to answer the question",
+                "items": {"type": "string"}
+            },
+            "subtasks": {
+                "type": "array",
+                "description": "Logical subtasks, each with an executable SQL query",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "description": {"type": "string", "description": "What this subtask accomplishes"},
+                        "sql_query": {"type": "string", "description": "SELECT query for this subtask"},
+                        "rationale": {"type": "string", "description": "Why this query is needed"}
+                    },
+                    "required": ["description", "sql_query", "rationale"],
+                    "additionalProperties": False
+                }
+            },
+            "query_versions": {
+                "type": "array",
+                "description": "Similar search queries with the same meaning but different wording",
+                "items": {"type": "string"}
+            },
+            "keywords": {
+                "type": "array",
+                "description": "Important keywords for full text search",
+                "items": {"type": "string"}
+            }
+        },
+        "required": ["explanation", "relevant_tables", "subtasks", "query_versions", "keywords"],
+        "additionalProperties": False
+    }
+}
+
+
+class QueryPlanner:
+    """Planner that prepares both SQL subtasks and text search expansion in a single API call."""
+
+    def __init__(self, client: OpenAI, config: Config, metadata_str: str):
+        """
+        Initialize the QueryPlanner.
+
+        Args:
+            client: OpenAI client instance
+            config: Application configuration including models
+            metadata_str: Database metadata JSON as string
+        """
+        self.client = client
+        self.gpt_model = config.model_sql_assistant
+        self.metadata_str = metadata_str
+
+    def plan(self, question: str) -> tuple[dict, ApiStatistics]:
+        """
+        Analyze the question for SQL and expand it for text search with one API call.
+
+        Args:
+            question: User's natural language question
+
+        Returns a dictionary with:
+        - explanation: Natural language explanation of the question
+        - relevant_tables: List of tables needed to answer the question
+        - subtasks: List of subtasks with SQL queries
+        - query_versions: Original question followed by its rephrased versions
+        - keywords: Keywords for full text search
+        """
+
+        prompt = f"""You are preparing a user question for a hybrid search over a database and an articles corpus. Your task is to:
+
+1. Explain what the user is asking for in clear terms
+2. Identify which database tables are relevant to answer this question
+3. Break down the question into logical subtasks
+4. For each subtask, provide a SQL query that can be executed
+5. Generate 3 similar search queries that maintain the same meaning but use different wording, sampled from the full distribution
+6. Extract 3-5 important keywords for text search which are not common widely used words
+
+Database Metadata:
+```json
+{self.metadata_str}
+```
+
+Support only data retrieval operations, in case of data insert of modification request:
+1. Return that "only select operations are supported"
+2. Break and do not produce any subtasks
+
+If the question cannot be answered from the database, return no subtasks, but still provide the search queries and keywords.
+
+User Question: {question}"""
+
+        try:
+            # Start timing
+            start_time = time.time()
+
+            response = self.client.chat.completions.create(
+                model=self.gpt_model.model_name,
+                response_format={
+                    "type": "json_schema",
+                    "json_schema": PLAN_RESPONSE_FORMAT
+                },
+                messages=[
+                    {
+                        "role": "system",
+                        "content": "You are an expert SQL database and search assistant. You break user questions down into executable SQL queries and search queries. Always respond with valid JSON."
+                    },
+                    {
+                        "role": "user",
+                        "content": prompt
+                    }
+                ],
+            )
+
+            # End timing
+            end_time = time.time()
+            elapsed_time = end_time - start_time
+
+            result = json.loads(response.choices[0].message.content)
+
+            # Add original question to versions, same as the text assistant expansion
+            result['query_versions'] = [question] + result.get('query_versions', [])
+
+            statistics = self.gpt_model.prepare_statistics(elapsed_time, response.usage)
+            return result, statistics
+
+        except Exception as e:
+            print(f"Error planning question: {e}")
+            return None, ApiStatistics.empty()
@@ -0,0 +1,341 @@
+import json
+import re
+import sqlite3
+import statistics
+import threading
+import time
+from collections import Counter
+from contextlib import closing
+from pathlib import Path
+
+
+class SqlWorkloadLog:
+    """Append-only JSONL log of the SQL queries executed by the SQL assistant."""
+
+    def __init__(self, path: Path):
+        """
+        Initialize the SqlWorkloadLog.
+
+        Args:
+            path: Path to the JSONL log file
+        """
+        self.path = path
+        self.lock = threading.Lock()
+        self.count = 0
+
+    def append(self, sql_query: str, elapsed_time: float):
+        """
+        Append an executed query.
+
+        Args:
+            sql_query: Executed SQL query
+            elapsed_time: Execution time in seconds
+        """
+        record = json.dumps({"sql": sql_query, "elapsed_ms": round(elapsed_time * 1000, 3), "time": round(time.time(), 3)}, ensure_ascii=False)
+        with self.lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(record + '\n')
+            self.count += 1
+
+    def read(self) -> list[dict]:
+        """Read all logged queries, skipping a line cut off by an interrupted write."""
+        if not self.path.exists():
+            return []
+        records = []
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue
+        return records
+
+
+class SqlIndexAdvisor:
+    """
+    Proposes indexes for the logged SQL workload.
+    Query plans are checked with EXPLAIN QUERY PLAN for full table scans and temporary B-trees,
+    candidate indexes are built on a working copy of the database and kept only if they make the workload faster.
+    """
+
+    IDENTIFIER = r'"[^"]+"|\[[^\]]+\]|`[^`]+`|[A-Za-z_][A-Za-z0-9_]*'
+    CLAUSE_PATTERN = re.compile(r'\b(SELECT|FROM|JOIN|ON|WHERE|GROUP\s+BY|HAVING|ORDER\s+BY|LIMIT)\b', re.IGNORECASE)
+    KEYWORDS = {'on', 'where', 'join', 'left', 'right', 'inner', 'outer', 'cross', 'natural', 'group', 'order', 'limit',
+                'using', 'having', 'union', 'window', 'as', 'and', 'or', 'not', 'select', 'from', 'by'}
+    MAX_INDEX_COLUMNS = 6
+
+    def __init__(self, db_path: Path, working_copy_path: Path, repeats: int = 5, min_improvement: float = 0.1, max_shapes: int = 50):
+        """
+        Initialize the SqlIndexAdvisor.
+
+        Args:
+            db_path: Path to the database used by the SQL assistant
+            working_copy_path: Path to the working copy where candidate indexes are tried
+            repeats: Number of warm runs per query when timing, the median is used
+            min_improvement: Minimum relative reduction of the workload time for keeping an index
+            max_shapes: Maximum number of most frequent query shapes analyzed
+        """
+        self.db_path = db_path
+        self.working_copy_path = working_copy_path
+        self.repeats = repeats
+        self.min_improvement = min_improvement
+        self.max_shapes = max_shapes
+
+    @staticmethod
+    def _unquote(identifier: str) -> str:
+        """Identifier without quotes."""
+        if identifier[0] in '"[`':
+            return identifier[1:-1]
+        return identifier
+
+    @staticmethod
+    def query_shape(sql_query: str) -> str:
+        """Query with literals replaced and whitespace collapsed, so repeated question shapes are grouped."""
+        shape = re.sub(r"'(?:[^']|'')*'", "?", sql_query)
+        shape = re.sub(r'\b\d+(?:\.\d+)?\b', '?', shape)
+        return re.sub(r'\s+', ' ', shape).strip().rstrip(';').lower()
+
+    def create_working_copy(self):
+        """Copy the database to the working copy with the SQLite backup API."""
+        self.working_copy_path.unlink(missing_ok=True)
+        with closing(sqlite3.connect(self.db_path)) as source, closing(sqlite3.connect(self.working_copy_path)) as target:
+            source.backup(target)
+
+    @staticmethod
+    def _schema(conn: sqlite3.Connection) -> dict[str, list[str]]:
+        """Columns of every table."""
+        tables = [row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'")]
+        return {table: [row[1] for row in conn.execute(f'PRAGMA table_info("{table}")')] for table in tables}
+
+    @staticmethod
+    def _indexed_prefixes(conn: sqlite3.Connection, table: str) -> list[list[str]]:
+        """Column lists of the existing indexes of a table, including an INTEGER PRIMARY KEY."""
+        prefixes = []
+        for index in conn.execute(f'PRAGMA index_list("{table}")'):
+            prefixes.append([row[2] for row in conn.execute(f'PRAGMA index_info("{index[1]}")')])
+        primary_keys = [row for row in conn.execute(f'PRAGMA table_info("{table}")') if row[5]]
+        if len(primary_keys) == 1 and primary_keys[0][2].upper() == 'INTEGER':
+            prefixes.append([primary_keys[0][1]])
+        return prefixes
+
+    @staticmethod
+    def explain(conn: sqlite3.Connection, sql_query: str) -> list[str]:
+        """Details of the query plan steps."""
+        return [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql_query}")]
+
+    def time_query(self, conn: sqlite3.Connection, sql_query: str) -> float:
+        """Median execution time of the query in seconds, over warm runs after an untimed one loading the pages and compiling the statement."""
+        conn.execute(sql_query).fetchall()
+        timings = []
+        for _ in range(self.repeats):
+            start_time = time.perf_counter()
+            conn.execute(sql_query).fetchall()
+            timings.append(time.perf_counter() - start_time)
+        return statistics.median(timings)
+
+    def _references(self, sql_query: str, schema: dict[str, list[str]]) -> tuple[dict[str, str], list[tuple[str, str, str, str]]]:
+        """
+        Find the tables and column references of a query.
+
+        Returns:
+            Tuple of (table by alias, list of (table, column, clause, 'eq'/'range'/None))
+        """
+        sql_query = re.sub(r"'(?:[^']|'')*'", "?", sql_query)
+        tables_lower = {table.lower(): table for table in schema}
+
+        aliases = {}
+        for match in re.finditer(rf'\b(?:FROM|JOIN)\s+({self.IDENTIFIER})(?:\s+(?:AS\s+)?({self.IDENTIFIER}))?', sql_query, re.IGNORECASE):
+            table = tables_lower.get(self._unquote(match.group(1)).lower())
+            if not table:
+                continue
+            aliases[table.lower()] = table
+            alias = match.group(2)
+            if alias and alias.lower() not in self.KEYWORDS:
+                aliases[self._unquote(alias).lower()] = table
+
+        clauses = [(match.start(), re.sub(r'\s+', ' ', match.group(1).upper())) for match in self.CLAUSE_PATTERN.finditer(sql_query)]
+
+        def clause_at(position: int) -> str:
+            clause = 'SELECT'
+            for start, name in clauses:
+                if start > position:
+                    break
+                clause = name
+            return clause
+
+        def operator_at(start: int, end: int) -> str:
+            after = sql_query[end:end + 12].upper()
+            before = sql_query[max(0, start - 4):start]
+            if re.match(r'\s*(==?|IN\b|IS\b)', after) or re.search(r'(?<![<>!])==?\s*$', before):
+                return 'eq'
+            if re.match(r'\s*(<(?!>)|>|BETWEEN\b|LIKE\b|GLOB\b)', after) or re.search(r'(?<!<)[<>]=?\s*$', before):
+                return 'range'
+            return None
+
+        query_tables = set(aliases.values())
+        columns_lower = {table: {column.lower(): column for column in schema[table]} for table in query_tables}
+        references = []
+        for match in re.finditer(rf'(?:({self.IDENTIFIER})\s*\.\s*)?({self.IDENTIFIER})', sql_query):
+            qualifier, name = match.group(1), self._unquote(match.group(2)).lower()
+            if sql_query[match.end():match.end() + 1] in ('.', '('):
+                continue
+            if qualifier:
+                table = aliases.get(self._unquote(qualifier).lower())
+                candidates = [table] if table and name in columns_lower[table] else []
+            else:
+                if name in aliases or name in self.KEYWORDS:
+                    continue
+                candidates = [table for table in query_tables if name in columns_lower[table]]
+            # Unqualified columns present in several tables are ambiguous
+            if len(candidates) == 1:
+                table = candidates[0]
+                references.append((table, columns_lower[table][name], clause_at(match.start()), operator_at(match.start(), match.end())))
+
+        return aliases, references
+
+    def _candidates(self, conn: sqlite3.Connection, sql_query: str, plan: list[str],
+                    schema: dict[str, list[str]]) -> list[tuple[str, tuple[str, ...]]]:
+        """Candidate indexes as (table, columns) for tables scanned or sorted by the query plan."""
+        aliases, references = self._references(sql_query, schema)
+
+        scanned = set()
+        for step in plan:
+            match = re.match(r'SCAN (.+?)(?: USING .*)?$', step)
+            if match and ' USING ' not in step and 'SUBQUERY' not in step:
+                table = aliases.get(match.group(1).lower())
+                if table:
+                    scanned.add(table)
+        uses_temp_btree = any('USE TEMP B-TREE' in step for step in plan)
+
+        candidates = []
+        for table in set(aliases.values()):
+            table_references = [reference for reference in references if reference[0] == table]
+            filters = [column for _, column, clause, operator in table_references if clause == 'WHERE' and operator == 'eq']
+            joins = [column for _, column, clause, operator in table_references if clause == 'ON' and operator == 'eq']
+            ranges = [column for _, column, clause, operator in table_references if clause in ('WHERE', 'ON') and operator == 'range']
+            ordering = [column for _, column, clause, _ in table_references if clause in ('GROUP BY', 'ORDER BY')]
+            if table not in scanned and not (uses_temp_btree and ordering):
+                continue
+
+            # Equality columns first, then a single range column or the sort columns.
+            # Join columns lead when the table is looked up by the join, the timings decide which variant is kept
+            tail = ranges[:1] if ranges else ordering
+            keys = [filters + tail]
+            if joins:
+                keys.append(joins + filters + tail)
+            existing = self._indexed_prefixes(conn, table)
+            for key in keys:
+                key = list(dict.fromkeys(key))[:self.MAX_INDEX_COLUMNS]
+                if not key or any(prefix[:len(key)] == key for prefix in existing):
+                    continue
+                candidates.append((table, tuple(key)))
+
+                # Covering index also containing the other referenced columns, so the table is not read at all
+                covering = list(dict.fromkeys(key + [column for _, column, _, _ in table_references]))
+                if len(covering) > len(key) and len(covering) <= self.MAX_INDEX_COLUMNS:
+                    candidates.append((table, tuple(covering)))
+
+        return list(dict.fromkeys(candidates))
+
+    @staticmethod
+    def _index_statement(table: str, columns: tuple[str, ...]) -> tuple[str, str]:
+        """Name and CREATE INDEX statement of a candidate index."""
+        name = re.sub(r'\W+', '_', f"advisor_{table}_{'_'.join(columns)}").lower()
+        column_list = ', '.join(f'"{column}"' for column in columns)
+        return name, f'CREATE INDEX IF NOT EXISTS "{name}" ON "{table}" ({column_list})'
+
+    def analyze(self, workload: list[dict]) -> list[dict]:
+        """
+        Find indexes that make the workload faster, keeping them in the working copy.
+
+        Args:
+            workload: Logged queries with 'sql'
+
+        Returns:
+            List of proposals with table, columns, statement, affected query count and before/after timings
+        """
+        shapes = Counter()
+        examples = {}
+        for record in workload:
+            sql_query = record['sql'].strip().rstrip(';')
+            if not re.match(r'(SELECT|WITH)\b', sql_query, re.IGNORECASE):
+                continue
+            shape = self.query_shape(sql_query)
+            shapes[shape] += 1
+            examples.setdefault(shape, sql_query)
+
+        self.create_working_copy()
+        proposals = []
+        with closing(sqlite3.connect(self.working_copy_path)) as conn:
+            schema = self._schema(conn)
+
+            # Baseline plans and timings of the most frequent shapes
+            queries = []
+            for shape, count in shapes.most_common(self.max_shapes):
+                try:
+                    plan = self.explain(conn, examples[shape])
+                    queries.append({"sql": examples[shape], "count": count, "plan": plan, "time": self.time_query(conn, examples[shape])})
+                except sqlite3.Error as e:
+                    print(f"Skipping query that fails on the working copy: {e}")
+
+            candidates = {}
+            for query in queries:
+                for candidate in self._candidates(conn, query['sql'], query['plan'], schema):
+                    candidates.setdefault(candidate, []).append(query)
+
+            # Most used candidates first, each one is measured on top of the already accepted ones
+            for (table, columns), affected in sorted(candidates.items(), key=lambda item: -sum(query['count'] for query in item[1])):
+                name, statement = self._index_statement(table, columns)
+                conn.execute(statement)
+                after = [self.time_query(conn, query['sql']) for query in affected]
+                before_total = sum(query['time'] * query['count'] for query in affected)
+                after_total = sum(timing * query['count'] for timing, query in zip(after, affected))
+
+                if after_total < before_total * (1 - self.min_improvement):
+                    proposals.append({
+                        "table": table,
+                        "columns": list(columns),
+                        "statement": statement,
+                        "queries": len(affected),
+                        "executions": sum(query['count'] for query in affected),
+                        "before_ms": round(before_total * 1000, 3),
+                        "after_ms": round(after_total * 1000, 3),
+                        "plan_before": affected[0]['plan'],
+                        "plan_after": self.explain(conn, affected[0]['sql'])
+                    })
+                    for timing, query in zip(after, affected):
+                        query['time'] = timing
+                        query['plan'] = self.explain(conn, query['sql'])
+                else:
+                    conn.execute(f'DROP INDEX "{name}"')
+
+        return proposals
+
+    def apply(self, proposals: list[dict]):
+        """
+        Create the proposed indexes in the database used by the SQL assistant.
+
+        Args:
+            proposals: Proposals returned by analyze
+        """
+        with closing(sqlite3.connect(self.db_path)) as conn, conn:
+            for proposal in proposals:
+                conn.execute(proposal['statement'])
+        print(f"Applied {len(proposals)} indexes to {self.db_path}")
+
+    @staticmethod
+    def print_report(proposals: list[dict]):
+        """Print the proposals with their before and after timings."""
+        if not proposals:
+            print("No index improves the logged workload")
+            return
+
+        print("\n" + "="*80)
+        print("INDEX PROPOSALS")
+        print("="*80)
+        for proposal in proposals:
+            print(f"\n{proposal['statement']}")
+            print(f"   {proposal['queries']} query shapes, {proposal['executions']} executions: "
+                  f"{proposal['before_ms']:.2f}ms -> {proposal['after_ms']:.2f}ms")
+            print(f"   Plan before: {'; '.join(proposal['plan_before'])}")
+            print(f"   Plan after:  {'; '.join(proposal['plan_after'])}")
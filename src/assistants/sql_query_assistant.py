@@ -1,9 +1,13 @@
 import json
+import queue
 import sqlite3
+import threading
 import time
 from openai import OpenAI
 from pathlib import Path
 
+from src.assistants.sql_index_advisor import SqlIndexAdvisor, SqlWorkloadLog
+from src.data_processing.sql_summary_tables import SqlSummaryTables
 from src.models.gpt_model import ApiStatistics
 from src.config.config import Config
 
@@ -24,6 +28,18 @@ class SQLQueryAssistant:
         self.gpt_model = config.model_sql_assistant
         self.db_path = config.file_db
 
+        # Reusable connections, so concurrent questions do not open the database for every query
+        self.connection_pool = queue.LifoQueue(maxsize=config.sql_pool_size)
+
+        # Executed queries are logged for the index advisor
+        self.workload_log = SqlWorkloadLog(Path(config.file_sql_workload)) if config.file_sql_workload else None
+        self.auto_index = config.sql_auto_index and self.workload_log is not None
+        self.auto_index_queries = config.sql_auto_index_queries
+        self.advisor_running = threading.Lock()
+
+        # Summary tables are refreshed before a query reads them if the source tables have changed
+        self.summary_tables = SqlSummaryTables(self.db_path) if config.sql_summary_tables else None
+
     def _load_metadata(self, metadata_path: Path) -> str:
         """Load the database metadata from JSON file as string."""
         try:
@@ -33,6 +49,24 @@ class SQLQueryAssistant:
             print(f"Error: Metadata file not found at {metadata_path}")
             raise
 
+    def _acquire_connection(self) -> sqlite3.Connection:
+        """
+        Take a connection from the pool or open a new one if the pool is empty.
+        Connections are read-only, so generated SQL cannot change the data or hold the write lock.
+        """
+        try:
+            return self.connection_pool.get_nowait()
+        except queue.Empty:
+            return sqlite3.connect(f"{Path(self.db_path).resolve().as_uri()}?mode=ro", uri=True, check_same_thread=False)
+
+    def _release_connection(self, conn: sqlite3.Connection):
+        """Return a connection to the pool without an open transaction, or close it if the pool is full."""
+        try:
+            conn.rollback()
+            self.connection_pool.put_nowait(conn)
+        except (queue.Full, sqlite3.Error):
+            conn.close()
+
     def execute_query(self, sql_query: str) -> dict:
         """
         Execute a SQL query against the database.
@@ -48,8 +82,15 @@ class SQLQueryAssistant:
             - row_count: number of rows returned (if success)
             - error: error message (if failed)
         """
+        if self.summary_tables and SqlSummaryTables.PREFIX in sql_query.lower():
+            try:
+                self.summary_tables.refresh()
+            except sqlite3.Error as e:
+                print(f"Error refreshing summary tables: {e}")
+
+        conn = self._acquire_connection()
         try:
-            conn = sqlite3.connect(self.db_path)
+            start_time = time.perf_counter()
             cursor = conn.cursor()
 
             cursor.execute(sql_query)
@@ -61,7 +102,10 @@ class SQLQueryAssistant:
             rows = cursor.fetchall()
             row_count = len(rows)
 
-            conn.close()
+            cursor.close()
+
+            if self.workload_log:
+                self._log_query(sql_query, time.perf_counter() - start_time)
 
             return {
                 "success": True,
@@ -80,6 +124,29 @@ class SQLQueryAssistant:
                 "success": False,
                 "error": f"Unexpected error: {str(e)}"
             }
+        finally:
+            self._release_connection(conn)
+
+    def _log_query(self, sql_query: str, elapsed_time: float):
+        """Log an executed query and start the background index advisor every auto_index_queries queries."""
+        self.workload_log.append(sql_query, elapsed_time)
+        if self.auto_index and self.workload_log.count % self.auto_index_queries == 0 and not self.advisor_running.locked():
+            threading.Thread(target=self._run_index_advisor, name="sql-index-advisor", daemon=True).start()
+
+    def _run_index_advisor(self):
+        """Apply the indexes validated by the index advisor on the logged workload."""
+        if not self.advisor_running.acquire(blocking=False):
+            return
+        try:
+            db_path = Path(self.db_path)
+            advisor = SqlIndexAdvisor(db_path, db_path.with_name(f"{db_path.stem}_advisor{db_path.suffix}"))
+            proposals = advisor.analyze(self.workload_log.read())
+            if proposals:
+                advisor.apply(proposals)
+        except Exception as e:
+            print(f"❌ Index advisor failed: {e}")
+        finally:
+            self.advisor_running.release()
 
     def analyze_question(self, question: str) -> tuple[dict, ApiStatistics]:
         """
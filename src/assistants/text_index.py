@@ -0,0 +1,698 @@
+import json
+import mmap
+import os
+import shutil
+from concurrent.futures import Executor
+from multiprocessing import resource_tracker, shared_memory
+from pathlib import Path
+import numpy as np
+
+
+class TextStore:
+    """Texts packed into one UTF-8 buffer with an offsets table, each text is decoded only when accessed."""
+
+    def __init__(self, buffer, offsets: np.ndarray):
+        """
+        Initialize the TextStore.
+
+        Args:
+            buffer: Bytes-like object with all texts concatenated
+            offsets: Array of len(texts) + 1 byte offsets into the buffer
+        """
+        self.buffer = memoryview(buffer).cast('B')
+        self.offsets = offsets
+        self.mapped = isinstance(buffer, np.memmap)
+
+    @classmethod
+    def from_texts(cls, texts: list[str]) -> 'TextStore':
+        """
+        Pack texts into a new TextStore.
+
+        Args:
+            texts: Texts to pack, other values such as integer ids are stored as their string form
+
+        Returns:
+            TextStore with the texts
+        """
+        encoded = [str(text).encode('utf-8') for text in texts]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(item) for item in encoded], out=offsets[1:])
+        return cls(b''.join(encoded), offsets)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index: int) -> str:
+        return str(self.buffer[self.offsets[index]:self.offsets[index + 1]], 'utf-8')
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    @property
+    def nbytes(self) -> int:
+        """Memory used by the buffer and the offsets."""
+        return self.buffer.nbytes + self.offsets.nbytes
+
+    @property
+    def resident_nbytes(self) -> int:
+        """Memory used by the store, without the memory-mapped buffer read from disk on demand."""
+        return self.offsets.nbytes if self.mapped else self.nbytes
+
+    def packed(self) -> 'TextStore':
+        """The store itself, already packed into one buffer."""
+        return self
+
+
+class CombinedTextStore:
+    """Selected texts of several text stores, accessed without copying them into a new buffer."""
+
+    def __init__(self, parts: list[tuple[TextStore, np.ndarray]]):
+        """
+        Initialize the CombinedTextStore.
+
+        Args:
+            parts: List of (store, positions of the selected texts in the store)
+        """
+        self.parts = [(store, positions) for store, positions in parts if len(positions)]
+        self.starts = np.cumsum([0] + [len(positions) for _, positions in self.parts])
+
+    def __len__(self) -> int:
+        return int(self.starts[-1])
+
+    def __getitem__(self, index: int) -> str:
+        part = int(np.searchsorted(self.starts, index, side='right')) - 1
+        store, positions = self.parts[part]
+        return store[int(positions[index - self.starts[part]])]
+
+    def __iter__(self):
+        for store, positions in self.parts:
+            for position in positions:
+                yield store[int(position)]
+
+    @property
+    def nbytes(self) -> int:
+        """Memory used by the referenced stores and the selections."""
+        return sum(store.nbytes + positions.nbytes for store, positions in self.parts)
+
+    @property
+    def resident_nbytes(self) -> int:
+        """Memory used by the referenced stores and the selections, without memory-mapped buffers."""
+        return sum(store.resident_nbytes + positions.nbytes for store, positions in self.parts)
+
+    def packed(self) -> TextStore:
+        """Copy of the selected texts packed into one buffer."""
+        return TextStore.from_texts(list(self))
+
+
+class TextIndex:
+    """
+    Search index of the text assistant: normalized chunk embeddings, chunk to article mapping,
+    chunk texts and full articles. All data is kept in flat arrays, so it can be placed in shared memory.
+    """
+
+    # Arrays making up the index, in the order they are placed in shared memory
+    ARRAYS = ('embeddings', 'chunk_articles', 'chunk_text_offsets', 'chunk_text_buffer',
+              'article_id_offsets', 'article_id_buffer', 'article_title_offsets', 'article_title_buffer',
+              'article_text_offsets', 'article_text_buffer')
+    # Arrays needed for every search, the texts are only read for the returned results
+    RESIDENT_ARRAYS = ('embeddings', 'chunk_articles')
+    # Ways to pool the chunk similarities of an article
+    AGGREGATIONS = ('max', 'sum')
+    # Arrays of the coarse search, placed in shared memory too if they are built
+    COARSE_ARRAYS = ('coarse_embeddings', 'coarse_projection', 'coarse_scales')
+    METADATA = "index.json"
+    # Rows of int8 coarse embeddings converted to float32 at a time
+    COARSE_BLOCK_SIZE = 65536
+
+    def __init__(self, embeddings: np.ndarray, chunk_articles: np.ndarray, chunk_texts: TextStore,
+                 article_ids: TextStore, article_titles: TextStore, article_texts: TextStore):
+        """
+        Initialize the TextIndex.
+
+        Args:
+            embeddings: Matrix of normalized chunk embeddings, one row per chunk
+            chunk_articles: Index of the article of each chunk
+            chunk_texts: Text of each chunk
+            article_ids: Id of each article
+            article_titles: Title of each article
+            article_texts: Full text of each article
+        """
+        self.embeddings = embeddings
+        self.chunk_articles = chunk_articles
+        self.chunk_texts = chunk_texts
+        self.article_ids = article_ids
+        self.article_titles = article_titles
+        self.article_texts = article_texts
+
+        # Reduced-dimension embeddings for the coarse search, built with build_coarse()
+        self.coarse_embeddings = None
+        self.coarse_projection = None
+        self.coarse_dimensions = None
+        # Scale of each row of int8 coarse embeddings, None for float32
+        self.coarse_scales = None
+
+        # Shared memory blocks owned or attached by this index
+        self.shared_blocks = []
+        self.attached = False
+
+    @classmethod
+    def from_records(cls, chunks: list[dict], articles: list[dict]) -> 'TextIndex':
+        """
+        Build the index from chunk and article records as saved by the text data preparator.
+
+        Args:
+            chunks: Chunks with article_id, article_title, text and embedding
+            articles: Full articles with id, title and text, ids are stored as strings
+
+        Returns:
+            TextIndex with the records
+        """
+        article_positions = {str(article['id']): position for position, article in enumerate(articles)}
+        article_ids = [str(article['id']) for article in articles]
+        article_titles = [article['title'] for article in articles]
+        article_texts = [article['text'] for article in articles]
+
+        chunk_articles = np.empty(len(chunks), dtype=np.int32)
+        for position, chunk in enumerate(chunks):
+            article_id = str(chunk['article_id'])
+            if article_id not in article_positions:
+                # Keep chunks of articles missing from the full articles, they are only not keyword searchable
+                article_positions[article_id] = len(article_ids)
+                article_ids.append(article_id)
+                article_titles.append(chunk['article_title'])
+                article_texts.append('')
+            chunk_articles[position] = article_positions[article_id]
+
+        embeddings = np.array([chunk['embedding'] for chunk in chunks], dtype=np.float32)
+        if len(embeddings):
+            embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+        else:
+            embeddings = embeddings.reshape(0, 0)
+
+        return cls(
+            embeddings,
+            chunk_articles,
+            TextStore.from_texts([chunk['text'] for chunk in chunks]),
+            TextStore.from_texts(article_ids),
+            TextStore.from_texts(article_titles),
+            TextStore.from_texts(article_texts)
+        )
+
+    def chunk(self, position: int) -> dict:
+        """
+        Get a chunk as search result record.
+
+        Args:
+            position: Chunk position in the index
+
+        Returns:
+            Dictionary with id and title of the article and text of the chunk
+        """
+        article = int(self.chunk_articles[position])
+        return {
+            'id': self.article_ids[article],
+            'title': self.article_titles[article],
+            'text': self.chunk_texts[position]
+        }
+
+    def article(self, position: int) -> dict:
+        """
+        Get a full article as search result record.
+
+        Args:
+            position: Article position in the index
+
+        Returns:
+            Dictionary with id, title and text of the article
+        """
+        return {
+            'id': self.article_ids[position],
+            'title': self.article_titles[position],
+            'text': self.article_texts[position]
+        }
+
+    def build_coarse(self, dimensions: int, method: str = 'truncate', sample_size: int = 10000, quantization: str = None):
+        """
+        Build reduced-dimension embeddings scanned first by the two-stage search.
+
+        Args:
+            dimensions: Number of dimensions of the coarse embeddings
+            method: 'truncate' keeps the leading dimensions, which the embedding models are trained to support,
+                'pca' projects on the principal directions of a sample of the chunk embeddings
+            sample_size: Number of chunks used to learn the PCA projection
+            quantization: 'int8' rounds each row to one byte per dimension with its own scale, a quarter of the float32 memory,
+                the candidates are still reranked with the full embeddings
+        """
+        if not self.chunk_count or dimensions >= self.embeddings.shape[1]:
+            return
+
+        if method == 'pca':
+            sample = self.embeddings
+            if self.chunk_count > sample_size:
+                sample = self.embeddings[np.random.default_rng(0).choice(self.chunk_count, sample_size, replace=False)]
+            # Right singular vectors give the best low-rank approximation of the dot products with the chunks. The sample is
+            # deliberately not centered: queries point along the same mean direction as the chunks, so the chunks' differences
+            # along it weigh most in the scores, centered components can leave it out and lose recall, uncentered keep it first
+            _, _, components = np.linalg.svd(sample, full_matrices=False)
+            self.coarse_projection = np.ascontiguousarray(components[:dimensions].T)
+            self.coarse_embeddings = self.embeddings @ self.coarse_projection
+        else:
+            self.coarse_projection = None
+            coarse = np.ascontiguousarray(self.embeddings[:, :dimensions])
+            coarse /= np.maximum(np.linalg.norm(coarse, axis=1, keepdims=True), 1e-12)
+            self.coarse_embeddings = coarse
+        self.coarse_dimensions = dimensions
+
+        self.coarse_scales = None
+        if quantization == 'int8':
+            scales = np.maximum(np.abs(self.coarse_embeddings).max(axis=1), 1e-12) / 127
+            self.coarse_embeddings = np.round(self.coarse_embeddings / scales[:, None]).astype(np.int8)
+            self.coarse_scales = scales.astype(np.float32)
+
+    def _coarse_queries(self, queries: np.ndarray) -> np.ndarray:
+        """Queries reduced the same way as the coarse embeddings."""
+        if self.coarse_projection is not None:
+            return queries @ self.coarse_projection
+        coarse = np.ascontiguousarray(queries[:, :self.coarse_dimensions])
+        return coarse / np.maximum(np.linalg.norm(coarse, axis=1, keepdims=True), 1e-12)
+
+    def search_chunks(self, queries: np.ndarray, top_k: int, executor: Executor = None,
+                      shard_count: int = 1, candidates: int = None) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Find the chunks most similar to any of the queries.
+        With an executor, the embedding matrix is split into shards scored in parallel, each keeping
+        only its local top_k, and the local results are merged into the global top_k.
+        With coarse embeddings and a candidate count, the coarse embeddings are scanned first
+        and only the candidates are scored with the full embeddings.
+
+        Args:
+            queries: Matrix of normalized query embeddings, one row per query version
+            top_k: Number of top chunks to return
+            executor: Executor for scoring the shards in parallel, scored in the calling thread if None
+            shard_count: Number of shards the embedding matrix is split into
+            candidates: Number of coarse search candidates reranked with the full embeddings, None or 0 to score all chunks
+
+        Returns:
+            Tuple of (chunk positions, similarities) sorted by descending similarity
+        """
+        bounds = np.linspace(0, self.chunk_count, max(1, shard_count) + 1, dtype=np.int64)
+        shards = [(start, end) for start, end in zip(bounds[:-1], bounds[1:]) if end > start]
+
+        coarse_queries = None
+        if self.coarse_embeddings is not None and candidates and shards:
+            coarse_queries = self._coarse_queries(queries)
+            # Each shard reranks its share of the candidates
+            candidates = max(top_k, -(-candidates // len(shards)))
+
+        def search_shard(shard):
+            return self._search_shard(queries, top_k, *shard, coarse_queries=coarse_queries, candidates=candidates)
+
+        if executor and len(shards) > 1:
+            # NumPy releases the GIL during the matrix multiplication, so the shards are scored on separate cores
+            shard_results = list(executor.map(search_shard, shards))
+        else:
+            shard_results = [search_shard(shard) for shard in shards]
+
+        if not shard_results:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        positions = np.concatenate([shard_positions for shard_positions, _ in shard_results])
+        similarities = np.concatenate([shard_similarities for _, shard_similarities in shard_results])
+        order = np.argsort(-similarities, kind='stable')[:top_k]
+        return positions[order], similarities[order]
+
+    def search_chunks_by_article(self, queries: np.ndarray, top_k: int, aggregation: str = 'max', executor: Executor = None,
+                                 shard_count: int = 1, candidate_factor: int = 4,
+                                 coarse_candidates: int = None) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Find the best chunk of each of the top_k articles, pooling chunk similarities per article.
+        Scores are pooled over the top candidate chunks only, so the cost stays close to the chunk-level search.
+
+        Args:
+            queries: Matrix of normalized query embeddings, one row per query version
+            top_k: Number of top articles to return
+            aggregation: 'max' scores an article by its best chunk, 'sum' by the sum of its candidate chunks
+            executor: Executor for scoring the shards in parallel, scored in the calling thread if None
+            shard_count: Number of shards the embedding matrix is split into
+            candidate_factor: Number of candidate chunks per requested article
+            coarse_candidates: Number of coarse search candidates reranked with the full embeddings, None or 0 to score all chunks
+
+        Returns:
+            Tuple of (chunk positions, chunk similarities, article scores) sorted by descending article score
+        """
+        if aggregation not in self.AGGREGATIONS:
+            raise ValueError(f"Unknown aggregation '{aggregation}', use one of {self.AGGREGATIONS}")
+        candidates = top_k * candidate_factor
+        while True:
+            positions, similarities = self.search_chunks(
+                queries, candidates, executor, shard_count, max(candidates, coarse_candidates) if coarse_candidates else None)
+            chunk_articles = self.chunk_articles[positions]
+            # Candidates are sorted by similarity, so the first chunk of each article is its best chunk
+            articles, best, groups = np.unique(chunk_articles, return_index=True, return_inverse=True)
+            # Widen the candidates when a few articles took most of them
+            if len(articles) >= top_k or candidates >= self.chunk_count:
+                break
+            candidates *= candidate_factor
+
+        if aggregation == 'sum':
+            scores = np.bincount(groups, weights=similarities, minlength=len(articles)).astype(np.float32)
+        else:
+            scores = similarities[best]
+
+        order = np.argsort(-scores, kind='stable')[:top_k]
+        return positions[best[order]], similarities[best[order]], scores[order]
+
+    def _search_shard(self, queries: np.ndarray, top_k: int, start: int, end: int,
+                      coarse_queries: np.ndarray = None, candidates: int = None) -> tuple[np.ndarray, np.ndarray]:
+        """Top chunks of one shard of the embedding matrix, with positions relative to the whole index."""
+        if coarse_queries is not None and candidates < end - start:
+            # Scan the coarse embeddings, then rerank the candidates with the full embeddings
+            coarse_similarities = self._coarse_similarities(start, end, coarse_queries)
+            candidate_positions = np.argpartition(-coarse_similarities, candidates - 1)[:candidates]
+            similarities = (self.embeddings[candidate_positions + start] @ queries.T).max(axis=1)
+            top_k = min(top_k, len(similarities))
+            top_positions = np.argpartition(-similarities, top_k - 1)[:top_k]
+            return candidate_positions[top_positions] + start, similarities[top_positions]
+
+        # Max similarity of each chunk across all query versions
+        similarities = (self.embeddings[start:end] @ queries.T).max(axis=1)
+
+        # Select top_k without sorting all chunks
+        top_k = min(top_k, len(similarities))
+        if not top_k:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        top_positions = np.argpartition(-similarities, top_k - 1)[:top_k]
+        return top_positions + start, similarities[top_positions]
+
+    def _coarse_similarities(self, start: int, end: int, coarse_queries: np.ndarray) -> np.ndarray:
+        """Max coarse similarity of each chunk of one shard across all query versions."""
+        if self.coarse_scales is None:
+            return (self.coarse_embeddings[start:end] @ coarse_queries.T).max(axis=1)
+
+        # NumPy has no fast int8 product, blocks are converted to float32 one at a time to bound the extra memory
+        similarities = np.empty(end - start, dtype=np.float32)
+        for block_start in range(start, end, self.COARSE_BLOCK_SIZE):
+            block_end = min(block_start + self.COARSE_BLOCK_SIZE, end)
+            block = self.coarse_embeddings[block_start:block_end].astype(np.float32) @ coarse_queries.T
+            # The row scale is positive, so it is applied after taking the max
+            similarities[block_start - start:block_end - start] = block.max(axis=1) * self.coarse_scales[block_start:block_end]
+        return similarities
+
+    def search_articles(self, keywords: list[str], top_k: int) -> list[tuple[int, int, list[str]]]:
+        """
+        Find the articles with most keyword occurrences.
+
+        Args:
+            keywords: Keywords to search for, case insensitive
+            top_k: Number of top articles to return
+
+        Returns:
+            List of (article position, match count, matched keywords) sorted by descending match count
+        """
+        keywords_lower = [(keyword, keyword.lower()) for keyword in keywords]
+
+        results = []
+        for position, text in enumerate(self.article_texts):
+            text_lower = text.lower()
+
+            # Count keyword matches
+            match_count = 0
+            matched_keywords = []
+            for keyword, keyword_lower in keywords_lower:
+                count = text_lower.count(keyword_lower)
+                if count > 0:
+                    match_count += count
+                    matched_keywords.append(keyword)
+
+            if match_count > 0:
+                results.append((position, match_count, matched_keywords))
+
+        results.sort(key=lambda x: x[1], reverse=True)
+        return results[:top_k]
+
+    @property
+    def chunk_count(self) -> int:
+        return len(self.chunk_texts)
+
+    @property
+    def article_count(self) -> int:
+        return len(self.article_texts)
+
+    @property
+    def resident_nbytes(self) -> int:
+        """Memory used by the index data that is always in memory, memory-mapped texts are read on demand."""
+        stores = (self.chunk_texts, self.article_ids, self.article_titles, self.article_texts)
+        return self.embeddings.nbytes + self.chunk_articles.nbytes + self.coarse_nbytes + sum(store.resident_nbytes for store in stores)
+
+    @property
+    def nbytes(self) -> int:
+        """Memory used by the index data."""
+        stores = (self.chunk_texts, self.article_ids, self.article_titles, self.article_texts)
+        return self.embeddings.nbytes + self.chunk_articles.nbytes + self.coarse_nbytes + sum(store.nbytes for store in stores)
+
+    @property
+    def coarse_nbytes(self) -> int:
+        """Memory used by the coarse search embeddings."""
+        if self.coarse_embeddings is None:
+            return 0
+        return self.coarse_embeddings.nbytes + (self.coarse_scales.nbytes if self.coarse_scales is not None else 0)
+
+    def _arrays(self) -> dict[str, np.ndarray]:
+        """All index data as named flat arrays, combined text stores are packed first."""
+        chunk_texts = self.chunk_texts.packed()
+        article_ids = self.article_ids.packed()
+        article_titles = self.article_titles.packed()
+        article_texts = self.article_texts.packed()
+        return {
+            'embeddings': self.embeddings,
+            'chunk_articles': self.chunk_articles,
+            'chunk_text_offsets': chunk_texts.offsets,
+            'chunk_text_buffer': np.frombuffer(chunk_texts.buffer, dtype=np.uint8),
+            'article_id_offsets': article_ids.offsets,
+            'article_id_buffer': np.frombuffer(article_ids.buffer, dtype=np.uint8),
+            'article_title_offsets': article_titles.offsets,
+            'article_title_buffer': np.frombuffer(article_titles.buffer, dtype=np.uint8),
+            'article_text_offsets': article_texts.offsets,
+            'article_text_buffer': np.frombuffer(article_texts.buffer, dtype=np.uint8),
+        }
+
+    def save(self, folder: Path, metadata: dict = None):
+        """
+        Save the index as one .npy file per array, replacing an existing saved index.
+
+        Args:
+            folder: Folder to save the arrays to, created if missing
+            metadata: JSON serializable description of the index, e.g. its source files
+        """
+        temp_folder = folder.with_name(f"{folder.name}.tmp")
+        shutil.rmtree(temp_folder, ignore_errors=True)
+        temp_folder.mkdir(parents=True)
+        for name, array in self._arrays().items():
+            np.save(temp_folder / f"{name}.npy", array)
+        with open(temp_folder / self.METADATA, 'w', encoding='utf-8') as f:
+            json.dump({"chunks": self.chunk_count, "articles": self.article_count, **(metadata or {})}, f, ensure_ascii=False, indent=2)
+
+        shutil.rmtree(folder, ignore_errors=True)
+        os.replace(temp_folder, folder)
+
+    @classmethod
+    def read_metadata(cls, folder: Path) -> dict:
+        """Metadata of a saved index, None if there is no complete saved index in the folder."""
+        try:
+            with open(folder / cls.METADATA, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    @classmethod
+    def load(cls, folder: Path, mmap_texts: bool = True) -> 'TextIndex':
+        """
+        Load an index saved with save().
+        Embeddings are read into memory, texts are memory-mapped so only the pages of returned results are read.
+
+        Args:
+            folder: Folder with the saved arrays
+            mmap_texts: Whether to memory-map the texts instead of reading them into memory
+
+        Returns:
+            TextIndex with the saved data
+        """
+        arrays = {}
+        for name in cls.ARRAYS:
+            path = folder / f"{name}.npy"
+            if mmap_texts and name not in cls.RESIDENT_ARRAYS and path.stat().st_size > 128:
+                arrays[name] = np.load(path, mmap_mode='r')
+            else:
+                # Empty arrays cannot be memory-mapped, .npy headers are 128 bytes
+                arrays[name] = np.load(path)
+        return cls._from_arrays(arrays)
+
+    @classmethod
+    def combine(cls, parts: list[tuple['TextIndex', np.ndarray]]) -> 'TextIndex':
+        """
+        Combine several indexes into one, keeping only the live articles and their chunks.
+        Embeddings are copied into one matrix, texts are referenced from the original indexes.
+
+        Args:
+            parts: List of (index, boolean mask of its live articles)
+
+        Returns:
+            TextIndex with the live data of all parts
+        """
+        embeddings = []
+        chunk_articles = []
+        chunk_texts = []
+        article_ids = []
+        article_titles = []
+        article_texts = []
+        article_offset = 0
+        for index, live_articles in parts:
+            article_positions = np.flatnonzero(live_articles)
+            chunk_positions = np.flatnonzero(live_articles[index.chunk_articles])
+            # New positions of the live articles in the combined index
+            new_article_positions = np.cumsum(live_articles, dtype=np.int32) - 1 + article_offset
+
+            if len(chunk_positions):
+                embeddings.append(index.embeddings[chunk_positions])
+            chunk_articles.append(new_article_positions[index.chunk_articles[chunk_positions]])
+            chunk_texts.append((index.chunk_texts, chunk_positions))
+            article_ids.append((index.article_ids, article_positions))
+            article_titles.append((index.article_titles, article_positions))
+            article_texts.append((index.article_texts, article_positions))
+            article_offset += len(article_positions)
+
+        return cls(
+            np.concatenate(embeddings) if embeddings else np.zeros((0, 0), dtype=np.float32),
+            np.concatenate(chunk_articles).astype(np.int32) if chunk_articles else np.zeros(0, dtype=np.int32),
+            CombinedTextStore(chunk_texts),
+            CombinedTextStore(article_ids),
+            CombinedTextStore(article_titles),
+            CombinedTextStore(article_texts)
+        )
+
+    @classmethod
+    def _from_arrays(cls, arrays: dict[str, np.ndarray]) -> 'TextIndex':
+        """Build the index from named flat arrays."""
+        return cls(
+            arrays['embeddings'],
+            arrays['chunk_articles'],
+            TextStore(arrays['chunk_text_buffer'], arrays['chunk_text_offsets']),
+            TextStore(arrays['article_id_buffer'], arrays['article_id_offsets']),
+            TextStore(arrays['article_title_buffer'], arrays['article_title_offsets']),
+            TextStore(arrays['article_text_buffer'], arrays['article_text_offsets'])
+        )
+
+    def _mapped_files(self) -> dict[str, str]:
+        """Paths of the .npy files the text arrays are memory-mapped from, by array name."""
+        files = {}
+        stores = {'chunk_text': self.chunk_texts, 'article_id': self.article_ids, 'article_title': self.article_titles,
+                  'article_text': self.article_texts}
+        for prefix, store in stores.items():
+            if not isinstance(store, TextStore):
+                continue
+            for name, array in ((f"{prefix}_offsets", store.offsets), (f"{prefix}_buffer", store.buffer.obj)):
+                # Only whole files mapped by np.load, a slice of a mapping does not start at the array data of the file
+                if isinstance(array, np.memmap) and isinstance(array.base, mmap.mmap):
+                    files[name] = str(array.filename)
+        return files
+
+    def to_shared_memory(self, text_folder: Path = None) -> dict:
+        """
+        Copy the embeddings into shared memory blocks, which stay allocated until close() is called.
+        Texts memory-mapped from files are mapped from the same files by the attached processes, texts held in memory
+        are written to the text folder and mapped from there, or copied into shared memory without a text folder.
+
+        Args:
+            text_folder: Folder for the texts held in memory, replaced files are overwritten
+
+        Returns:
+            Picklable handle for attaching to the index from other processes
+        """
+        handle = {}
+        files = self._mapped_files()
+        arrays = self._arrays()
+        # Attached processes search with the coarse embeddings of this index instead of building their own
+        arrays.update({name: getattr(self, name) for name in self.COARSE_ARRAYS if getattr(self, name) is not None})
+        if self.coarse_embeddings is not None:
+            handle['coarse_dimensions'] = self.coarse_dimensions
+        for name, array in arrays.items():
+            if name not in files and text_folder and name not in self.RESIDENT_ARRAYS + self.COARSE_ARRAYS:
+                text_folder.mkdir(parents=True, exist_ok=True)
+                files[name] = str(text_folder / f"{name}.npy")
+                np.save(files[name], array)
+            if name in files:
+                handle.setdefault('files', {})[name] = files[name]
+                continue
+            # Zero sized blocks are not allowed
+            block = shared_memory.SharedMemory(create=True, size=max(1, array.nbytes))
+            np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+            self.shared_blocks.append(block)
+            handle[name] = (block.name, array.dtype.str, array.shape)
+
+        return handle
+
+    @classmethod
+    def attach(cls, handle: dict) -> 'TextIndex':
+        """
+        Attach to an index placed in shared memory by another process, without copying its data.
+
+        Args:
+            handle: Handle returned by to_shared_memory
+
+        Returns:
+            Read-only TextIndex backed by the shared memory
+        """
+        # The creating process owns the blocks, a resource tracker started by this process would remove them on exit.
+        # Processes started with multiprocessing share the tracker of the creating process and need no special handling.
+        own_tracker = resource_tracker._resource_tracker._fd is None
+
+        arrays = {}
+        blocks = []
+        for name, path in handle.get('files', {}).items():
+            # Empty arrays cannot be memory-mapped, .npy headers are 128 bytes
+            arrays[name] = np.load(path, mmap_mode='r') if os.path.getsize(path) > 128 else np.load(path)
+        for name in cls.ARRAYS + cls.COARSE_ARRAYS:
+            if name not in handle:
+                continue
+            block_name, dtype, shape = handle[name]
+            try:
+                # Python 3.13+
+                block = shared_memory.SharedMemory(name=block_name, track=False)
+            except TypeError:
+                block = shared_memory.SharedMemory(name=block_name)
+                if own_tracker:
+                    resource_tracker.unregister(block._name, 'shared_memory')
+            array = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+            array.flags.writeable = False
+            arrays[name] = array
+            blocks.append(block)
+
+        index = cls._from_arrays(arrays)
+        if 'coarse_embeddings' in arrays:
+            index.coarse_embeddings = arrays['coarse_embeddings']
+            index.coarse_projection = arrays.get('coarse_projection')
+            index.coarse_scales = arrays.get('coarse_scales')
+            index.coarse_dimensions = handle['coarse_dimensions']
+        index.shared_blocks = blocks
+        index.attached = True
+        return index
+
+    def close(self, unlink: bool = False):
+        """
+        Release the shared memory blocks of this index, an attached index cannot be used afterwards.
+
+        Args:
+            unlink: Whether to remove the blocks, only the creating process should do this
+        """
+        if self.attached:
+            # Views into the blocks have to be released before the blocks can be closed
+            self.embeddings = self.chunk_articles = None
+            self.coarse_embeddings = self.coarse_projection = self.coarse_scales = None
+            self.chunk_texts = self.article_ids = self.article_titles = self.article_texts = None
+
+        for block in self.shared_blocks:
+            block.close()
+            if unlink:
+                block.unlink()
+        self.shared_blocks = []
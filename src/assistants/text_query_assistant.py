@@ -1,8 +1,16 @@
+import contextvars
 import json
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 import numpy as np
-from openai import OpenAI
+from openai import APITimeoutError, BadRequestError, OpenAI
+from src.assistants.index_shard_client import IndexShardClient
+from src.assistants.keyword_extractor import KeywordExtractor
+from src.assistants.text_index import TextIndex
+from src.assistants.text_segment_store import TextSegmentStore
 from src.config.config import Config
+from src.models.embeddings_batcher import EmbeddingsBatcher
 from src.models.gpt_model import ApiStatistics
 
 
@@ -21,39 +29,219 @@ class TextQueryAssistant:
         self.client = client
         self.config = config
         self.use_sentence_chunks = use_sentence_chunks
-        self.articles_with_embeddings = []
-        self.articles_raw = []
+        self.index = None
+        self.shard_client = None
+        self.shard_processes = []
+        self.segment_store = None
+        self.segment_cache = {}
+        self.segments_generation = None
+        self.keyword_extractor = None
+
+        # Share embeddings calls between concurrent questions if batching is enabled
+        self.embeddings_batcher = None
+        if config.embeddings_batch_wait:
+            self.embeddings_batcher = EmbeddingsBatcher(
+                client, config.model_embeddings, max_wait=config.embeddings_batch_wait, max_batch_size=config.embeddings_batch_size)
+
+        # Score shards of the embedding matrix in parallel threads if sharding is enabled
+        self.search_executor = None
+        if config.semantic_search_shards > 1:
+            self.search_executor = ThreadPoolExecutor(max_workers=config.semantic_search_shards, thread_name_prefix="semantic-search")
+
+        # Query expansion runs in the background while the original query is searched if speculative retrieval is enabled
+        self.expansion_executor = None
+        if config.speculative_retrieval:
+            self.expansion_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="query-expansion")
+        # Cost of the expansions that finished after the latency budget, they are not part of any answer's statistics
+        self.abandoned_statistics = ApiStatistics.empty()
+        self.abandoned_lock = threading.Lock()
+
+        # Search index shard servers, attach to the index shared by the parent process, or load articles with embeddings
+        if config.text_local_shards:
+            from src.service.index_shard_server import start_local_shards
+            urls, self.shard_processes = start_local_shards(config, config.text_local_shards)
+            self.shard_client = IndexShardClient(urls, timeout=config.shard_timeout)
+        elif config.text_index_shards:
+            self.shard_client = IndexShardClient(config.text_index_shards, timeout=config.shard_timeout)
+        elif config.text_shared_index:
+            self.index = TextIndex.attach(config.text_shared_index)
+            print(f"Attached to shared index with {self.index.chunk_count} article chunks")
+        elif config.folder_text_segments and TextSegmentStore(config.folder_text_segments).exists():
+            self._load_segments()
+        else:
+            self.index = self._load_articles(config, use_sentence_chunks)
+            if config.folder_text_segments:
+                # The first added or deleted articles create the segment store, the index switches over to it then
+                self.segment_store = TextSegmentStore(config.folder_text_segments)
 
-        # Load articles with embeddings
-        self._load_articles()
+        if self.segment_store:
+            threading.Thread(target=self._watch_segments, name="text-segments", daemon=True).start()
 
-    def _load_articles(self):
-        """Load articles with embeddings from JSON file."""
-        if self.use_sentence_chunks:
-            file_path = self.config.file_articles_sentences
-        else:
-            file_path = self.config.file_articles_length
+        # An attached index comes with the coarse embeddings built by the parent process
+        if self.index and self.index.coarse_embeddings is None:
+            self.build_coarse(config, self.index)
+
+        # Load corpus statistics for the local keyword extraction
+        if config.file_articles_idf and config.file_articles_idf.exists():
+            self.keyword_extractor = KeywordExtractor(config.file_articles_idf)
+
+    @staticmethod
+    def load_index(config: Config, use_sentence_chunks: bool = False) -> TextIndex:
+        """
+        Load the local index like the text assistant, from the text segments if they exist, otherwise from the binary index
+        or the prepared JSON files. Used by processes searching the index without a text assistant, e.g. index shard servers.
+
+        Args:
+            config: Application configuration
+            use_sentence_chunks: Whether to use sentence-based or length-based chunks
+
+        Returns:
+            TextIndex without coarse embeddings
+        """
+        store = TextSegmentStore(config.folder_text_segments) if config.folder_text_segments else None
+        if not store or not store.exists():
+            return TextQueryAssistant._load_articles(config, use_sentence_chunks)
+
+        manifest = store.read_manifest()
+        index = store.load(manifest)
+        print(f"Loaded {index.chunk_count} article chunks from {len(manifest['segments'])} text segments")
+        TextQueryAssistant._print_index_memory(index)
+        return index
+
+    @staticmethod
+    def _index_sources(config: Config, use_sentence_chunks: bool) -> tuple:
+        """JSON file of the chunks, and the sources identifying the saved binary index, it is rebuilt when they change."""
+        file_path = config.file_articles_sentences if use_sentence_chunks else config.file_articles_length
+        sources = {}
+        for path in (file_path, config.file_articles_raw) if config.folder_text_index else ():
+            stat = path.stat()
+            # Whole seconds, as kept by files extracted from index snapshots
+            sources[path.name] = [stat.st_size, int(stat.st_mtime)]
+        return file_path, sources
+
+    @staticmethod
+    def binary_index_is_current(config: Config, use_sentence_chunks: bool = False) -> bool:
+        """Whether loading the index from the article files writes nothing, the binary index is disabled or saved for the current files."""
+        if not config.folder_text_index:
+            return True
+        metadata = TextIndex.read_metadata(config.folder_text_index)
+        return bool(metadata) and metadata.get('sources') == TextQueryAssistant._index_sources(config, use_sentence_chunks)[1]
+
+    @staticmethod
+    def _load_articles(config: Config, use_sentence_chunks: bool) -> TextIndex:
+        """
+        Load articles with embeddings from JSON file and build the search index.
+        The index is saved in binary form and reopened with memory-mapped texts, later starts load it directly.
+        """
+        file_path, sources = TextQueryAssistant._index_sources(config, use_sentence_chunks)
+        folder_index = config.folder_text_index
+        if folder_index:
+            metadata = TextIndex.read_metadata(folder_index)
+            if metadata and metadata.get('sources') == sources:
+                index = TextIndex.load(folder_index)
+                TextQueryAssistant._print_index_memory(index)
+                return index
 
         try:
             with open(file_path, 'r', encoding='utf-8') as f:
-                self.articles_with_embeddings = json.load(f)
-            print(f"Loaded {len(self.articles_with_embeddings)} article chunks")
+                articles_with_embeddings = json.load(f)
+            print(f"Loaded {len(articles_with_embeddings)} article chunks")
         except Exception as e:
             raise RuntimeError(f"Error loading articles: {e}")
 
         try:
-            with open(self.config.file_articles_raw, 'r', encoding='utf-8') as f:
-                self.articles_raw = json.load(f)
-            print(f"Loaded {len(self.articles_raw)} full articles")
+            with open(config.file_articles_raw, 'r', encoding='utf-8') as f:
+                articles_raw = json.load(f)
+            print(f"Loaded {len(articles_raw)} full articles")
         except Exception as e:
             raise RuntimeError(f"Error loading articles: {e}")
 
-    def expand_query(self, query: str) -> tuple[list[str], list[str], ApiStatistics]:
+        index = TextIndex.from_records(articles_with_embeddings, articles_raw)
+
+        if folder_index:
+            del articles_with_embeddings, articles_raw
+            index.save(folder_index, {"sources": sources})
+            index = TextIndex.load(folder_index)
+            TextQueryAssistant._print_index_memory(index)
+        return index
+
+    @staticmethod
+    def build_coarse(config: Config, index: TextIndex):
+        """Build the reduced-dimension embeddings of the two-stage search if it is enabled."""
+        if not config.coarse_dimensions:
+            return
+        start_time = time.time()
+        index.build_coarse(config.coarse_dimensions, config.coarse_method, quantization=config.coarse_quantization)
+        if index.coarse_embeddings is not None:
+            print(f"Built {config.coarse_dimensions}-dimensional coarse embeddings "
+                  f"({', '.join(filter(None, (config.coarse_method, config.coarse_quantization)))}) "
+                  f"in {time.time() - start_time:.2f}s")
+
+    @staticmethod
+    def _print_index_memory(index: TextIndex):
+        """Print how much of the index is held in memory."""
+        print(f"Loaded index of {index.chunk_count} article chunks and {index.article_count} articles, "
+              f"{index.resident_nbytes / 1024 / 1024:.1f} MB in memory, "
+              f"{(index.nbytes - index.resident_nbytes) / 1024 / 1024:.1f} MB of texts memory-mapped")
+
+    def _load_segments(self):
+        """Load the index from text segments, they are watched for changes afterwards."""
+        self.segment_store = TextSegmentStore(self.config.folder_text_segments)
+        manifest = self.segment_store.read_manifest()
+        self.index = self.segment_store.load(manifest, self.segment_cache)
+        self.segments_generation = manifest['generation']
+        print(f"Loaded {self.index.chunk_count} article chunks from {len(manifest['segments'])} text segments")
+        self._print_index_memory(self.index)
+
+    def _watch_segments(self):
+        """
+        Reload the index when segments are added or articles deleted, compacting the segments when there are too many.
+        A store created after the start replaces the index loaded from the article files once it appears.
+        """
+        while True:
+            time.sleep(self.config.segment_reload_interval)
+            try:
+                if not self.segment_store.exists():
+                    continue
+                manifest = self.segment_store.read_manifest()
+                if len(manifest['segments']) > self.config.segment_compaction_threshold and self.segment_store.compact():
+                    # Reloaded with the compacted manifest on the next check
+                    continue
+
+                if manifest['generation'] != self.segments_generation:
+                    start_time = time.time()
+                    # Searches in progress keep using the previous index
+                    index = self.segment_store.load(manifest, self.segment_cache)
+                    self.build_coarse(self.config, index)
+                    self.index = index
+                    self.segments_generation = manifest['generation']
+                    print(f"Reloaded {self.index.chunk_count} article chunks from {len(manifest['segments'])} text segments "
+                          f"in {time.time() - start_time:.2f}s")
+            except Exception as e:
+                print(f"Error reloading text segments: {e}")
+
+    def expand_query_fast(self, query: str) -> tuple[list[str], list[str], ApiStatistics]:
+        """
+        Extract keywords locally using corpus statistics, without generating query versions.
+
+        Args:
+            query: Original user query
+
+        Returns:
+            Tuple of (query_versions: list[str], keywords: list[str], statistics: ApiStatistics)
+        """
+        keywords = self.keyword_extractor.extract(query) if self.keyword_extractor else []
+        return [query], keywords, ApiStatistics.empty()
+
+    def expand_query(self, query: str, abort_after_budget: bool = True) -> tuple[list[str], list[str], ApiStatistics]:
         """
         Generate similar query versions and extract keywords using OpenAI.
+        If the call exceeds the expansion latency budget, falls back to the local fast expansion.
 
         Args:
             query: Original user query
+            abort_after_budget: Whether the call is aborted once the latency budget is spent, the speculative retrieval
+                stops waiting for the call instead and lets it finish in the background
 
         Returns:
             Tuple of (query_versions: list[str], keywords: list[str], statistics: ApiStatistics)
@@ -72,7 +260,12 @@ Respond in JSON format:
             # Start timing
             start_time = time.time()
 
-            response = self.client.chat.completions.create(
+            # Abort the call without retries once the latency budget is spent
+            client = self.client
+            if self.config.expansion_latency_budget and abort_after_budget:
+                client = self.client.with_options(timeout=self.config.expansion_latency_budget, max_retries=0)
+
+            response = client.chat.completions.create(
                 model=self.config.model_text_assistant.model_name,
                 response_format={"type": "json_object"},
                 messages=[
@@ -104,6 +297,9 @@ Respond in JSON format:
 
             return all_queries, keywords, statistics
 
+        except APITimeoutError:
+            print(f"Query expansion exceeded {self.config.expansion_latency_budget}s, using fast expansion")
+            return self.expand_query_fast(query)
         except Exception as e:
             print(f"Error expanding query: {e}")
             return [query], [], ApiStatistics.empty()
@@ -118,15 +314,51 @@ Respond in JSON format:
         Returns:
             Numpy array of embedding vector
         """
+        embeddings = self.generate_query_embeddings([query])
+        return embeddings[0] if embeddings else None
+
+    def generate_query_embeddings(self, queries: list[str]) -> list[np.ndarray]:
+        """
+        Generate embeddings for several queries with a single request.
+        If the request is rejected, e.g. for one invalid query version, the queries are embedded one by one
+        and only the failing ones are left out.
+
+        Args:
+            queries: Query texts
+
+        Returns:
+            List of numpy arrays of embedding vectors of the queries that could be embedded, empty list on error
+        """
         try:
+            return self._embed_queries(queries)
+        except BadRequestError as e:
+            if len(queries) == 1:
+                print(f"Error generating query embeddings: {e}")
+                return []
+            print(f"Error generating query embeddings: {e}, embedding the query versions one by one")
+        except Exception as e:
+            print(f"Error generating query embeddings: {e}")
+            return []
+
+        embeddings = []
+        for query in queries:
+            try:
+                embeddings.extend(self._embed_queries([query]))
+            except Exception as e:
+                print(f"Error generating query embedding of '{query[:50]}': {e}")
+        return embeddings
+
+    def _embed_queries(self, queries: list[str]) -> list[np.ndarray]:
+        """Embed the queries with the batcher or a single API call."""
+        if self.embeddings_batcher:
+            embeddings = self.embeddings_batcher.embed(queries)
+        else:
             response = self.client.embeddings.create(
-                input=query,
+                input=queries,
                 model=self.config.model_embeddings.model_name
             )
-            return np.array(response.data[0].embedding)
-        except Exception as e:
-            print(f"Error generating query embedding: {e}")
-            return None
+            embeddings = [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+        return [np.array(embedding) for embedding in embeddings]
 
     def cosine_similarity(self, vec1: np.ndarray, vec2: np.ndarray) -> float:
         """
@@ -144,48 +376,87 @@ Respond in JSON format:
         norm2 = np.linalg.norm(vec2)
         return dot_product / (norm1 * norm2)
 
-    def semantic_search(self, query_versions: list[str], top_k: int = 10) -> list[dict]:
+    def generate_normalized_queries(self, query_versions: list[str]) -> np.ndarray:
+        """
+        Generate embeddings for all query versions, normalized so the dot product with
+        the normalized chunk embeddings is the cosine similarity.
+
+        Args:
+            query_versions: List of query variations
+
+        Returns:
+            Matrix with one row per query version, None on error
+        """
+        query_embeddings = self.generate_query_embeddings(query_versions)
+
+        if not query_embeddings:
+            return None
+
+        queries = np.array(query_embeddings, dtype=np.float32)
+        queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+        return queries
+
+    def _search_index(self, index: TextIndex, queries: np.ndarray, top_k: int,
+                      candidates: int = None) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Search the index with normalized query embeddings.
+
+        Args:
+            index: Index to search, positions are only valid in this index
+            queries: Matrix of normalized query embeddings, one row per query version
+            top_k: Number of top results to return
+            candidates: Number of coarse search candidates reranked with the full embeddings, defaults to the configured number,
+                0 for the exact search
+
+        Returns:
+            Tuple of (chunk positions, similarities, article scores or None without aggregation)
+        """
+        if candidates is None:
+            candidates = self.config.coarse_candidates
+        if self.config.semantic_aggregation:
+            # Best chunks of the top_k distinct articles, so the prompt has no redundant context
+            return index.search_chunks_by_article(
+                queries, top_k, self.config.semantic_aggregation, self.search_executor, self.config.semantic_search_shards,
+                coarse_candidates=candidates)
+
+        positions, similarities = index.search_chunks(queries, top_k, self.search_executor, self.config.semantic_search_shards, candidates)
+        return positions, similarities, None
+
+    @staticmethod
+    def _chunk_results(index: TextIndex, positions: np.ndarray, similarities: np.ndarray, article_scores: np.ndarray = None) -> list[dict]:
+        """Search result records of chunk positions."""
+        results = []
+        for number, (position, similarity) in enumerate(zip(positions, similarities)):
+            result = index.chunk(position)
+            result['similarity'] = float(similarity)
+            if article_scores is not None:
+                result['article_score'] = float(article_scores[number])
+            results.append(result)
+        return results
+
+    def semantic_search(self, query_versions: list[str], top_k: int = 10, candidates: int = None, queries: np.ndarray = None) -> list[dict]:
         """
         Search articles using semantic similarity with multiple query versions.
 
         Args:
             query_versions: List of query variations
             top_k: Number of top results to return
+            candidates: Number of coarse search candidates reranked with the full embeddings, defaults to the configured number,
+                0 for the exact search
+            queries: Already generated normalized embeddings of the query versions
 
         Returns:
             List of article chunks with similarity scores
         """
-        # Generate embeddings for all query versions
-        query_embeddings = []
-        for query in query_versions:
-            embedding = self.generate_query_embedding(query)
-            if embedding is not None:
-                query_embeddings.append(embedding)
+        if queries is None:
+            queries = self.generate_normalized_queries(query_versions)
 
-        if not query_embeddings:
+        if queries is None:
             return []
 
-        # Calculate similarity scores for each article
-        results = []
-        for article in self.articles_with_embeddings:
-            article_embedding = np.array(article['embedding'])
-
-            # Calculate max similarity across all query versions
-            max_similarity = 0
-            for query_embedding in query_embeddings:
-                similarity = self.cosine_similarity(query_embedding, article_embedding)
-                max_similarity = max(max_similarity, similarity)
-
-            results.append({
-                'id': article['article_id'],
-                'title': article['article_title'],
-                'text': article['text'],
-                'similarity': max_similarity
-            })
-
-        # Sort by similarity and return top_k
-        results.sort(key=lambda x: x['similarity'], reverse=True)
-        return results[:top_k]
+        # The index can be replaced by a reload, positions are only valid in the index they come from
+        index = self.index
+        return self._chunk_results(index, *self._search_index(index, queries, top_k, candidates))
 
     def keyword_search(self, keywords: list[str], top_k: int = 10) -> list[dict]:
         """
@@ -201,55 +472,157 @@ Respond in JSON format:
         if not keywords:
             return []
 
-        results = []
-        for article in self.articles_raw:
-            text_lower = article['text'].lower()
-
-            # Count keyword matches
-            match_count = 0
-            matched_keywords = []
-            for keyword in keywords:
-                keyword_lower = keyword.lower()
-                count = text_lower.count(keyword_lower)
-                if count > 0:
-                    match_count += count
-                    matched_keywords.append(keyword)
-
-            if match_count > 0:
-                results.append({
-                    'id': article['id'],
-                    'title': article['title'],
-                    'text': article['text'],
-                    'match_count': match_count,
-                    'matched_keywords': matched_keywords
-                })
-
-        # Sort by match count and return top_k
-        results.sort(key=lambda x: x['match_count'], reverse=True)
-        return results[:top_k]
-
-    def search(self, query: str, top_k: int = 10) -> tuple[list[dict], list[dict], list[str], ApiStatistics]:
+        # Load texts only for the top_k articles
+        index = self.index
+        results = index.search_articles(keywords, top_k)
+        top_results = []
+        for position, match_count, matched_keywords in results:
+            result = index.article(position)
+            result['match_count'] = match_count
+            result['matched_keywords'] = matched_keywords
+            top_results.append(result)
+
+        return top_results
+
+    def _add_abandoned_expansion(self, expansion):
+        """Add the statistics of an expansion that finished after the latency budget to the abandoned statistics."""
+        if expansion.cancelled() or expansion.exception() is not None:
+            return
+        _, _, statistics = expansion.result()
+        with self.abandoned_lock:
+            self.abandoned_statistics = self.abandoned_statistics.sum(statistics)
+            total_cost = self.abandoned_statistics.total_cost
+        print(f"Abandoned query expansion finished, cost ${statistics.total_cost:.6f}, ${total_cost:.6f} in all abandoned expansions")
+
+    def _expand_speculatively(self, query: str, top_k: int, timings: dict) -> tuple:
+        """
+        Expand the query with the API while the original query is embedded and searched and its keywords are extracted locally.
+        The results of the new query versions are merged in when the expansion arrives, if it does not arrive
+        within the expansion latency budget, the results of the original query and the local keywords are used.
+
+        Args:
+            query: Original user query
+            top_k: Number of top results to return
+            timings: Dictionary of stage timings
+
+        Returns:
+            Tuple of (query_versions, keywords, statistics, query embeddings, semantic results or None to search them)
+        """
+        start_time = time.perf_counter()
+        expansion = self.expansion_executor.submit(contextvars.copy_context().run, self.expand_query, query, False)
+
+        _, local_keywords, _ = self.expand_query_fast(query)
+        raw_queries = self.generate_normalized_queries([query])
+        index = self.index
+        speculative = None
+        if raw_queries is not None and index is not None:
+            speculative = self._search_index(index, raw_queries, top_k)
+        timings['speculative search'] = time.perf_counter() - start_time
+
+        budget = self.config.expansion_latency_budget
+        try:
+            query_versions, keywords, statistics = expansion.result(
+                timeout=max(0.0, budget - (time.perf_counter() - start_time)) if budget else None)
+        except FutureTimeoutError:
+            # The abandoned expansion finishes in the background, its response is discarded but its cost is accounted
+            print(f"Query expansion exceeded {budget}s, using the results of the original query")
+            expansion.add_done_callback(self._add_abandoned_expansion)
+            query_versions, keywords, statistics = [query], local_keywords, ApiStatistics.empty()
+
+        if raw_queries is None:
+            return query_versions, keywords, statistics, None, None
+
+        # Only the new query versions are embedded, the original query embedding is reused
+        new_versions = [version for version in query_versions if version != query]
+        new_queries = self.generate_normalized_queries(new_versions) if new_versions else None
+        queries = raw_queries if new_queries is None else np.vstack([raw_queries, new_queries])
+
+        if speculative is None or index is not self.index or (new_queries is not None and self.config.semantic_aggregation):
+            # Article scores pool the chunks of all query versions, so they are searched together
+            return query_versions, keywords, statistics, queries, None
+
+        positions, similarities, article_scores = speculative
+        if new_queries is not None:
+            # A chunk scores its best similarity to any query version, so the top results of both searches contain the overall top results
+            new_positions, new_similarities, _ = self._search_index(index, new_queries, top_k)
+            positions = np.concatenate([positions, new_positions])
+            similarities = np.concatenate([similarities, new_similarities])
+            order = np.argsort(-similarities, kind='stable')
+            positions, similarities = positions[order], similarities[order]
+            _, first = np.unique(positions, return_index=True)
+            best = np.sort(first)[:top_k]
+            positions, similarities = positions[best], similarities[best]
+
+        return query_versions, keywords, statistics, queries, self._chunk_results(index, positions, similarities, article_scores)
+
+    def search(self, query: str, top_k: int = 10, query_versions: list[str] = None, keywords: list[str] = None,
+               fast_mode: bool = None, trace: dict = None) -> tuple[list[dict], list[dict], list[str], ApiStatistics]:
         """
         Perform hybrid search: semantic search with embeddings and keyword search.
 
         Args:
             query: User query
             top_k: Number of top results to return for each search method
+            query_versions: Already expanded query versions, skips query expansion if provided
+            keywords: Already extracted keywords, used together with query_versions
+            fast_mode: Whether to expand the query locally without API call, defaults to the configured mode
+            trace: Dictionary filled with the query versions, keywords and stage timings (None to skip)
 
         Returns:
             Tuple of (semantic_results, keyword_results, statistics)
         """
-        # Expand query to get variations and keywords
-        query_versions, keywords, statistics = self.expand_query(query)
+        if fast_mode is None:
+            fast_mode = self.config.text_fast_mode
+        timings = trace.setdefault('timings', {}) if trace is not None else {}
+
+        stage_start = time.perf_counter()
+        queries = None
+        semantic_results = None
+        if query_versions:
+            # Query is already expanded by the planner
+            keywords = keywords or []
+            statistics = ApiStatistics.empty()
+        elif fast_mode:
+            # Skip the API call so retrieval starts immediately
+            query_versions, keywords, statistics = self.expand_query_fast(query)
+        elif self.expansion_executor:
+            # Search with the original query while the expansion is in flight
+            query_versions, keywords, statistics, queries, semantic_results = self._expand_speculatively(query, top_k, timings)
+        else:
+            # Expand query to get variations and keywords
+            query_versions, keywords, statistics = self.expand_query(query)
+        timings['query expansion'] = time.perf_counter() - stage_start
+        if trace is not None:
+            trace['query_versions'] = query_versions
+            trace['keywords'] = keywords
 
         query_debug = []
         query_debug.append(f"\nQuery versions: {query_versions}")
         query_debug.append(f"Keywords: {keywords}\n")
 
+        if self.shard_client:
+            # Perform semantic and keyword search on all index shards
+            stage_start = time.perf_counter()
+            if queries is None:
+                queries = self.generate_normalized_queries(query_versions)
+            timings['query embeddings'] = time.perf_counter() - stage_start
+            stage_start = time.perf_counter()
+            semantic_results, keyword_results, failed_shards = self.shard_client.search(
+                queries, keywords, top_k, self.config.semantic_aggregation)
+            timings['index shards'] = time.perf_counter() - stage_start
+            if failed_shards:
+                query_debug.append(f"Partial results, missing index shards: {failed_shards}\n")
+            return semantic_results, keyword_results, query_debug, statistics
+
         # Perform semantic search
-        semantic_results = self.semantic_search(query_versions, top_k)
+        stage_start = time.perf_counter()
+        if semantic_results is None:
+            semantic_results = self.semantic_search(query_versions, top_k, queries=queries)
+        timings['semantic search'] = time.perf_counter() - stage_start
 
         # Perform keyword search
+        stage_start = time.perf_counter()
         keyword_results = self.keyword_search(keywords, top_k)
+        timings['keyword search'] = time.perf_counter() - stage_start
 
         return semantic_results, keyword_results, query_debug, statistics
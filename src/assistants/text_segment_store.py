@@ -0,0 +1,196 @@
+import json
+import os
+import shutil
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+
+from src.assistants.text_index import TextIndex
+
+
+class TextSegmentStore:
+    """
+    Text index stored as immutable segments listed in a manifest.
+    New articles are written as small delta segments, deleted articles are recorded as tombstones,
+    and compaction merges all segments into one while dropping the deleted data.
+
+    Every segment and tombstone gets a sequence number: a chunk of a segment is deleted when its article
+    has a tombstone with a higher sequence, so an article can be deleted and added again later.
+    """
+
+    MANIFEST = "manifest.json"
+    LOCK = "manifest.lock"
+
+    def __init__(self, folder: Path, lock_timeout: float = 30.0):
+        """
+        Initialize the TextSegmentStore.
+
+        Args:
+            folder: Folder with the manifest and segment folders
+            lock_timeout: Seconds after which a lock left by a crashed process is broken
+        """
+        self.folder = folder
+        self.lock_timeout = lock_timeout
+
+    def exists(self) -> bool:
+        """Whether the store has been initialized."""
+        return (self.folder / self.MANIFEST).exists()
+
+    def read_manifest(self) -> dict:
+        """Read the current manifest, an empty one if the store is not initialized."""
+        try:
+            with open(self.folder / self.MANIFEST, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"generation": 0, "next_sequence": 1, "segments": [], "tombstones": {}}
+
+    def _write_manifest(self, manifest: dict):
+        """Replace the manifest atomically, so readers never see a partial one."""
+        manifest['generation'] += 1
+        temp_path = self.folder / f"{self.MANIFEST}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        os.replace(temp_path, self.folder / self.MANIFEST)
+
+    @contextmanager
+    def _lock(self):
+        """Serialize manifest updates between processes with a lock file."""
+        self.folder.mkdir(parents=True, exist_ok=True)
+        lock_path = self.folder / self.LOCK
+        start_time = time.time()
+        while True:
+            try:
+                descriptor = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                os.close(descriptor)
+                break
+            except FileExistsError:
+                if time.time() - start_time > self.lock_timeout:
+                    print(f"Breaking stale segment store lock {lock_path}")
+                    lock_path.unlink(missing_ok=True)
+                time.sleep(0.05)
+        try:
+            yield
+        finally:
+            lock_path.unlink(missing_ok=True)
+
+    def _write_segment(self, index: TextIndex) -> str:
+        """Write the index as a new segment folder, returning its name."""
+        name = f"segment-{uuid.uuid4().hex[:16]}"
+        index.save(self.folder / name)
+        return name
+
+    def add(self, index: TextIndex) -> dict:
+        """
+        Append articles as a new segment, replacing earlier versions of articles with the same ids.
+
+        Args:
+            index: Index with the new articles and their chunks
+
+        Returns:
+            Manifest entry of the new segment
+        """
+        name = self._write_segment(index)
+
+        with self._lock():
+            manifest = self.read_manifest()
+            sequence = manifest['next_sequence']
+            manifest['next_sequence'] = sequence + 2
+            # Earlier versions are deleted by a tombstone just before the new segment
+            if manifest['segments']:
+                for article_id in index.article_ids:
+                    manifest['tombstones'][article_id] = sequence
+            segment = {"name": name, "sequence": sequence + 1, "chunks": index.chunk_count, "articles": index.article_count}
+            manifest['segments'].append(segment)
+            self._write_manifest(manifest)
+
+        return segment
+
+    def delete(self, article_ids: list[str]):
+        """
+        Delete articles from all existing segments.
+
+        Args:
+            article_ids: Ids of the articles to delete
+        """
+        with self._lock():
+            manifest = self.read_manifest()
+            sequence = manifest['next_sequence']
+            manifest['next_sequence'] = sequence + 1
+            for article_id in article_ids:
+                manifest['tombstones'][article_id] = sequence
+            self._write_manifest(manifest)
+
+    def load(self, manifest: dict = None, cache: dict[str, TextIndex] = None) -> TextIndex:
+        """
+        Load all segments of a manifest and combine their live data into one index.
+        Only new segments are read from disk, but the live embeddings of all segments are copied into a new matrix
+        and every article is checked against the tombstones, so a reload takes time proportional to the whole corpus
+        and briefly holds the embeddings twice while searches use the previous index.
+
+        Args:
+            manifest: Manifest to load, the current one if None
+            cache: Already loaded segments by name, updated with the newly loaded ones,
+                so a reload reads only the new segments from disk
+
+        Returns:
+            TextIndex with the live articles of all segments
+        """
+        manifest = manifest or self.read_manifest()
+        cache = cache if cache is not None else {}
+        tombstones = manifest['tombstones']
+
+        parts = []
+        for segment in manifest['segments']:
+            if segment['name'] not in cache:
+                cache[segment['name']] = TextIndex.load(self.folder / segment['name'])
+            index = cache[segment['name']]
+            if tombstones:
+                live_articles = np.array([tombstones.get(article_id, 0) < segment['sequence'] for article_id in index.article_ids], dtype=bool)
+            else:
+                live_articles = np.ones(index.article_count, dtype=bool)
+            parts.append((index, live_articles))
+
+        # Forget segments removed by compaction
+        for name in set(cache) - {segment['name'] for segment in manifest['segments']}:
+            del cache[name]
+
+        return TextIndex.combine(parts)
+
+    def compact(self) -> bool:
+        """
+        Merge all segments into one, dropping deleted articles, while new segments can still be added.
+
+        Returns:
+            Whether the segments were compacted
+        """
+        manifest = self.read_manifest()
+        if not manifest['segments'] or (len(manifest['segments']) < 2 and not manifest['tombstones']):
+            return False
+
+        start_time = time.time()
+        merged = self.load(manifest)
+        # The merged segment reflects all tombstones up to the last merged segment
+        sequence = max(segment['sequence'] for segment in manifest['segments'])
+        merged_names = {segment['name'] for segment in manifest['segments']}
+        name = self._write_segment(merged)
+
+        with self._lock():
+            current = self.read_manifest()
+            if not merged_names <= {segment['name'] for segment in current['segments']}:
+                # Another process has compacted the same segments in the meantime
+                shutil.rmtree(self.folder / name, ignore_errors=True)
+                return False
+            added_segments = [segment for segment in current['segments'] if segment['name'] not in merged_names]
+            current['segments'] = [{"name": name, "sequence": sequence, "chunks": merged.chunk_count, "articles": merged.article_count}] + added_segments
+            current['tombstones'] = {article_id: value for article_id, value in current['tombstones'].items() if value > sequence}
+            self._write_manifest(current)
+
+        # Processes still reading the old segments retry with the new manifest
+        for name in merged_names:
+            shutil.rmtree(self.folder / name, ignore_errors=True)
+
+        print(f"Compacted {len(merged_names)} text segments into {merged.chunk_count} chunks in {time.time() - start_time:.2f}s")
+        return True
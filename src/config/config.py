@@ -21,7 +21,42 @@ class Config:
         file_articles_length: str,
         file_articles_raw: str,
         sql_search_debug: bool,
-        text_search_debug: bool
+        text_search_debug: bool,
+        use_combined_planner: bool = False,
+        file_articles_idf: str = None,
+        text_fast_mode: bool = False,
+        expansion_latency_budget: float = None,
+        sql_pool_size: int = 4,
+        embeddings_batch_wait: float = None,
+        embeddings_batch_size: int = 256,
+        rate_limits: dict[str, tuple[int, int]] = None,
+        api_max_retries: int = 5,
+        background_startup: bool = True,
+        text_shared_index: dict = None,
+        semantic_search_shards: int = 1,
+        text_index_shards: list[str] = None,
+        text_local_shards: int = 0,
+        shard_timeout: float = 2.0,
+        semantic_aggregation: str = None,
+        folder_text_segments: str = None,
+        segment_reload_interval: float = 5.0,
+        segment_compaction_threshold: int = 8,
+        folder_text_index: str = None,
+        file_index_snapshot: str = None,
+        coarse_dimensions: int = None,
+        coarse_method: str = 'truncate',
+        coarse_candidates: int = 200,
+        file_sql_workload: str = None,
+        sql_auto_index: bool = False,
+        sql_auto_index_queries: int = 100,
+        file_query_log: str = None,
+        sql_summary_tables: bool = True,
+        hedge_percentile: float = None,
+        hedge_min_samples: int = 20,
+        speculative_retrieval: bool = False,
+        profile_questions: int = 0,
+        coarse_quantization: str = None,
+        prepare_data: bool = True
     ):
         """
         Initialize the configuration.
@@ -42,6 +77,41 @@ class Config:
             file_articles_raw: Path to file with full articles content
             sql_search_debug: Whether to show detailed SQL analysis
             text_search_debug: Whether to show detailed text search analysis
+            use_combined_planner: Whether to plan SQL subtasks and text search expansion with a single API call
+            file_articles_idf: Path to file with corpus IDF statistics for the local keyword extraction
+            text_fast_mode: Whether to extract keywords locally and skip the query expansion API call
+            expansion_latency_budget: Seconds after which query expansion falls back to the fast mode (None to wait)
+            sql_pool_size: Maximum number of idle database connections kept for reuse
+            embeddings_batch_wait: Seconds to collect query embedding requests into one API call (None to disable)
+            embeddings_batch_size: Maximum number of texts in one batched embeddings API call
+            rate_limits: Requests per minute and tokens per minute per model name, e.g. {"gpt-5-mini": (500, 500000)}
+            api_max_retries: Number of retries for rate limit, connection and server errors of the OpenAI API
+            background_startup: Whether to load data and indexes in a background thread while accepting questions
+            text_shared_index: Handle of a text index placed in shared memory by a parent process, loaded from files if None
+            semantic_search_shards: Number of shards of the embedding matrix scored in parallel threads (1 to disable)
+            text_index_shards: URLs of index shard servers to search instead of a local text index
+            text_local_shards: Number of index shard servers to start as local processes (0 to disable)
+            shard_timeout: Seconds to wait for each index shard server, slower shards are left out of the results
+            semantic_aggregation: Rank articles by 'max' or 'sum' of their chunk similarities and return their best chunks (None for chunk ranking)
+            folder_text_segments: Path to folder with incrementally updated text segments, used instead of the article files once created
+            segment_reload_interval: Seconds between checks for changed text segments
+            segment_compaction_threshold: Number of text segments above which they are merged in the background
+            folder_text_index: Path to folder with the binary text index built from the article files, texts are memory-mapped from it (None to keep all in memory)
+            file_index_snapshot: Path to index snapshot installed instead of preparing the data, if the file exists
+            coarse_dimensions: Dimensions of the embeddings scanned before reranking the candidates with the full embeddings (None to disable)
+            coarse_method: How the coarse embeddings are reduced, 'truncate' or 'pca'
+            coarse_candidates: Number of coarse search candidates reranked with the full embeddings
+            file_sql_workload: Path to JSONL log of executed SQL queries with their timings (None to disable)
+            sql_auto_index: Whether to run the index advisor in the background and apply the indexes it validates
+            sql_auto_index_queries: Number of logged SQL queries between background index advisor runs
+            file_query_log: Path to JSONL log of answered questions with their stage timings and API responses for replay (None to disable)
+            sql_summary_tables: Whether to build precomputed sales summary tables and describe them in the database metadata
+            hedge_percentile: Latency percentile of earlier chat completions after which a duplicate request is sent (None to disable)
+            hedge_min_samples: Number of completed chat completions of a kind before they are hedged
+            speculative_retrieval: Whether to search with the original query while the query expansion is in flight
+            profile_questions: Number of questions profiled from the start, more can be requested with the /profile command
+            coarse_quantization: 'int8' to store the coarse embeddings with one byte per dimension (None for float32)
+            prepare_data: Whether the startup prepares the data, disabled in service workers of a parent that prepared it
         """
         self.open_ai_api_key = open_ai_api_key
 
@@ -60,6 +130,49 @@ class Config:
         self.file_articles_sentences = file_articles_sentences
         self.file_articles_length = file_articles_length
         self.file_articles_raw = file_articles_raw
+        self.file_articles_idf = file_articles_idf
 
         self.sql_search_debug = sql_search_debug
         self.text_search_debug = text_search_debug
+
+        self.use_combined_planner = use_combined_planner
+        self.text_fast_mode = text_fast_mode
+        self.expansion_latency_budget = expansion_latency_budget
+        self.sql_pool_size = sql_pool_size
+        self.embeddings_batch_wait = embeddings_batch_wait
+        self.embeddings_batch_size = embeddings_batch_size
+        self.rate_limits = rate_limits or {}
+        self.api_max_retries = api_max_retries
+        self.background_startup = background_startup
+        self.text_shared_index = text_shared_index
+        self.semantic_search_shards = semantic_search_shards
+        self.text_index_shards = text_index_shards or []
+        self.text_local_shards = text_local_shards
+        self.shard_timeout = shard_timeout
+        self.semantic_aggregation = semantic_aggregation
+        self.folder_text_segments = folder_text_segments
+        self.segment_reload_interval = segment_reload_interval
+        self.segment_compaction_threshold = segment_compaction_threshold
+        self.folder_text_index = folder_text_index
+        self.file_index_snapshot = file_index_snapshot
+        self.coarse_dimensions = coarse_dimensions
+        self.coarse_method = coarse_method
+        self.coarse_candidates = coarse_candidates
+        self.file_sql_workload = file_sql_workload
+        self.sql_auto_index = sql_auto_index
+        self.sql_auto_index_queries = sql_auto_index_queries
+        self.file_query_log = file_query_log
+        self.sql_summary_tables = sql_summary_tables
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.speculative_retrieval = speculative_retrieval
+        self.profile_questions = profile_questions
+        self.coarse_quantization = coarse_quantization
+        self.prepare_data = prepare_data
+
+        if semantic_aggregation not in (None, 'max', 'sum'):
+            raise ValueError(f"Unknown semantic aggregation '{semantic_aggregation}', use 'max' or 'sum'")
+        if coarse_method not in ('truncate', 'pca'):
+            raise ValueError(f"Unknown coarse method '{coarse_method}', use 'truncate' or 'pca'")
+        if coarse_quantization not in (None, 'int8'):
+            raise ValueError(f"Unknown coarse quantization '{coarse_quantization}', use 'int8'")
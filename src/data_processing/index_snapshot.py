@@ -0,0 +1,192 @@
+import hashlib
+import io
+import json
+import os
+import shutil
+import tarfile
+import time
+from pathlib import Path
+
+from src.config.config import Config
+from src.data_processing.text_data_preparator import TextDataPreparator
+
+
+class IndexSnapshot:
+    """
+    Packages the prepared data into a single compressed snapshot and installs it on other nodes,
+    so they become ready without preparing the data again.
+
+    The snapshot is a tar.gz with a manifest.json describing the embedding model, chunking parameters,
+    corpus hash and SHA-256 checksum of every file, followed by the files relative to the ready folder.
+    """
+
+    FORMAT_VERSION = 1
+    MANIFEST = "manifest.json"
+    INSTALLED = "installed_snapshot.json"
+
+    def __init__(self, config: Config):
+        """
+        Initialize the IndexSnapshot.
+
+        Args:
+            config: Application configuration including models and paths
+        """
+        self.config = config
+        self.folder_ready = Path(config.folder_ready)
+
+    @staticmethod
+    def file_hash(path: Path) -> str:
+        """SHA-256 of a file, read in blocks."""
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def _artifacts(self) -> list[Path]:
+        """Prepared files to package, relative to the ready folder."""
+        files = [
+            self.config.file_sql_metadata,
+            self.config.file_db,
+            self.config.file_articles_raw,
+            self.config.file_articles_length,
+        ]
+        # Sentence chunks are only prepared on request
+        if Path(self.config.file_articles_sentences).exists():
+            files.append(self.config.file_articles_sentences)
+        if self.config.file_articles_idf and Path(self.config.file_articles_idf).exists():
+            files.append(self.config.file_articles_idf)
+
+        # Binary text index and text segments, if they have been created
+        for folder in (self.config.folder_text_index, self.config.folder_text_segments):
+            if folder and Path(folder).is_dir():
+                files.extend(path for path in sorted(Path(folder).rglob('*')) if path.is_file() and not path.name.endswith('.lock'))
+
+        missing = [str(path) for path in files if not Path(path).exists()]
+        if missing:
+            raise RuntimeError(f"Data is not prepared, missing {', '.join(missing)}")
+
+        return [Path(path).relative_to(self.folder_ready) for path in files]
+
+    def export(self, snapshot_path: Path) -> dict:
+        """
+        Package the prepared data into a snapshot file.
+
+        Args:
+            snapshot_path: Path of the .tar.gz snapshot to create
+
+        Returns:
+            Manifest of the snapshot
+        """
+        start_time = time.time()
+        files = self._artifacts()
+        checksums = {path.as_posix(): self.file_hash(self.folder_ready / path) for path in files}
+
+        manifest = {
+            "format_version": self.FORMAT_VERSION,
+            # Identifies the content, the same data gives the same id
+            "snapshot_id": hashlib.sha256(json.dumps(checksums, sort_keys=True).encode('utf-8')).hexdigest()[:16],
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "embedding_model": self.config.model_embeddings.model_name,
+            "chunking": TextDataPreparator.CHUNKING,
+            "corpus_hash": checksums[Path(self.config.file_articles_raw).relative_to(self.folder_ready).as_posix()],
+            "files": checksums
+        }
+
+        temp_path = snapshot_path.with_name(f"{snapshot_path.name}.tmp")
+        with tarfile.open(temp_path, 'w:gz') as archive:
+            content = json.dumps(manifest, ensure_ascii=False, indent=2).encode('utf-8')
+            info = tarfile.TarInfo(self.MANIFEST)
+            info.size = len(content)
+            info.mtime = int(time.time())
+            archive.addfile(info, fileobj=io.BytesIO(content))
+            for path in files:
+                archive.add(self.folder_ready / path, arcname=f"files/{path.as_posix()}")
+        os.replace(temp_path, snapshot_path)
+
+        size = snapshot_path.stat().st_size / 1024 / 1024
+        print(f"Exported snapshot {manifest['snapshot_id']} with {len(files)} files ({size:.1f} MB) to {snapshot_path} "
+              f"in {time.time() - start_time:.1f}s")
+        return manifest
+
+    def read_manifest(self, snapshot_path: Path) -> dict:
+        """Read the manifest of a snapshot without extracting it."""
+        with tarfile.open(snapshot_path, 'r:gz') as archive:
+            return json.load(archive.extractfile(self.MANIFEST))
+
+    def installed(self) -> dict:
+        """Manifest of the installed snapshot, None if no snapshot is installed."""
+        try:
+            with open(self.folder_ready / self.INSTALLED, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def validate(self, manifest: dict):
+        """Raise if the snapshot cannot be used with the current configuration."""
+        if manifest.get('format_version') != self.FORMAT_VERSION:
+            raise RuntimeError(f"Unsupported snapshot format version {manifest.get('format_version')}, expected {self.FORMAT_VERSION}")
+        if manifest['embedding_model'] != self.config.model_embeddings.model_name:
+            raise RuntimeError(f"Snapshot embeddings are made with {manifest['embedding_model']}, "
+                               f"but queries are embedded with {self.config.model_embeddings.model_name}")
+        if manifest.get('chunking') != TextDataPreparator.CHUNKING:
+            raise RuntimeError(f"Snapshot articles are chunked with {manifest.get('chunking')}, "
+                               f"but articles are chunked with {TextDataPreparator.CHUNKING}")
+
+    def install(self, snapshot_path: Path) -> bool:
+        """
+        Validate and install a snapshot into the ready folder, unless it is already installed.
+
+        Args:
+            snapshot_path: Path of the .tar.gz snapshot
+
+        Returns:
+            Whether the snapshot was installed
+        """
+        manifest = self.read_manifest(snapshot_path)
+        self.validate(manifest)
+
+        installed = self.installed()
+        if installed and installed['snapshot_id'] == manifest['snapshot_id'] \
+                and all((self.folder_ready / path).exists() for path in manifest['files']):
+            return False
+
+        start_time = time.time()
+        temp_folder = self.folder_ready / ".snapshot.tmp"
+        shutil.rmtree(temp_folder, ignore_errors=True)
+        temp_folder.mkdir(parents=True)
+        try:
+            with tarfile.open(snapshot_path, 'r:gz') as archive:
+                members = [member for member in archive.getmembers() if member.name.startswith('files/')]
+                for member in members:
+                    relative_path = member.name[len('files/'):]
+                    if not member.isfile() or relative_path not in manifest['files'] \
+                            or Path(relative_path).is_absolute() or '..' in Path(relative_path).parts:
+                        raise RuntimeError(f"Unexpected entry {member.name} in snapshot")
+                    member.name = relative_path
+                    archive.extract(member, temp_folder)
+
+            for relative_path, checksum in manifest['files'].items():
+                path = temp_folder / relative_path
+                if not path.exists():
+                    raise RuntimeError(f"Snapshot is missing {relative_path}")
+                if self.file_hash(path) != checksum:
+                    raise RuntimeError(f"Checksum mismatch of {relative_path}, snapshot is corrupted")
+
+            # Replace the whole text index and segment folders, so no stale files remain
+            for folder in (self.config.folder_text_index, self.config.folder_text_segments):
+                if folder and (temp_folder / Path(folder).relative_to(self.folder_ready)).is_dir():
+                    shutil.rmtree(folder, ignore_errors=True)
+            for relative_path in manifest['files']:
+                target = self.folder_ready / relative_path
+                target.parent.mkdir(parents=True, exist_ok=True)
+                os.replace(temp_folder / relative_path, target)
+        finally:
+            shutil.rmtree(temp_folder, ignore_errors=True)
+
+        with open(self.folder_ready / self.INSTALLED, 'w', encoding='utf-8') as f:
+            json.dump({key: value for key, value in manifest.items() if key != 'files'}, f, ensure_ascii=False, indent=2)
+
+        print(f"Installed snapshot {manifest['snapshot_id']} created {manifest['created_at']} "
+              f"with {len(manifest['files'])} files in {time.time() - start_time:.1f}s")
+        return True
@@ -0,0 +1,249 @@
+import json
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Callable
+
+from openai import OpenAI
+
+from src.config.config import Config
+from src.data_processing.data_processing_utils import DataProcessingUtils
+from src.data_processing.index_snapshot import IndexSnapshot
+from src.data_processing.sql_data_preparator import SqlDataPreparator
+from src.data_processing.sql_summary_tables import SqlSummaryTables
+from src.data_processing.text_data_preparator import TextDataPreparator
+
+
+class PrepStage:
+    """Data preparation step with the files it reads and the files it creates."""
+
+    def __init__(self, name: str, run: Callable[[], None], inputs: list[Path] = (), outputs: list[Path] = (), updates: list[Path] = ()):
+        """
+        Initialize the PrepStage.
+
+        Args:
+            name: Stage name shown in the report
+            run: Function preparing the outputs, returning False if there was nothing to do
+            inputs: Files read by the stage, a stage creating one of them runs first
+            outputs: Files created by the stage, a stage without outputs runs every time, e.g. one with its own staleness check
+            updates: Files read and changed in place by the stage, the other stages reading them run after it
+        """
+        self.name = name
+        self.run = run
+        self.inputs = [Path(path) for path in inputs]
+        self.outputs = [Path(path) for path in outputs]
+        self.updates = [Path(path) for path in updates]
+
+
+class PrepPipeline:
+    """
+    Data preparation as a graph of stages connected by their input and output files.
+    A stage runs if one of its outputs is missing or the content of its inputs has changed since it last ran,
+    stages run as soon as the stages creating their inputs are done, independent stages run concurrently.
+    """
+
+    STATE_FILE = "prep_state.json"
+
+    def __init__(self, stages: list[PrepStage], state_path: Path):
+        """
+        Initialize the PrepPipeline.
+
+        Args:
+            stages: Preparation stages, each output is created by one stage
+            state_path: Path to the JSON file with the input hashes of the last run of each stage
+        """
+        self.stages = {stage.name: stage for stage in stages}
+        self.state_path = state_path
+        self.lock = threading.Lock()
+
+        producers = {output: stage.name for stage in stages for output in stage.outputs}
+        updaters = {path: stage.name for stage in stages for path in stage.updates}
+        self.dependencies = {}
+        for stage in stages:
+            # A file changed in place is ready for its readers once updated, for its updater once created
+            sources = [updaters.get(path) if updaters.get(path, stage.name) != stage.name else producers.get(path)
+                       for path in stage.inputs + stage.updates]
+            self.dependencies[stage.name] = {source for source in sources if source}
+
+    @classmethod
+    def for_config(cls, client: OpenAI, config: Config) -> 'PrepPipeline':
+        """
+        Pipeline preparing the database, its metadata and the articles.
+
+        Args:
+            client: OpenAI client instance for generating metadata and embeddings
+            config: Application configuration including models and paths
+
+        Returns:
+            PrepPipeline with all stages, see targets for the stages the application needs
+        """
+        sql = SqlDataPreparator(client, config)
+        text = TextDataPreparator(client, config)
+
+        def generate_metadata():
+            sql.generate_metadata()
+            if config.sql_summary_tables:
+                SqlSummaryTables(sql.db_file_path).add_to_metadata(config.file_sql_metadata)
+
+        def prepare_articles():
+            DataProcessingUtils.unzip_file(text.zip_path, text.extract_dir)
+            text.process_jsonl()
+
+        stages = [
+            PrepStage("database", lambda: DataProcessingUtils.unzip_file(sql.db_zip_path, config.folder_ready),
+                      inputs=[sql.db_zip_path], outputs=[sql.db_file_path]),
+            PrepStage("schema", sql.extract_schema, inputs=[sql.db_file_path], outputs=[sql.db_schema_path]),
+            PrepStage("schema metadata", generate_metadata,
+                      inputs=[sql.db_file_path, sql.db_metadata_format_path], outputs=[config.file_sql_metadata]),
+            PrepStage("articles", prepare_articles, inputs=[text.zip_path], outputs=[config.file_articles_raw]),
+            PrepStage("sentence chunks", lambda: text.generate_embeddings_for_chunks(chunk_by_sentence=True),
+                      inputs=[config.file_articles_raw], outputs=[config.file_articles_sentences]),
+            PrepStage("length chunks", lambda: text.generate_embeddings_for_chunks(chunk_by_sentence=False),
+                      inputs=[config.file_articles_raw], outputs=[config.file_articles_length]),
+        ]
+        if config.sql_summary_tables:
+            # The database is hashed by the schema stages after the summary tables are added, a rebuild updates their metadata
+            stages.append(PrepStage("summary tables", lambda: SqlSummaryTables(sql.db_file_path).refresh(), updates=[sql.db_file_path]))
+        if config.file_articles_idf:
+            stages.append(PrepStage("keyword statistics", text.generate_keyword_statistics,
+                                    inputs=[config.file_articles_raw], outputs=[config.file_articles_idf]))
+
+        return cls(stages, Path(config.folder_ready) / cls.STATE_FILE)
+
+    @staticmethod
+    def targets(config: Config) -> list[str]:
+        """Stages creating the data loaded by the configured assistants, the text assistant only loads the length chunks."""
+        targets = ["schema metadata"]
+        if config.sql_summary_tables:
+            targets.append("summary tables")
+        if not config.text_index_shards:
+            targets.append("length chunks")
+            if config.file_articles_idf:
+                targets.append("keyword statistics")
+        return targets
+
+    def _required(self, targets: list[str]) -> set[str]:
+        """Target stages with all stages they depend on."""
+        required = set()
+        pending = list(targets)
+        while pending:
+            name = pending.pop()
+            if name not in required:
+                required.add(name)
+                pending.extend(self.dependencies[name])
+        return required
+
+    def _load_state(self) -> dict:
+        """Input hashes of the stages and cached file hashes."""
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {"stages": {}, "files": {}}
+
+    def _save_state(self, state: dict):
+        """Save the state, the caller holds the lock."""
+        with open(self.state_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f, ensure_ascii=False, indent=2)
+
+    def _file_hash(self, path: Path, state: dict) -> str:
+        """Content hash of a file, rehashed only if its size or modification time has changed, None if it does not exist."""
+        if not path.exists():
+            return None
+        stat = path.stat()
+        with self.lock:
+            cached = state['files'].get(str(path))
+        if cached and cached[0] == stat.st_size and cached[1] == stat.st_mtime_ns:
+            return cached[2]
+        digest = IndexSnapshot.file_hash(path)
+        with self.lock:
+            state['files'][str(path)] = [stat.st_size, stat.st_mtime_ns, digest]
+        return digest
+
+    def _run_stage(self, stage: PrepStage, state: dict) -> str:
+        """
+        Run a stage unless it is up to date.
+
+        Returns:
+            'ran' or 'up to date'
+        """
+        input_hashes = {str(path): self._file_hash(path, state) for path in stage.inputs + stage.updates}
+        with self.lock:
+            recorded = state['stages'].get(stage.name)
+
+        if stage.outputs and all(path.exists() for path in stage.outputs):
+            # Outputs prepared before the pipeline recorded them, or installed from a snapshot without the inputs, are kept
+            if recorded is None or None in input_hashes.values() or recorded == input_hashes:
+                with self.lock:
+                    state['stages'][stage.name] = input_hashes
+                    self._save_state(state)
+                return 'up to date'
+
+        result = stage.run()
+        # Files changed by the stage are recorded as it left them
+        input_hashes.update({str(path): self._file_hash(path, state) for path in stage.updates})
+        with self.lock:
+            state['stages'][stage.name] = input_hashes
+            self._save_state(state)
+        return 'up to date' if result is False else 'ran'
+
+    def run(self, targets: list[str] = None, report: bool = False) -> dict[str, dict]:
+        """
+        Run the stages needed for the targets, each as soon as the stages it depends on are done.
+        Stages depending on a failed stage are skipped, the first error is raised once the other stages are done.
+
+        Args:
+            targets: Names of the stages to bring up to date (None for all stages)
+            report: Whether to print the stage durations even if all stages are up to date
+
+        Returns:
+            Status and duration in seconds of each stage
+        """
+        required = self._required(targets or list(self.stages))
+        state = self._load_state()
+        results = {}
+        errors = []
+        start_time = time.time()
+
+        with ThreadPoolExecutor(max_workers=len(required), thread_name_prefix="prep-stage") as executor:
+            running = {}
+            started = {}
+            while True:
+                finished = {name for name, result in results.items() if result['status'] in ('ran', 'up to date')}
+                for name in sorted(required - results.keys() - started.keys()):
+                    if any(results.get(dependency, {}).get('status') in ('failed', 'skipped') for dependency in self.dependencies[name]):
+                        results[name] = {"status": "skipped", "seconds": 0.0}
+                    elif self.dependencies[name] <= finished:
+                        started[name] = time.time()
+                        running[executor.submit(self._run_stage, self.stages[name], state)] = name
+
+                if not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    seconds = time.time() - started.pop(name)
+                    try:
+                        results[name] = {"status": future.result(), "seconds": seconds}
+                    except Exception as e:
+                        print(f"❌ Preparation stage {name} failed: {e}")
+                        results[name] = {"status": "failed", "seconds": seconds}
+                        errors.append(e)
+
+        results = {name: results[name] for name in self.stages if name in results}
+        if report or errors or any(result['status'] == 'ran' for result in results.values()):
+            self.print_report(results, time.time() - start_time)
+        if errors:
+            raise errors[0]
+        return results
+
+    @staticmethod
+    def print_report(results: dict[str, dict], elapsed: float):
+        """Print the status and duration of each stage."""
+        print("\n" + "="*60)
+        print(f"DATA PREPARATION ({elapsed:.2f}s)")
+        print("="*60)
+        for name, result in results.items():
+            print(f"{name:<20} {result['status']:<12} {result['seconds']:>10.2f}s")
+        print("="*60)
@@ -1,15 +1,23 @@
+import hashlib
 import json
+import re
 import sqlite3
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from openai import OpenAI
 
 from src.config.config import Config
 from src.data_processing.data_processing_utils import DataProcessingUtils
+from src.data_processing.sql_summary_tables import SqlSummaryTables
+from src.models.gpt_model import ApiStatistics
 
 
 class SqlDataPreparator:
     """Class for preparing database and metadata files."""
 
+    # Concurrent metadata calls, one per table or view
+    METADATA_WORKERS = 8
+
     def __init__(self, client: OpenAI, config: Config):
         """
         Initialize DataPreparator.
@@ -28,6 +36,7 @@ class SqlDataPreparator:
 
         self.db_file_path = self.config.folder_ready / "northwind.db"
         self.db_schema_path = self.config.folder_ready / "northwind_schema.sql"
+        self.metadata_cache_path = self.config.folder_ready / "northwind_metadata_cache.json"
 
     def extract_schema(self):
         """Extract the full schema and save to a file."""
@@ -39,13 +48,14 @@ class SqlDataPreparator:
             cursor = conn.cursor()
 
             # Get the full schema (equivalent to .fullschema command)
-            # This retrieves all CREATE statements for tables, indexes, triggers, and views
+            # This retrieves all CREATE statements for tables, indexes, triggers, and views,
+            # summary tables are described separately
             cursor.execute("""
                 SELECT sql || ';'
                 FROM sqlite_master
-                WHERE sql IS NOT NULL
+                WHERE sql IS NOT NULL AND name NOT LIKE ?
                 ORDER BY type DESC, name
-            """)
+            """, (f"{SqlSummaryTables.PREFIX}%",))
 
             schema_statements = cursor.fetchall()
 
@@ -65,86 +75,251 @@ class SqlDataPreparator:
             print(f"Error extracting schema: {str(e)}")
             raise
 
-    def generate_metadata(self):
-        """Generate database metadata description using OpenAI API."""
-        print(f"Reading schema from {self.db_schema_path}...")
+    def schema_objects(self) -> list[dict]:
+        """
+        Read the tables and views with their indexes and the objects they reference, summary tables are described separately.
 
+        Returns:
+            List of objects with type, name, CREATE statements and names of referenced objects, tables first
+        """
+        conn = sqlite3.connect(self.db_file_path)
         try:
-            # Start timing
-            start_time = time.time()
+            rows = conn.execute("""
+                SELECT type, name, tbl_name, sql || ';'
+                FROM sqlite_master
+                WHERE sql IS NOT NULL AND name NOT LIKE 'sqlite_%' AND name NOT LIKE ?
+                ORDER BY type, name
+            """, (f"{SqlSummaryTables.PREFIX}%",)).fetchall()
+
+            objects = {name: {"type": object_type, "name": name, "statements": [sql], "references": set()}
+                       for object_type, name, _, sql in rows if object_type in ('table', 'view')}
+            for object_type, name, table, sql in rows:
+                if object_type in ('index', 'trigger') and table in objects:
+                    objects[table]['statements'].append(sql)
+
+            for name, schema_object in objects.items():
+                if schema_object['type'] == 'table':
+                    schema_object['references'] = {row[2] for row in conn.execute(f'PRAGMA foreign_key_list("{name}")')} & objects.keys()
+                else:
+                    # Views reference objects by quoted or plain names in their SELECT statement
+                    view_sql = schema_object['statements'][0]
+                    schema_object['references'] = {other for other in objects if other != name and re.search(
+                        rf'["\[`]{re.escape(other)}["\]`]|\b{re.escape(other)}\b', view_sql, re.IGNORECASE)}
+        finally:
+            conn.close()
 
-            # Read the schema SQL file
-            with open(self.db_schema_path, 'r', encoding='utf-8') as f:
-                schema_content = f.read()
+        return list(objects.values())
+
+    def _object_hash(self, schema_object: dict) -> str:
+        """Hash of the CREATE statements of an object and the model describing it, identifies cached metadata."""
+        content = "\n".join([self.gpt_model.model_name] + schema_object['statements'])
+        return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+    def _create_metadata(self, response_format_schema: dict, prompt: str, reasoning_effort: str) -> tuple[dict, ApiStatistics]:
+        """Call OpenAI API with a metadata prompt and return the parsed response with its statistics."""
+        start_time = time.time()
+        response = self.client.chat.completions.create(
+            model=self.gpt_model.model_name,
+            reasoning_effort=reasoning_effort,
+            response_format={
+                "type": "json_schema",
+                "json_schema": response_format_schema
+            },
+            messages=[
+                {
+                    "role": "system",
+                    "content": f"""You are a database documentation expert. Analyze SQL schemas and provide clear, comprehensive descriptions.
+                     The descriptions should be in format understandable by large language models.
+                     The descriptions will be used by LLM to map user input to a database table."""
+                },
+                {
+                    "role": "user",
+                    "content": prompt
+                }
+            ],
+        )
+        statistics = self.gpt_model.prepare_statistics(time.time() - start_time, response.usage)
+        return json.loads(response.choices[0].message.content), statistics
+
+    def generate_object_metadata(self, schema_object: dict, neighbours: list[dict], table_schema: dict) -> tuple[dict, ApiStatistics]:
+        """
+        Generate the metadata of one table or view, seeing only the object and its foreign key neighbours.
 
-            # Read the metadata output format
-            with open(self.db_metadata_format_path, 'r', encoding='utf-8') as f:
-                response_format_schema = json.loads(f.read())
+        Args:
+            schema_object: Table or view to describe
+            neighbours: Objects it references or that reference it, for describing the relationships
+            table_schema: JSON schema of a table entry of the metadata format
 
-            print("Generating metadata using OpenAI API...")
+        Returns:
+            Tuple of (table entry of the metadata, statistics)
+        """
+        object_sql = "\n".join(schema_object['statements'])
+        neighbour_sql = "\n\n".join(neighbour['statements'][0] for neighbour in neighbours) or "-- none"
+        prompt = f"""Analyze the following database {schema_object['type']} and provide a comprehensive description including:
 
-            # Call OpenAI API to generate metadata
-            response = self.client.chat.completions.create(
-                model=self.gpt_model.model_name,
-                reasoning_effort="high",
-                response_format={
-                    "type": "json_schema",
-                    "json_schema": response_format_schema
-                },
-                messages=[
-                    {
-                        "role": "system",
-                        "content": f"""You are a database documentation expert. Analyze SQL schemas and provide clear, comprehensive descriptions.
-                         The descriptions should be in format understandable by large language models.
-                         The descriptions will be used by LLM to map user input to a database table."""
-                    },
-                    {
-                        "role": "user",
-                        "content": f"""Analyze the following database schema and provide a comprehensive description including:
-
-1. Database Overview: Brief description of the database purpose
-2. Tables: List all tables with their purpose and key columns
-3. Relationships: Describe foreign key relationships and how tables relate to each other
+1. Purpose of the {schema_object['type']} and its key columns
+2. Columns: Meaning, type and constraints of every column
+3. Relationships: Describe foreign key relationships with the related tables
 4. Indexes: Note any indexes and their purpose
-5. Data Model Summary: Overall data model architecture
-
-A table in described from following records:
-1. CREATE VIEW []
-2. CREATE TABLE []
 
 Please format the output in the provided JSON structure.
 
+{schema_object['type'].capitalize()} "{schema_object['name']}":
+```sql
+{object_sql}
+```
+
+Related tables, only for describing the relationships:
+```sql
+{neighbour_sql}
+```"""
+        response_format_schema = {"name": "table_metadata", "strict": True, "schema": table_schema}
+        return self._create_metadata(response_format_schema, prompt, reasoning_effort="high")
+
+    def generate_database_overview(self, schema_objects: list[dict], metadata_schema: dict) -> tuple[dict, ApiStatistics]:
+        """
+        Generate the database name and overview from the table and view definitions.
+
+        Args:
+            schema_objects: Tables and views of the database
+            metadata_schema: JSON schema of the metadata format
+
+        Returns:
+            Tuple of (database_name and description, statistics)
+        """
+        overview_schema = {
+            "type": "object",
+            "properties": {key: metadata_schema['properties'][key] for key in ("database_name", "description")},
+            "required": ["database_name", "description"],
+            "additionalProperties": False
+        }
+        schema_content = "\n\n".join(schema_object['statements'][0] for schema_object in schema_objects)
+        prompt = f"""Provide the name of the following database and a brief description of its purpose and content.
+
 Schema:
 ```sql
 {schema_content}
 ```"""
-                    }
-                ],
-            )
+        response_format_schema = {"name": "database_overview", "strict": True, "schema": overview_schema}
+        return self._create_metadata(response_format_schema, prompt, reasoning_effort="low")
+
+    def generate_metadata(self):
+        """
+        Generate database metadata description using OpenAI API.
+        Each table and view is described by a separate concurrent call, the metadata of objects
+        whose CREATE statements have not changed is reused from the cache.
+        """
+        print(f"Reading schema from {self.db_file_path}...")
+
+        try:
+            # Start timing
+            start_time = time.time()
+
+            schema_objects = self.schema_objects()
 
-            metadata = response.choices[0].message.content
+            # Read the metadata output format
+            with open(self.db_metadata_format_path, 'r', encoding='utf-8') as f:
+                metadata_schema = json.loads(f.read())['schema']
+            table_schema = metadata_schema['properties']['tables']['items']
+
+            cache = {"database": {}, "objects": {}}
+            if self.metadata_cache_path.exists():
+                with open(self.metadata_cache_path, 'r', encoding='utf-8') as f:
+                    cache = json.load(f)
+
+            # Objects referencing each other are shown together for describing the relationships
+            by_name = {schema_object['name']: schema_object for schema_object in schema_objects}
+            neighbours = {name: set(schema_object['references']) for name, schema_object in by_name.items()}
+            for name, schema_object in by_name.items():
+                for reference in schema_object['references']:
+                    if by_name[reference]['type'] == 'table':
+                        neighbours[reference].add(name)
+
+            hashes = {name: self._object_hash(schema_object) for name, schema_object in by_name.items()}
+            changed = [name for name in by_name if cache['objects'].get(name, {}).get('hash') != hashes[name]]
+            database_hash = hashlib.sha256("\n".join([self.gpt_model.model_name] + sorted(hashes.values())).encode('utf-8')).hexdigest()
+            overview_changed = cache['database'].get('hash') != database_hash
+            print(f"Generating metadata of {len(changed)} changed objects using OpenAI API, "
+                  f"{len(by_name) - len(changed)} unchanged objects are cached...")
+
+            statistics = ApiStatistics.empty()
+            errors = []
+            with ThreadPoolExecutor(max_workers=self.METADATA_WORKERS, thread_name_prefix="metadata") as executor:
+                futures = {executor.submit(self.generate_object_metadata, by_name[name],
+                                           [by_name[neighbour] for neighbour in sorted(neighbours[name])], table_schema): name
+                           for name in changed}
+                if overview_changed:
+                    futures[executor.submit(self.generate_database_overview, schema_objects, metadata_schema)] = None
+
+                for future in as_completed(futures):
+                    name = futures[future]
+                    try:
+                        result, call_statistics = future.result()
+                    except Exception as e:
+                        print(f"Error generating metadata of {name or 'the database'}: {str(e)}")
+                        errors.append(e)
+                        continue
+                    statistics = call_statistics.sum(statistics)
+                    if name is None:
+                        cache['database'] = {"hash": database_hash, **result}
+                    else:
+                        # The object name is kept as in the database, whatever the model returned
+                        cache['objects'][name] = {"hash": hashes[name], "metadata": {**result, "name": name, "type": by_name[name]['type']}}
+
+            # Keep the generated metadata so a rerun only repeats the failed calls
+            cache['objects'] = {name: entry for name, entry in cache['objects'].items() if name in by_name}
+            with open(self.metadata_cache_path, 'w', encoding='utf-8') as f:
+                json.dump(cache, f, ensure_ascii=False, indent=2)
+            if errors:
+                raise errors[0]
+
+            metadata = {
+                "database_name": cache['database']['database_name'],
+                "description": cache['database']['description'],
+                "tables": [cache['objects'][name]['metadata'] for name in by_name]
+            }
 
             # Save metadata to file
             with open(self.config.file_sql_metadata, 'w', encoding='utf-8') as f:
-                f.write(metadata)
+                json.dump(metadata, f, ensure_ascii=False, indent=2)
 
             # End timing
             end_time = time.time()
             elapsed_time = end_time - start_time
-            self.gpt_model.prepare_statistics(elapsed_time, response.usage).print()
+            print(f"Generated metadata of {len(by_name)} objects in {elapsed_time:.2f}s")
+            statistics.print()
 
         except Exception as e:
             print(f"Error generating metadata: {str(e)}")
             raise
 
+    def prepare_summary_tables(self, force: bool = False) -> bool:
+        """
+        Build the summary tables if missing or the source tables have changed, and describe them in the metadata.
+
+        Args:
+            force: Rebuild even if the summary tables are up to date
+
+        Returns:
+            Whether the summary tables or their metadata were updated
+        """
+        summary_tables = SqlSummaryTables(self.db_file_path)
+        refreshed = summary_tables.refresh(force=force)
+        if force or not summary_tables.has_metadata(self.config.file_sql_metadata):
+            summary_tables.add_to_metadata(self.config.file_sql_metadata)
+            return True
+        return refreshed
+
     def prepare_sql_data(self):
         """
-        Prepare SQL database data: unzip, extract schema, generate metadata.
+        Prepare SQL database data: unzip, extract schema, generate metadata, build summary tables.
         This is the main method that orchestrates all preparation steps.
         """
 
         DataProcessingUtils.unzip_file(self.db_zip_path, self.config.folder_ready)
         self.extract_schema()
         self.generate_metadata()
+        if self.config.sql_summary_tables:
+            self.prepare_summary_tables(force=True)
 
         print("DATABASE PREPARATION COMPLETE")
@@ -0,0 +1,214 @@
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+
+class SqlSummaryTables:
+    """
+    Materialized sales aggregates for the most common analytic questions, stored as summary tables in the database.
+    Triggers on the source tables count changes in a state table, and the summary tables are rebuilt
+    in one transaction once a change is recorded, so they never serve stale aggregates.
+    """
+
+    PREFIX = "summary_"
+    STATE_TABLE = "summary_state"
+    SOURCE_TABLES = ("Orders", "Order Details", "Products", "Categories", "Employees", "Customers")
+
+    # Revenue is the discounted line total, orders are distinct orders with at least one line
+    MEASURES = [
+        ("orders", "INTEGER", "Number of distinct orders, an order with lines in several groups is counted in each of them", "COUNT(DISTINCT o.OrderID)"),
+        ("quantity", "INTEGER", "Total quantity of ordered units", "SUM(od.Quantity)"),
+        ("revenue", "REAL", "Total sales revenue, sum of UnitPrice * Quantity * (1 - Discount) of the order lines",
+         "ROUND(SUM(od.UnitPrice * od.Quantity * (1 - od.Discount)), 2)"),
+    ]
+    YEAR = ("year", "INTEGER", "Year of the order date", "CAST(substr(o.OrderDate, 1, 4) AS INTEGER)")
+
+    # Name: (description, grouping columns as (name, type, description, expression), joins, required source tables)
+    TABLES = {
+        "summary_sales_by_month": (
+            "Sales totals per order year and month",
+            [YEAR, ("month", "INTEGER", "Month of the order date, 1 to 12", "CAST(substr(o.OrderDate, 6, 2) AS INTEGER)")],
+            "", ()),
+        "summary_sales_by_category": (
+            "Sales totals per product category and order year",
+            [("CategoryID", "INTEGER", "Category id, references Categories.CategoryID", "p.CategoryID"),
+             ("CategoryName", "TEXT", "Category name", "c.CategoryName"), YEAR],
+            "LEFT JOIN Products p ON p.ProductID = od.ProductID LEFT JOIN Categories c ON c.CategoryID = p.CategoryID",
+            ("Products", "Categories")),
+        "summary_sales_by_product": (
+            "Sales totals per product and order year",
+            [("ProductID", "INTEGER", "Product id, references Products.ProductID", "od.ProductID"),
+             ("ProductName", "TEXT", "Product name", "p.ProductName"),
+             ("CategoryName", "TEXT", "Category name of the product", "c.CategoryName"), YEAR],
+            "LEFT JOIN Products p ON p.ProductID = od.ProductID LEFT JOIN Categories c ON c.CategoryID = p.CategoryID",
+            ("Products", "Categories")),
+        "summary_sales_by_employee": (
+            "Sales totals per employee who took the orders and order year",
+            [("EmployeeID", "INTEGER", "Employee id, references Employees.EmployeeID", "o.EmployeeID"),
+             ("EmployeeName", "TEXT", "First and last name of the employee", "e.FirstName || ' ' || e.LastName"), YEAR],
+            "LEFT JOIN Employees e ON e.EmployeeID = o.EmployeeID",
+            ("Employees",)),
+        "summary_sales_by_customer": (
+            "Sales totals per customer and order year",
+            [("CustomerID", "TEXT", "Customer id, references Customers.CustomerID", "o.CustomerID"),
+             ("CompanyName", "TEXT", "Company name of the customer", "cu.CompanyName"),
+             ("Country", "TEXT", "Country of the customer", "cu.Country"), YEAR],
+            "LEFT JOIN Customers cu ON cu.CustomerID = o.CustomerID",
+            ("Customers",)),
+        "summary_sales_by_ship_country": (
+            "Sales totals per ship country of the orders and order year",
+            [("ShipCountry", "TEXT", "Country the order was shipped to", "o.ShipCountry"), YEAR],
+            "", ()),
+    }
+
+    def __init__(self, db_path: Path):
+        """
+        Initialize the SqlSummaryTables.
+
+        Args:
+            db_path: Path to the SQLite database
+        """
+        self.db_path = db_path
+        self.lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        """Connection in autocommit mode, transactions are explicit."""
+        return sqlite3.connect(self.db_path, isolation_level=None, timeout=30)
+
+    @staticmethod
+    def _tables(conn: sqlite3.Connection) -> set[str]:
+        """Names of all tables in the database."""
+        return {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+
+    def _available(self, conn: sqlite3.Connection) -> dict:
+        """Summary tables whose source tables exist in the database."""
+        tables = self._tables(conn)
+        if not {"Orders", "Order Details"} <= tables:
+            return {}
+        return {name: definition for name, definition in self.TABLES.items() if set(definition[3]) <= tables}
+
+    def is_stale(self, conn: sqlite3.Connection = None) -> bool:
+        """Whether the summary tables are missing or the source tables have changed since they were built."""
+        own_connection = conn is None
+        conn = conn or self._connect()
+        try:
+            row = conn.execute(f"SELECT changes FROM {self.STATE_TABLE}").fetchone()
+            return row is None or row[0] > 0
+        except sqlite3.OperationalError:
+            return True
+        finally:
+            if own_connection:
+                conn.close()
+
+    def _create_tracking(self, conn: sqlite3.Connection):
+        """Create the state table and the triggers counting changes of the source tables."""
+        conn.execute(f"CREATE TABLE IF NOT EXISTS {self.STATE_TABLE} (id INTEGER PRIMARY KEY CHECK (id = 1), changes INTEGER, refreshed_at TEXT)")
+        conn.execute(f"INSERT OR IGNORE INTO {self.STATE_TABLE} VALUES (1, 1, NULL)")
+        tables = self._tables(conn)
+        for table in self.SOURCE_TABLES:
+            if table not in tables:
+                continue
+            for operation in ("INSERT", "UPDATE", "DELETE"):
+                trigger = f"{self.PREFIX}changed_{table.replace(' ', '_').lower()}_{operation.lower()}"
+                conn.execute(f'CREATE TRIGGER IF NOT EXISTS {trigger} AFTER {operation} ON "{table}" '
+                             f'BEGIN UPDATE {self.STATE_TABLE} SET changes = changes + 1; END')
+
+    def refresh(self, force: bool = False) -> bool:
+        """
+        Rebuild the summary tables if the source tables have changed.
+
+        Args:
+            force: Rebuild even if no change is recorded
+
+        Returns:
+            Whether the summary tables were rebuilt
+        """
+        if not force and not self.is_stale():
+            return False
+
+        with self.lock:
+            start_time = time.time()
+            conn = self._connect()
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                # Another process may have refreshed them while this one waited for the write lock
+                if not force and not self.is_stale(conn):
+                    conn.execute("ROLLBACK")
+                    return False
+
+                self._create_tracking(conn)
+                available = self._available(conn)
+                for name, (_, columns, joins, _) in available.items():
+                    select_list = ", ".join(f"{expression} AS {column}" for column, _, _, expression in columns + self.MEASURES)
+                    group_by = ", ".join(expression for _, _, _, expression in columns)
+                    conn.execute(f"DROP TABLE IF EXISTS {name}")
+                    conn.execute(f'CREATE TABLE {name} AS SELECT {select_list} FROM "Order Details" od '
+                                 f'JOIN Orders o ON o.OrderID = od.OrderID {joins} GROUP BY {group_by}')
+                    # The leading grouping column and year answer the typical lookups with an index search
+                    key_columns = list(dict.fromkeys([columns[0][0], self.YEAR[0]]))
+                    conn.execute(f"CREATE INDEX {name}_idx ON {name} ({', '.join(key_columns)})")
+                conn.execute(f"UPDATE {self.STATE_TABLE} SET changes = 0, refreshed_at = datetime('now')")
+                conn.execute("COMMIT")
+            except Exception:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                raise
+            finally:
+                conn.close()
+
+        print(f"Built {len(available)} summary tables in {time.time() - start_time:.2f}s")
+        return True
+
+    def describe(self) -> list[dict]:
+        """Metadata entries of the summary tables in the format of the generated database metadata."""
+        conn = self._connect()
+        try:
+            available = self._available(conn)
+        finally:
+            conn.close()
+
+        tables = []
+        for name, (description, columns, _, sources) in available.items():
+            source_list = ", ".join(("Order Details", "Orders") + sources)
+            tables.append({
+                "type": "table",
+                "name": name,
+                "description": f"{description}, precomputed from {source_list} and kept up to date. "
+                               f"Prefer this table over aggregating Order Details for sales, revenue, quantity or order count "
+                               f"questions grouped by these columns. Sum quantity and revenue over its rows for coarser totals, "
+                               f"but never sum orders across groups, an order with lines in several groups is counted in each, "
+                               f"count distinct orders from Orders for coarser order counts.",
+                "columns": [
+                    {"name": column, "description": column_description, "type": column_type, "is_primary_key": False,
+                     "is_foreign_key": False, "references": "", "nullable": True, "unique": False}
+                    for column, column_type, column_description, _ in columns + self.MEASURES
+                ],
+                "indexes": [{"name": f"{name}_idx", "columns": list(dict.fromkeys([columns[0][0], self.YEAR[0]])), "is_unique": False,
+                             "description": "Lookup by the leading grouping column and year"}],
+                "relationships": []
+            })
+        return tables
+
+    def add_to_metadata(self, metadata_path: Path):
+        """
+        Add or replace the descriptions of the summary tables in the database metadata file.
+
+        Args:
+            metadata_path: Path to the JSON metadata used for generating SQL
+        """
+        with open(metadata_path, 'r', encoding='utf-8') as f:
+            metadata = json.load(f)
+
+        tables = [table for table in metadata.get('tables', []) if not table.get('name', '').startswith(self.PREFIX)]
+        metadata['tables'] = tables + self.describe()
+
+        with open(metadata_path, 'w', encoding='utf-8') as f:
+            json.dump(metadata, f, ensure_ascii=False, indent=2)
+
+    def has_metadata(self, metadata_path: Path) -> bool:
+        """Whether the metadata file describes the summary tables."""
+        with open(metadata_path, 'r', encoding='utf-8') as f:
+            metadata = json.load(f)
+        return any(table.get('name', '').startswith(self.PREFIX) for table in metadata.get('tables', []))
@@ -1,7 +1,11 @@
 import json
 import re
 import time
+from pathlib import Path
 from openai import OpenAI
+from src.assistants.keyword_extractor import KeywordExtractor
+from src.assistants.text_index import TextIndex
+from src.assistants.text_segment_store import TextSegmentStore
 from src.config.config import Config
 from src.data_processing.data_processing_utils import DataProcessingUtils
 from src.models.gpt_model import ApiStatistics
@@ -13,6 +17,12 @@ class TextDataPreparator:
     Handles unzipping and processing of JSONL files.
     """
 
+    # Chunking parameters, recorded in index snapshots
+    CHUNKING = {
+        "sentence": {"chunk_size": 512, "overlap_sentences": 1},
+        "length": {"chunk_size": 512, "overlap": 50}
+    }
+
     def __init__(self, client: OpenAI, config: Config):
         """
         Initialize the TextDataPreparator.
@@ -64,6 +74,23 @@ class TextDataPreparator:
         # Clean up extracted JSONL file
         self.jsonl_path.unlink()
 
+    def generate_keyword_statistics(self):
+        """
+        Compute IDF of every term in the full articles and save it for the local keyword extraction.
+        """
+        print("Computing keyword statistics...")
+
+        if not self.processed_documents:
+            with open(self.config.file_articles_raw, 'r', encoding='utf-8') as f:
+                self.processed_documents = json.load(f)
+
+        statistics = KeywordExtractor.compute_idf([article['text'] for article in self.processed_documents])
+
+        with open(self.config.file_articles_idf, 'w', encoding='utf-8') as f:
+            json.dump(statistics, f, ensure_ascii=False)
+
+        print(f"Successfully saved IDF for {len(statistics['idf'])} terms to {self.config.file_articles_idf}")
+
     def chunk_text_by_sentence(self, text: str, chunk_size: int = 512, overlap_sentences: int = 1) -> list[str]:
         """
         Split text into chunks by sentences with sentence-level overlap
@@ -148,14 +175,18 @@ class TextDataPreparator:
         else:
             print(f"Processing articles for chunking by length and embedding generation...")
 
+        if not self.processed_documents:
+            with open(self.config.file_articles_raw, 'r', encoding='utf-8') as f:
+                self.processed_documents = json.load(f)
+
         chunked_documents = []
         chunk_id = 0
         statistics = ApiStatistics.empty()
         for article in self.processed_documents:
             if chunk_by_sentence:
-                chunks = self.chunk_text_by_sentence(article['text'])
+                chunks = self.chunk_text_by_sentence(article['text'], **self.CHUNKING['sentence'])
             else:
-                chunks = self.chunk_text_by_length(article['text'])
+                chunks = self.chunk_text_by_length(article['text'], **self.CHUNKING['length'])
 
             # Generate embeddings for each chunk
             for chunk_idx, chunk in enumerate(chunks):
@@ -210,6 +241,81 @@ class TextDataPreparator:
             print(f"Error saving embeddings: {str(e)}")
             raise
 
+    @staticmethod
+    def read_articles(path: Path) -> list[dict]:
+        """
+        Read articles with id, title and text from a JSON list or JSONL file.
+
+        Args:
+            path: Path to the articles file
+
+        Returns:
+            List of articles
+        """
+        with open(path, 'r', encoding='utf-8') as f:
+            if path.suffix.lower() == '.jsonl':
+                return [json.loads(line) for line in f if line.strip()]
+            return json.load(f)
+
+    def open_segment_store(self) -> TextSegmentStore:
+        """
+        Open the text segments, creating the first segment from the prepared article files if needed.
+
+        Returns:
+            TextSegmentStore with all prepared articles
+        """
+        store = TextSegmentStore(self.config.folder_text_segments)
+        if not store.exists():
+            print("Creating text segments from the prepared articles...")
+            with open(self.config.file_articles_length, 'r', encoding='utf-8') as f:
+                chunks = json.load(f)
+            with open(self.config.file_articles_raw, 'r', encoding='utf-8') as f:
+                articles = json.load(f)
+            store.add(TextIndex.from_records(chunks, articles))
+
+        return store
+
+    def add_articles(self, articles: list[dict]):
+        """
+        Chunk and embed new or changed articles and append them to the text segments as a new segment.
+        Only the added articles are processed, running query assistants pick them up without restart.
+
+        Args:
+            articles: Articles with id, title and text, replacing existing articles with the same id
+        """
+        store = self.open_segment_store()
+
+        chunks = []
+        for article in articles:
+            for chunk_idx, chunk in enumerate(self.chunk_text_by_length(article['text'], **self.CHUNKING['length'])):
+                chunks.append({'article_id': article['id'], 'article_title': article['title'], 'chunk_index': chunk_idx, 'text': chunk})
+
+        # Embed chunks in batches instead of one call per chunk
+        statistics = ApiStatistics.empty()
+        batch_size = self.config.embeddings_batch_size
+        for start in range(0, len(chunks), batch_size):
+            batch = chunks[start:start + batch_size]
+            start_time = time.time()
+            response = self.client.embeddings.create(input=[chunk['text'] for chunk in batch], model=self.model.model_name)
+            statistics = self.model.prepare_statistics(time.time() - start_time, response.usage).sum(statistics)
+            for chunk, item in zip(batch, sorted(response.data, key=lambda item: item.index)):
+                chunk['embedding'] = item.embedding
+
+        segment = store.add(TextIndex.from_records(chunks, articles))
+        print(f"Added {len(articles)} articles with {len(chunks)} chunks as text segment {segment['name']}")
+        statistics.print()
+
+    def delete_articles(self, article_ids: list[str]):
+        """
+        Delete articles from the text segments, running query assistants stop returning them without restart.
+
+        Args:
+            article_ids: Ids of the articles to delete, compared as strings like the stored ids
+        """
+        store = self.open_segment_store()
+        store.delete([str(article_id) for article_id in article_ids])
+        print(f"Deleted {len(article_ids)} articles from the text segments")
+
     def prepare_articles(self):
         """
         Prepare articles data: unzip, process JSONL, save to CSV.
@@ -217,6 +323,7 @@ class TextDataPreparator:
         """
         DataProcessingUtils.unzip_file(self.zip_path, self.extract_dir)
         self.process_jsonl()
+        self.generate_keyword_statistics()
         if not self.config.file_articles_sentences.exists():
             self.generate_embeddings_for_chunks(chunk_by_sentence=True)
         if not self.config.file_articles_length.exists():
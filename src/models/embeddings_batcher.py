@@ -0,0 +1,131 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from openai import BadRequestError, OpenAI
+
+from src.models.gpt_model import GPTModel
+
+
+class EmbeddingsBatcher:
+    """
+    Collects embedding requests from concurrent callers and sends them as one batched API call.
+    Several batches can be in flight, so a slow or retried call does not hold up the other questions.
+    """
+
+    def __init__(self, client: OpenAI, model: GPTModel, max_wait: float = 0.005, max_batch_size: int = 256,
+                 max_in_flight: int = 4):
+        """
+        Initialize the EmbeddingsBatcher and start its worker thread.
+
+        Args:
+            client: OpenAI client instance
+            model: Embeddings model
+            max_wait: Seconds to wait for more requests after the first one arrives
+            max_batch_size: Maximum number of texts sent in a single API call
+            max_in_flight: Maximum number of batches sent at the same time
+        """
+        self.client = client
+        self.model = model
+        self.max_wait = max_wait
+        self.max_batch_size = max_batch_size
+        self.pending = queue.Queue()
+        self.sender = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="embeddings-batch")
+        self.free_senders = threading.Semaphore(max_in_flight)
+
+        # Counters to see how well requests are being batched
+        self.request_count = 0
+        self.batch_count = 0
+        self.lock = threading.Lock()
+
+        self.worker = threading.Thread(target=self._run, name="embeddings-batcher", daemon=True)
+        self.worker.start()
+
+    def embed(self, texts: list[str]) -> list[list[float]]:
+        """
+        Generate embeddings for texts, blocking until the batch containing them is processed.
+
+        Args:
+            texts: Texts to embed
+
+        Returns:
+            List of embedding vectors in the order of the texts
+        """
+        if not texts:
+            return []
+
+        future = Future()
+        self.pending.put((texts, future))
+        return future.result()
+
+    def _collect_batch(self) -> list[tuple[list[str], Future]]:
+        """Block for the first request, then collect more until the wait time or batch size is reached."""
+        batch = [self.pending.get()]
+        size = len(batch[0][0])
+        deadline = time.monotonic() + self.max_wait
+
+        while size < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                request = self.pending.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(request)
+            size += len(request[0])
+
+        return batch
+
+    def _run(self):
+        """Worker loop collecting batches and handing them to the senders."""
+        while True:
+            # While all senders are busy the requests keep accumulating in the queue for the next batch
+            self.free_senders.acquire()
+            self.sender.submit(self._send_and_release, self._collect_batch())
+
+    def _send_and_release(self, batch: list[tuple[list[str], Future]]):
+        """Send a batch and free its sender for the next one."""
+        try:
+            self._send(batch)
+        finally:
+            self.free_senders.release()
+
+    def _create(self, texts: list[str]) -> list[list[float]]:
+        """Embed the texts, in several calls if they overflow max_batch_size."""
+        embeddings = []
+        for start in range(0, len(texts), self.max_batch_size):
+            response = self.client.embeddings.create(
+                input=texts[start:start + self.max_batch_size],
+                model=self.model.model_name
+            )
+            embeddings.extend(item.embedding for item in sorted(response.data, key=lambda item: item.index))
+            with self.lock:
+                self.batch_count += 1
+        return embeddings
+
+    def _send(self, batch: list[tuple[list[str], Future]]):
+        """Send a batch and route the vectors back to the waiting callers."""
+        texts = [text for request_texts, _ in batch for text in request_texts]
+        try:
+            embeddings = self._create(texts)
+        except BadRequestError as e:
+            if len(batch) > 1:
+                # A bad input rejects the whole batch, send each request alone so it fails only its own caller
+                for request in batch:
+                    self._send([request])
+                return
+            batch[0][1].set_exception(e)
+            return
+        except Exception as e:
+            # Transient errors were already retried by the scheduler, retrying each request would only multiply the calls
+            for _, future in batch:
+                future.set_exception(e)
+            return
+
+        with self.lock:
+            self.request_count += len(batch)
+        offset = 0
+        for request_texts, future in batch:
+            future.set_result(embeddings[offset:offset + len(request_texts)])
+            offset += len(request_texts)
@@ -1,11 +1,15 @@
-from openai.types import CompletionUsage
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from openai.types import CompletionUsage
 
 
 class ApiStatistics:
     """Statistics object for API call metrics."""
 
     def __init__(self, input_tokens: int = 0, input_cost: float = 0.0, output_tokens: int = 0,
-                 output_cost: float = 0.0, total_cost: float = 0.0, total_time: float = 0.0):
+                 output_cost: float = 0.0, total_cost: float = 0.0, total_time: float = 0.0,
+                 hedged_requests: int = 0, hedge_wins: int = 0, hedge_cost: float = 0.0):
         """
         Initialize Statistics object.
 
@@ -16,6 +20,9 @@ class ApiStatistics:
             output_cost: Cost of output tokens (default: 0.0)
             total_cost: Total cost of the API call (default: 0.0)
             total_time: Time taken for the API call in seconds (default: 0.0)
+            hedged_requests: Number of duplicate requests sent for slow calls (default: 0)
+            hedge_wins: Number of duplicate requests that finished first (default: 0)
+            hedge_cost: Cost of the duplicate requests, included in the total cost (default: 0.0)
         """
         self.input_tokens = input_tokens
         self.input_cost = input_cost
@@ -23,6 +30,9 @@ class ApiStatistics:
         self.output_cost = output_cost
         self.total_cost = total_cost
         self.total_time = total_time
+        self.hedged_requests = hedged_requests
+        self.hedge_wins = hedge_wins
+        self.hedge_cost = hedge_cost
 
     @classmethod
     def empty(cls) -> 'ApiStatistics':
@@ -40,6 +50,27 @@ class ApiStatistics:
         print(f"💰 Cost: ${self.total_cost:.6f} "
               f"(Input: {self.input_tokens} tokens for ${self.input_cost:.6f}, "
               f"Output: {self.output_tokens} tokens ${self.output_cost:.6f})")
+        if self.hedged_requests:
+            print(f"🔁 Hedged {self.hedged_requests} slow requests, {self.hedge_wins} won, extra cost ${self.hedge_cost:.6f}")
+
+    def to_dict(self) -> dict:
+        """
+        Convert statistics to a dictionary, e.g. for JSON serialization.
+
+        Returns:
+            Dictionary with all statistics values
+        """
+        return {
+            "input_tokens": self.input_tokens,
+            "input_cost": self.input_cost,
+            "output_tokens": self.output_tokens,
+            "output_cost": self.output_cost,
+            "total_cost": self.total_cost,
+            "total_time": self.total_time,
+            "hedged_requests": self.hedged_requests,
+            "hedge_wins": self.hedge_wins,
+            "hedge_cost": self.hedge_cost
+        }
 
     def sum(self, other: 'ApiStatistics') -> 'ApiStatistics':
         """
@@ -60,7 +91,10 @@ class ApiStatistics:
             output_tokens=self.output_tokens + other.output_tokens,
             output_cost=self.output_cost + other.output_cost,
             total_cost=self.total_cost + other.total_cost,
-            total_time=self.total_time + other.total_time
+            total_time=self.total_time + other.total_time,
+            hedged_requests=self.hedged_requests + other.hedged_requests,
+            hedge_wins=self.hedge_wins + other.hedge_wins,
+            hedge_cost=self.hedge_cost + other.hedge_cost
         )
 
 
@@ -88,7 +122,7 @@ class GPTModel:
         self.model_name = model_name
         self.pricing = self.MODEL_PRICING.get(model_name)
 
-    def prepare_statistics(self, total_time: float, usage: CompletionUsage) -> ApiStatistics:
+    def prepare_statistics(self, total_time: float, usage: 'CompletionUsage') -> ApiStatistics:
         """
         Calculate cost from OpenAI API usage response.
 
@@ -107,11 +141,19 @@ class GPTModel:
         output_cost = (output_tokens / 1_000_000) * self.pricing[1]
         total_cost = input_cost + output_cost
 
+        # A duplicate request of a hedged call has the same prompt, it is billed like the winner even when abandoned
+        hedged_requests = getattr(usage, 'hedged_requests', 0)
+        hedge_cost = total_cost * hedged_requests
+        total_cost += hedge_cost
+
         return ApiStatistics(
             input_tokens=input_tokens,
             input_cost=input_cost,
             output_tokens=output_tokens,
             output_cost=output_cost,
             total_cost=total_cost,
-            total_time=total_time
+            total_time=total_time,
+            hedged_requests=hedged_requests,
+            hedge_wins=getattr(usage, 'hedge_wins', 0),
+            hedge_cost=hedge_cost
         )
@@ -0,0 +1,211 @@
+import collections
+import contextvars
+import hashlib
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from src.models.rate_limiter import RequestAbandoned, request_cancelled
+
+
+# Hedged call and attempt number of the request made in the current context
+_current_attempt = contextvars.ContextVar('hedged_attempt', default=None)
+
+
+def claim_response() -> bool:
+    """Whether the response received in the current context is used, False for the later responses of a hedged call."""
+    current = _current_attempt.get()
+    if current is None:
+        return True
+    call, attempt = current
+    return call.claim(attempt)
+
+
+class HedgedUsage:
+    """Usage of the winning response with the hedging outcome of the call."""
+
+    def __init__(self, usage, hedged_requests: int, hedge_wins: int):
+        """
+        Initialize the HedgedUsage.
+
+        Args:
+            usage: Usage of the winning response
+            hedged_requests: Number of duplicate requests sent
+            hedge_wins: Number of duplicate requests that finished first
+        """
+        self.usage = usage
+        self.hedged_requests = hedged_requests
+        self.hedge_wins = hedge_wins
+
+    def __getattr__(self, name):
+        return getattr(self.usage, name)
+
+
+class HedgedResponse:
+    """Winning response of a hedged call, its usage reports the hedging outcome."""
+
+    def __init__(self, response, usage: HedgedUsage):
+        self.response = response
+        self.usage = usage
+
+    def __getattr__(self, name):
+        return getattr(self.response, name)
+
+
+class _HedgedCall:
+    """Attempts of one hedged call, the first successful response wins and the other attempts are abandoned."""
+
+    def __init__(self, attempts: int = 2):
+        self.lock = threading.Lock()
+        self.winner = None
+        self.cancelled = [threading.Event() for _ in range(attempts)]
+
+    def claim(self, attempt: int) -> bool:
+        """Claim the win for a response of the attempt, True if it is the first one or the attempt already won."""
+        with self.lock:
+            if self.winner is None:
+                self.winner = attempt
+                for number, cancelled in enumerate(self.cancelled):
+                    if number != attempt:
+                        cancelled.set()
+            return self.winner == attempt
+
+
+class HedgingPolicy:
+    """
+    Latency history and hedging thresholds shared by all copies of a hedged client.
+    Latencies are kept per model and system prompt, since question analysis, query expansion and answers differ widely.
+    """
+
+    def __init__(self, percentile: float, min_samples: int = 20, history_size: int = 200, max_workers: int = 32):
+        """
+        Initialize the HedgingPolicy.
+
+        Args:
+            percentile: Latency percentile of earlier calls after which a duplicate request is sent
+            min_samples: Number of calls of a kind before they are hedged
+            history_size: Number of recent latencies kept per kind of call
+            max_workers: Maximum number of requests in flight
+        """
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.latencies = collections.defaultdict(lambda: collections.deque(maxlen=history_size))
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="hedged-request")
+
+    @staticmethod
+    def kind(request: dict) -> tuple[str, str]:
+        """Kind of a chat completion request, its model and system prompt."""
+        system = next((message['content'] for message in request.get('messages', []) if message.get('role') == 'system'), '')
+        return request.get('model'), hashlib.sha256(system.encode('utf-8')).hexdigest()[:12]
+
+    def threshold(self, kind: tuple[str, str]) -> float:
+        """Seconds after which the call is hedged, None until enough calls of the kind have completed."""
+        with self.lock:
+            samples = sorted(self.latencies[kind])
+        if len(samples) < self.min_samples:
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * self.percentile / 100))]
+
+    def record(self, kind: tuple[str, str], seconds: float):
+        """Record the latency of a completed request."""
+        with self.lock:
+            self.latencies[kind].append(seconds)
+
+
+class HedgedClient:
+    """
+    Client wrapper sending a duplicate chat completion request when the first one is slower than the latency percentile
+    of earlier calls of the same kind, and returning whichever response arrives first.
+    The other request is abandoned: it leaves the scheduler queue if it has not been sent yet, otherwise its response is discarded.
+    Embeddings are not hedged.
+    """
+
+    def __init__(self, client, policy: HedgingPolicy):
+        """
+        Initialize the HedgedClient.
+
+        Args:
+            client: Client with the OpenAI chat completions and embeddings interface, usually the scheduled client
+            policy: Shared latency history and thresholds
+        """
+        self.client = client
+        self.policy = policy
+        self.chat = _HedgedChat(self)
+        self.embeddings = client.embeddings
+
+    def with_options(self, **kwargs) -> 'HedgedClient':
+        """Copy of the client with changed request options, sharing the latency history."""
+        return HedgedClient(self.client.with_options(**kwargs), self.policy)
+
+    def _attempt(self, kind: tuple[str, str], request: dict):
+        """Send one request, recording its latency when it completes."""
+        start_time = time.time()
+        response = self.client.chat.completions.create(**request)
+        self.policy.record(kind, time.time() - start_time)
+        return response
+
+    def _submit(self, call: _HedgedCall, attempt: int, kind: tuple[str, str], request: dict):
+        """
+        Send an attempt of a hedged call in the background, in the context of the caller, e.g. the question being recorded.
+
+        Returns:
+            Tuple of (future of the winning response, event set when the attempt starts)
+        """
+        started = threading.Event()
+
+        def run():
+            started.set()
+            _current_attempt.set((call, attempt))
+            request_cancelled.set(call.cancelled[attempt])
+            response = self._attempt(kind, request)
+            if not call.claim(attempt):
+                raise RequestAbandoned("Response of the abandoned request discarded")
+            return response
+
+        return self.policy.executor.submit(contextvars.copy_context().run, run), started
+
+    def create(self, **kwargs):
+        """Create a chat completion, hedged after the latency threshold of its kind."""
+        kind = self.policy.kind(kwargs)
+        threshold = self.policy.threshold(kind)
+        if threshold is None:
+            return self._attempt(kind, kwargs)
+
+        call = _HedgedCall()
+        primary, started = self._submit(call, 0, kind, kwargs)
+        # The threshold counts from when the request is dispatched, not from waiting for a free thread
+        started.wait()
+        done, _ = wait([primary], timeout=threshold)
+        if done:
+            return primary.result()
+
+        hedge, _ = self._submit(call, 1, kind, kwargs)
+        pending = {primary, hedge}
+        errors = []
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    response = future.result()
+                except Exception as e:
+                    errors.append(e)
+                    continue
+                return HedgedResponse(response, HedgedUsage(response.usage, hedged_requests=1, hedge_wins=int(future is hedge)))
+
+        # Both requests failed, report the first real error
+        raise next((error for error in errors if not isinstance(error, RequestAbandoned)), errors[0])
+
+
+class _HedgedCompletions:
+    """Hedged chat completions endpoint."""
+
+    def __init__(self, hedged: HedgedClient):
+        self.create = hedged.create
+
+
+class _HedgedChat:
+    """Hedged chat endpoints."""
+
+    def __init__(self, hedged: HedgedClient):
+        self.completions = _HedgedCompletions(hedged)
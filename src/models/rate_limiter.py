@@ -0,0 +1,296 @@
+import contextvars
+import heapq
+import itertools
+import random
+import threading
+import time
+from openai import APIConnectionError, APITimeoutError, InternalServerError, OpenAI, RateLimitError
+
+# Lower value is served first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BULK = 1
+
+# Set by a caller that may abandon the request made in the current context before it is sent, e.g. a hedged duplicate
+request_cancelled = contextvars.ContextVar('request_cancelled', default=None)
+
+
+class RequestAbandoned(Exception):
+    """The caller abandoned the request while it was waiting for capacity, it was not sent."""
+
+
+class TokenBucket:
+    """Token bucket refilled continuously up to its per-minute capacity."""
+
+    def __init__(self, per_minute: int):
+        """
+        Initialize the TokenBucket as full.
+
+        Args:
+            per_minute: Bucket capacity and refill amount per minute
+        """
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.level = float(per_minute)
+        self.updated = time.monotonic()
+
+    def refill(self, now: float):
+        """Add the amount accumulated since the last refill."""
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until the amount is available, amount above capacity is clamped to the capacity."""
+        missing = min(amount, self.capacity) - self.level
+        return max(0.0, missing / self.rate)
+
+    def consume(self, amount: float):
+        """Take the amount from the bucket, the level can go negative when actual usage exceeds the estimate."""
+        self.level -= amount
+
+
+class RateLimiter:
+    """Scheduler shared by all OpenAI calls, enforcing requests and tokens per minute limits per model."""
+
+    # Seconds between checks of a waiting request that can be abandoned
+    CANCEL_CHECK_INTERVAL = 0.05
+
+    def __init__(self, limits: dict[str, tuple[int, int]] = None, max_retries: int = 5,
+                 base_delay: float = 1.0, max_delay: float = 60.0):
+        """
+        Initialize the RateLimiter.
+
+        Args:
+            limits: Requests per minute and tokens per minute per model name, models without limits are not throttled
+            max_retries: Number of retries for rate limit, connection and server errors
+            base_delay: Initial backoff delay in seconds, doubled on each retry
+            max_delay: Maximum backoff delay in seconds
+        """
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+        self.buckets = {
+            model: (TokenBucket(requests_per_minute), TokenBucket(tokens_per_minute))
+            for model, (requests_per_minute, tokens_per_minute) in (limits or {}).items()
+        }
+        self.waiting = {model: [] for model in self.buckets}
+        self.paused_until = {}
+        self.sequence = itertools.count()
+        self.condition = threading.Condition()
+
+    def client(self, client: OpenAI, priority: int = PRIORITY_INTERACTIVE) -> 'ScheduledClient':
+        """
+        Wrap a client so all its calls go through this scheduler.
+
+        Args:
+            client: OpenAI client instance, its own retries should be disabled
+            priority: Queue priority of the calls, PRIORITY_INTERACTIVE or PRIORITY_BULK
+
+        Returns:
+            Client exposing the same chat completions and embeddings interface
+        """
+        return ScheduledClient(client, self, priority)
+
+    def acquire(self, model: str, tokens: int, priority: int):
+        """
+        Block until the model has capacity for one request with the estimated tokens.
+        Callers are served by priority, then in arrival order.
+
+        Args:
+            model: Model name
+            tokens: Estimated tokens of the request
+            priority: Queue priority of the caller
+        """
+        cancelled = request_cancelled.get()
+        with self.condition:
+            # Respect pauses requested by the API even for models without configured limits
+            while time.monotonic() < self.paused_until.get(model, 0):
+                self._check_cancelled(cancelled)
+                self._wait(self.paused_until[model] - time.monotonic(), cancelled)
+            self._check_cancelled(cancelled)
+
+            if model not in self.buckets:
+                return
+
+            request_bucket, token_bucket = self.buckets[model]
+            entry = (priority, next(self.sequence))
+            heapq.heappush(self.waiting[model], entry)
+
+            while True:
+                if cancelled is not None and cancelled.is_set():
+                    # Leave the queue, the callers behind move up
+                    self.waiting[model].remove(entry)
+                    heapq.heapify(self.waiting[model])
+                    self.condition.notify_all()
+                    self._check_cancelled(cancelled)
+                now = time.monotonic()
+                if self.waiting[model][0] == entry and now >= self.paused_until.get(model, 0):
+                    request_bucket.refill(now)
+                    token_bucket.refill(now)
+                    wait_time = max(request_bucket.wait_time(1), token_bucket.wait_time(tokens))
+                    if wait_time == 0:
+                        request_bucket.consume(1)
+                        token_bucket.consume(tokens)
+                        heapq.heappop(self.waiting[model])
+                        # Let the next caller in line check the buckets
+                        self.condition.notify_all()
+                        return
+                else:
+                    wait_time = max(0.0, self.paused_until.get(model, 0) - now) or None
+
+                self._wait(wait_time, cancelled)
+
+    def _wait(self, seconds: float, cancelled):
+        """Wait on the condition, waking up regularly to check the cancellation of an abandonable request."""
+        if cancelled is not None:
+            seconds = min(seconds, self.CANCEL_CHECK_INTERVAL) if seconds is not None else self.CANCEL_CHECK_INTERVAL
+        self.condition.wait(seconds)
+
+    @staticmethod
+    def _check_cancelled(cancelled):
+        """Raise RequestAbandoned if the caller abandoned the request."""
+        if cancelled is not None and cancelled.is_set():
+            raise RequestAbandoned("Request abandoned before it was sent")
+
+    def record_usage(self, model: str, estimated_tokens: int, actual_tokens: int):
+        """Correct the token bucket with the actual usage reported by the API."""
+        if model not in self.buckets:
+            return
+        with self.condition:
+            self.buckets[model][1].consume(actual_tokens - estimated_tokens)
+
+    def pause(self, model: str, seconds: float):
+        """Stop sending requests for the model, e.g. after the API asked to retry later."""
+        with self.condition:
+            self.paused_until[model] = max(self.paused_until.get(model, 0), time.monotonic() + seconds)
+            self.condition.notify_all()
+
+    def _retry_delay(self, error: Exception, attempt: int) -> float:
+        """Delay before the next attempt, honoring retry-after headers, otherwise exponential backoff with jitter."""
+        response = getattr(error, 'response', None)
+        headers = response.headers if response is not None else {}
+        try:
+            if 'retry-after-ms' in headers:
+                return float(headers['retry-after-ms']) / 1000 + random.uniform(0, 0.25)
+            if 'retry-after' in headers:
+                return float(headers['retry-after']) + random.uniform(0, 0.25)
+        except ValueError:
+            pass
+
+        return random.uniform(0.5, 1.0) * min(self.max_delay, self.base_delay * 2 ** attempt)
+
+    def call(self, func, request: dict, estimated_tokens: int, priority: int, max_retries: int = None):
+        """
+        Call the API function when capacity is available, retrying transient errors.
+
+        Args:
+            func: API function to call
+            request: Keyword arguments for the API function, including the model name
+            estimated_tokens: Estimated tokens of the request
+            priority: Queue priority of the caller
+            max_retries: Number of retries, defaults to the scheduler setting
+
+        Returns:
+            API response
+        """
+        model = request['model']
+        if max_retries is None:
+            max_retries = self.max_retries
+
+        for attempt in range(max_retries + 1):
+            self.acquire(model, estimated_tokens, priority)
+            try:
+                response = func(**request)
+            except APITimeoutError:
+                # Timeouts are requested by the caller, e.g. a latency budget, so they are not retried
+                raise
+            except (RateLimitError, InternalServerError, APIConnectionError) as e:
+                if attempt == max_retries:
+                    raise
+                delay = self._retry_delay(e, attempt)
+                print(f"OpenAI API error for {model} ({type(e).__name__}), retrying in {delay:.1f}s")
+                if isinstance(e, RateLimitError):
+                    self.pause(model, delay)
+                else:
+                    cancelled = request_cancelled.get()
+                    if cancelled is not None:
+                        cancelled.wait(delay)
+                        self._check_cancelled(cancelled)
+                    else:
+                        time.sleep(delay)
+                continue
+
+            usage = getattr(response, 'usage', None)
+            if usage is not None:
+                self.record_usage(model, estimated_tokens, getattr(usage, 'total_tokens', estimated_tokens))
+            return response
+
+    @staticmethod
+    def estimate_tokens(content) -> int:
+        """Rough token estimate of a text, list of texts or chat messages, about 4 characters per token."""
+        if isinstance(content, str):
+            return len(content) // 4 + 1
+        if isinstance(content, dict):
+            return RateLimiter.estimate_tokens(content.get('content') or '')
+        return sum(RateLimiter.estimate_tokens(item) for item in content)
+
+
+class ScheduledClient:
+    """OpenAI client wrapper routing chat completions and embeddings through the shared scheduler."""
+
+    def __init__(self, client: OpenAI, limiter: RateLimiter, priority: int, max_retries: int = None):
+        """
+        Initialize the ScheduledClient.
+
+        Args:
+            client: OpenAI client instance
+            limiter: Shared scheduler
+            priority: Queue priority of the calls
+            max_retries: Number of retries, defaults to the scheduler setting
+        """
+        self.client = client
+        self.limiter = limiter
+        self.priority = priority
+        self.max_retries = max_retries
+        self.chat = _ScheduledChat(self)
+        self.embeddings = _ScheduledEmbeddings(self)
+
+    def with_options(self, **kwargs) -> 'ScheduledClient':
+        """Copy of the client with changed request options, max_retries also applies to the scheduler retries."""
+        return ScheduledClient(self.client.with_options(**kwargs), self.limiter, self.priority,
+                               kwargs.get('max_retries', self.max_retries))
+
+
+class _ScheduledCompletions:
+    """Scheduled chat completions endpoint."""
+
+    def __init__(self, scheduled: ScheduledClient):
+        self.scheduled = scheduled
+
+    def create(self, **kwargs):
+        """Create a chat completion when the model has capacity."""
+        estimated_tokens = RateLimiter.estimate_tokens(kwargs.get('messages', []))
+        return self.scheduled.limiter.call(
+            self.scheduled.client.chat.completions.create, kwargs, estimated_tokens, self.scheduled.priority,
+            max_retries=self.scheduled.max_retries)
+
+
+class _ScheduledChat:
+    """Scheduled chat endpoints."""
+
+    def __init__(self, scheduled: ScheduledClient):
+        self.completions = _ScheduledCompletions(scheduled)
+
+
+class _ScheduledEmbeddings:
+    """Scheduled embeddings endpoint."""
+
+    def __init__(self, scheduled: ScheduledClient):
+        self.scheduled = scheduled
+
+    def create(self, **kwargs):
+        """Create embeddings when the model has capacity."""
+        estimated_tokens = RateLimiter.estimate_tokens(kwargs.get('input', ''))
+        return self.scheduled.limiter.call(
+            self.scheduled.client.embeddings.create, kwargs, estimated_tokens, self.scheduled.priority,
+            max_retries=self.scheduled.max_retries)
@@ -0,0 +1,191 @@
+import base64
+import contextvars
+import hashlib
+import json
+import threading
+from collections import Counter
+from types import SimpleNamespace
+
+import numpy as np
+from openai import OpenAI
+
+from src.models.hedged_client import claim_response
+
+
+# Chat completions captured for the question being answered, follows the question into threads started with its context
+_captured_calls = contextvars.ContextVar('captured_calls', default=None)
+# Recorded chat completions of the question being replayed
+_replayed_calls = contextvars.ContextVar('replayed_calls', default=None)
+
+
+class _Capture:
+    """Chat completions captured for one question, closed when the question is done so late responses are dropped."""
+
+    def __init__(self):
+        self.calls = []
+        self.closed = False
+        self.lock = threading.Lock()
+
+    def add(self, call: dict):
+        """Add a captured call unless the capture is closed."""
+        with self.lock:
+            if not self.closed:
+                self.calls.append(call)
+
+    def close(self) -> list[dict]:
+        """Close the capture and return the captured calls."""
+        with self.lock:
+            self.closed = True
+            return list(self.calls)
+
+
+def request_key(request: dict) -> str:
+    """Hash identifying a chat completion request by model, messages and response format."""
+    content = json.dumps({key: request.get(key) for key in ('model', 'messages', 'response_format')}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()[:24]
+
+
+def system_prompt(request: dict) -> str:
+    """System message of a chat completion request, identifies the kind of call when the full request differs."""
+    return next((message['content'] for message in request.get('messages', []) if message.get('role') == 'system'), '')
+
+
+def encode_embedding(embedding: list[float]) -> str:
+    """Embedding as base64 of float32 values, several times smaller than a JSON list."""
+    return base64.b64encode(np.asarray(embedding, dtype=np.float32).tobytes()).decode('ascii')
+
+
+def decode_embedding(value: str) -> list[float]:
+    """Embedding encoded with encode_embedding."""
+    return np.frombuffer(base64.b64decode(value), dtype=np.float32).tolist()
+
+
+class RecordingClient:
+    """
+    OpenAI client wrapper recording the responses used by the query log.
+    Chat completions are captured for the question being answered, query embeddings are stored once per text.
+    """
+
+    def __init__(self, client: OpenAI, query_log: 'QueryLog'):
+        """
+        Initialize the RecordingClient.
+
+        Args:
+            client: OpenAI client instance
+            query_log: Query log storing the embeddings
+        """
+        self.client = client
+        self.query_log = query_log
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create_completion))
+        self.embeddings = SimpleNamespace(create=self._create_embeddings)
+
+    def with_options(self, **kwargs) -> 'RecordingClient':
+        """Copy of the client with changed request options."""
+        return RecordingClient(self.client.with_options(**kwargs), self.query_log)
+
+    def start_capture(self):
+        """Start capturing the chat completions of the question answered in the current context."""
+        _captured_calls.set(_Capture())
+
+    def stop_capture(self) -> list[dict]:
+        """
+        Stop capturing and return the captured chat completions.
+        Requests still running in other threads, e.g. an abandoned expansion, share the capture, so it is closed instead of reset.
+        """
+        capture = _captured_calls.get()
+        _captured_calls.set(None)
+        return capture.close() if capture else []
+
+    def _create_completion(self, **kwargs):
+        """Create a chat completion and capture the response."""
+        response = self.client.chat.completions.create(**kwargs)
+        capture = _captured_calls.get()
+        # Only the winning response of a hedged call is recorded
+        if capture is not None and claim_response():
+            usage = response.usage
+            capture.add({
+                "key": request_key(kwargs),
+                "model": kwargs['model'],
+                "system": hashlib.sha256(system_prompt(kwargs).encode('utf-8')).hexdigest()[:12],
+                "content": response.choices[0].message.content,
+                "usage": [usage.prompt_tokens, getattr(usage, 'completion_tokens', 0), getattr(usage, 'total_tokens', usage.prompt_tokens)]
+            })
+        return response
+
+    def _create_embeddings(self, **kwargs):
+        """Create embeddings and store them for each input text."""
+        response = self.client.embeddings.create(**kwargs)
+        texts = [kwargs['input']] if isinstance(kwargs['input'], str) else kwargs['input']
+        for text, item in zip(texts, sorted(response.data, key=lambda item: item.index)):
+            self.query_log.add_embedding(kwargs['model'], text, item.embedding)
+        return response
+
+
+class ReplayClient:
+    """
+    Stand-in for the OpenAI client answering with the responses recorded in a query log, so a workload replays without API calls.
+    A chat completion is matched by its full request, or else by the next recorded call of the current question
+    with the same model and system prompt, so the replay continues when a change alters a prompt.
+    """
+
+    def __init__(self, completions: dict[str, dict], embeddings: dict[tuple[str, str], list[float]]):
+        """
+        Initialize the ReplayClient.
+
+        Args:
+            completions: Recorded chat completions by request key
+            embeddings: Recorded embeddings by (model, text)
+        """
+        self.recorded_completions = completions
+        self.recorded_embeddings = embeddings
+        self.lock = threading.Lock()
+        self.matches = Counter()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create_completion))
+        self.embeddings = SimpleNamespace(create=self._create_embeddings)
+
+    def with_options(self, **kwargs) -> 'ReplayClient':
+        """Request options do not apply to recorded responses."""
+        return self
+
+    def begin_question(self, calls: list[dict]):
+        """Set the recorded chat completions of the question replayed in the current context."""
+        _replayed_calls.set(list(calls))
+
+    def _count(self, match: str):
+        """Count how a response was matched."""
+        with self.lock:
+            self.matches[match] += 1
+
+    def _create_completion(self, **kwargs):
+        """Return the recorded chat completion of the request."""
+        recorded = self.recorded_completions.get(request_key(kwargs))
+        if recorded:
+            self._count('exact')
+        else:
+            system = hashlib.sha256(system_prompt(kwargs).encode('utf-8')).hexdigest()[:12]
+            calls = _replayed_calls.get() or []
+            recorded = next((call for call in calls if call['model'] == kwargs['model'] and call['system'] == system), None)
+            if not recorded:
+                self._count('missing')
+                raise RuntimeError(f"No recorded response for {kwargs['model']} request")
+            calls.remove(recorded)
+            self._count('fallback')
+
+        prompt_tokens, completion_tokens, total_tokens = recorded['usage']
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=recorded['content']))],
+            usage=SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens, total_tokens=total_tokens)
+        )
+
+    def _create_embeddings(self, **kwargs):
+        """Return the recorded embeddings of the input texts."""
+        texts = [kwargs['input']] if isinstance(kwargs['input'], str) else kwargs['input']
+        data = []
+        for number, text in enumerate(texts):
+            embedding = self.recorded_embeddings.get((kwargs['model'], text))
+            if embedding is None:
+                self._count('missing')
+                raise RuntimeError(f"No recorded embedding for '{text[:50]}'")
+            data.append(SimpleNamespace(index=number, embedding=embedding))
+        self._count('embeddings')
+        return SimpleNamespace(data=data, usage=SimpleNamespace(prompt_tokens=0, total_tokens=0))
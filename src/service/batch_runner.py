@@ -0,0 +1,162 @@
+import csv
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+from src.assistants.query_assistant import QueryAssistant
+from src.models.gpt_model import ApiStatistics
+
+
+class BatchRunner:
+    """Answers questions from a file with bounded concurrency and writes results as JSONL."""
+
+    def __init__(self, assistant: QueryAssistant, concurrency: int = 4, top_k: int = 5):
+        """
+        Initialize the BatchRunner.
+
+        Args:
+            assistant: Query assistant with loaded indexes, shared by all workers
+            concurrency: Maximum number of questions processed at the same time
+            top_k: Number of top text search results to use per question
+        """
+        self.assistant = assistant
+        self.concurrency = concurrency
+        self.top_k = top_k
+
+    @staticmethod
+    def read_questions(input_path: Path) -> list[dict]:
+        """
+        Read questions from a JSONL or CSV file.
+        Each record needs a 'question' field, an optional 'id' field defaults to the record number.
+
+        Args:
+            input_path: Path to the .jsonl or .csv file
+
+        Returns:
+            List of dictionaries with id and question
+        """
+        with open(input_path, 'r', encoding='utf-8', newline='') as f:
+            if input_path.suffix.lower() == '.csv':
+                records = list(csv.DictReader(f))
+            else:
+                records = [json.loads(line) for line in f if line.strip()]
+
+        questions = []
+        for number, record in enumerate(records, 1):
+            question = str(record.get('question') or '').strip()
+            if not question:
+                print(f"Skipping record {number} without question")
+                continue
+            # An id of 0 is kept, an empty CSV cell counts as missing
+            record_id = record['id'] if record.get('id') not in (None, '') else number
+            questions.append({"id": str(record_id), "question": question})
+
+        return questions
+
+    def read_completed(self, output_path: Path) -> set[str]:
+        """
+        Read ids of successfully answered questions from a partially written output file.
+        The file is rewritten with one successful record per id, so failed questions and a line cut off
+        by an interrupted run are removed before the retried questions are appended.
+
+        Args:
+            output_path: Path to the JSONL output file
+
+        Returns:
+            Set of completed question ids
+        """
+        if not output_path.exists():
+            return set()
+
+        with open(output_path, 'r', encoding='utf-8') as f:
+            lines = f.readlines()
+
+        records = {}
+        for line in lines:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            # Failed questions, also those answered with failed stages, are retried on the next run
+            if 'error' not in record and not record.get('errors'):
+                records[record['id']] = line if line.endswith('\n') else line + '\n'
+
+        if len(records) != len(lines):
+            temporary_path = output_path.with_suffix(output_path.suffix + '.tmp')
+            with open(temporary_path, 'w', encoding='utf-8') as f:
+                f.writelines(records.values())
+            os.replace(temporary_path, output_path)
+
+        return set(records)
+
+    def _answer(self, item: dict, fast_mode: bool) -> dict:
+        """Answer a single question, returning an output record."""
+        start_time = time.time()
+        try:
+            result = self.assistant.ask(item['question'], top_k=self.top_k, fast_mode=fast_mode)
+            return {
+                "id": item['id'],
+                "question": item['question'],
+                "answer": result['answer'],
+                "retrieval": result['retrieval'],
+                "statistics": result['statistics'].to_dict(),
+                "errors": result['errors'],
+                "elapsed_time": time.time() - start_time
+            }
+        except Exception as e:
+            return {
+                "id": item['id'],
+                "question": item['question'],
+                "error": str(e),
+                "elapsed_time": time.time() - start_time
+            }
+
+    def run(self, input_path: Path, output_path: Path, fast_mode: bool = None):
+        """
+        Answer all questions not yet present in the output file, appending results as they complete.
+
+        Args:
+            input_path: Path to the JSONL or CSV file with questions
+            output_path: Path to the JSONL output file, resumed if it already exists
+            fast_mode: Whether to expand the questions locally without API call
+        """
+        questions = self.read_questions(input_path)
+        self.assistant.wait_until_ready()
+        completed = self.read_completed(output_path)
+        pending = [item for item in questions if item['id'] not in completed]
+
+        print(f"\n{len(questions)} questions, {len(completed)} already answered, {len(pending)} to process "
+              f"with concurrency {self.concurrency}")
+
+        stats = ApiStatistics.empty()
+        failed = 0
+        start_time = time.time()
+
+        with open(output_path, 'a', encoding='utf-8') as output, ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            futures = [executor.submit(self._answer, item, fast_mode) for item in pending]
+
+            for done, future in enumerate(as_completed(futures), 1):
+                record = future.result()
+                output.write(json.dumps(record, ensure_ascii=False) + '\n')
+                output.flush()
+
+                if 'error' in record:
+                    failed += 1
+                    print(f"❌ Question {record['id']} failed: {record['error']}")
+                else:
+                    if record['errors']:
+                        failed += 1
+                        print(f"❌ Question {record['id']} failed: {'; '.join(record['errors'])}")
+                    stats = stats.sum(ApiStatistics(**record['statistics']))
+
+                if done % 10 == 0 or done == len(futures):
+                    elapsed_time = time.time() - start_time
+                    print(f"Processed {done}/{len(futures)} questions in {elapsed_time:.1f}s "
+                          f"({done / elapsed_time:.2f} questions/s)")
+
+        print("\n" + "="*80)
+        print(f"BATCH COMPLETE: {len(pending) - failed} answered, {failed} failed, results in {output_path}")
+        print("="*80)
+        stats.print()
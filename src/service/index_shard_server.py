@@ -0,0 +1,237 @@
+import json
+import multiprocessing
+import socket
+import threading
+import time
+import zlib
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import requests
+
+from src.assistants.text_index import TextIndex
+from src.assistants.text_query_assistant import TextQueryAssistant
+from src.assistants.text_segment_store import TextSegmentStore
+from src.config.config import Config
+
+
+def shard_of(article_id: str, shard_count: int) -> int:
+    """Shard owning an article, stable across processes and restarts."""
+    return zlib.crc32(str(article_id).encode('utf-8')) % shard_count
+
+
+def load_shard_index(config: Config, shard_number: int, shard_count: int, use_sentence_chunks: bool = False) -> TextIndex:
+    """
+    Load the slice of articles and chunks owned by one shard, from the same source as the text assistant:
+    the text segments if they exist, otherwise the binary index or the prepared JSON files.
+    The embeddings of the whole index are read and released once the shard's rows are copied, texts are referenced.
+
+    Args:
+        config: Application configuration
+        shard_number: Number of the shard, from 0 to shard_count - 1
+        shard_count: Total number of shards
+        use_sentence_chunks: Whether to use sentence-based or length-based chunks
+
+    Returns:
+        TextIndex with the articles of the shard and their chunks, with coarse embeddings if enabled
+    """
+    index = TextQueryAssistant.load_index(config, use_sentence_chunks)
+    owned = np.array([shard_of(article_id, shard_count) == shard_number for article_id in index.article_ids], dtype=bool)
+    index = TextIndex.combine([(index, owned)])
+    TextQueryAssistant.build_coarse(config, index)
+    return index
+
+
+class IndexShardRequestHandler(BaseHTTPRequestHandler):
+    """HTTP request handler searching the slice of the text index owned by the shard."""
+
+    protocol_version = "HTTP/1.1"
+    MAX_TOP_K = 100
+
+    def do_GET(self):
+        """Handle GET requests, only the health check is supported."""
+        if self.path == "/health":
+            index = self.server.index
+            self._send_json(HTTPStatus.OK, {"status": "ok", "chunks": index.chunk_count, "articles": index.article_count})
+        else:
+            self._send_json(HTTPStatus.NOT_FOUND, {"error": f"Unknown endpoint {self.path}"})
+
+    def do_POST(self):
+        """Handle POST /search with normalized query embeddings, keywords and top_k."""
+        if self.path != "/search":
+            self._send_json(HTTPStatus.NOT_FOUND, {"error": f"Unknown endpoint {self.path}"})
+            return
+
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            payload = json.loads(self.rfile.read(length) or b"{}")
+            queries = np.array(payload.get("embeddings") or [], dtype=np.float32)
+            keywords = [str(keyword) for keyword in payload.get("keywords") or []]
+            top_k = int(payload.get("top_k", 5))
+            if not 1 <= top_k <= self.MAX_TOP_K:
+                raise ValueError(f"Field 'top_k' must be between 1 and {self.MAX_TOP_K}")
+            aggregation = payload.get("aggregation")
+            if aggregation and aggregation not in TextIndex.AGGREGATIONS:
+                raise ValueError(f"Unknown aggregation '{aggregation}'")
+        except (ValueError, TypeError, AttributeError) as e:
+            self._send_json(HTTPStatus.BAD_REQUEST, {"error": f"Invalid request body: {e}"})
+            return
+
+        try:
+            self._send_json(HTTPStatus.OK, self._search(queries, keywords, top_k, aggregation))
+        except Exception as e:
+            self._send_json(HTTPStatus.INTERNAL_SERVER_ERROR, {"error": str(e)})
+
+    def _search(self, queries: np.ndarray, keywords: list[str], top_k: int, aggregation: str = None) -> dict:
+        """Local top_k semantic and keyword results of the shard."""
+        index = self.server.index
+
+        semantic_results = []
+        if len(queries) and index.chunk_count:
+            if aggregation:
+                positions, similarities, article_scores = index.search_chunks_by_article(queries, top_k, aggregation)
+            else:
+                positions, similarities = index.search_chunks(queries, top_k)
+                article_scores = None
+            for number, (position, similarity) in enumerate(zip(positions, similarities)):
+                result = index.chunk(position)
+                result['similarity'] = float(similarity)
+                if article_scores is not None:
+                    result['article_score'] = float(article_scores[number])
+                semantic_results.append(result)
+
+        keyword_results = []
+        for position, match_count, matched_keywords in index.search_articles(keywords, top_k) if keywords else []:
+            result = index.article(position)
+            result['match_count'] = match_count
+            result['matched_keywords'] = matched_keywords
+            keyword_results.append(result)
+
+        return {"semantic": semantic_results, "keyword": keyword_results}
+
+    def _send_json(self, status: HTTPStatus, body: dict):
+        """Serialize body to JSON and send it with the given status."""
+        content = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        """Do not log every search request of the query service."""
+
+
+class IndexShardServer:
+    """HTTP server owning one slice of the text index, queried by the text assistant with scatter-gather."""
+
+    def __init__(self, index: TextIndex, host: str = "127.0.0.1", port: int = 8100, listen_socket: socket.socket = None):
+        """
+        Initialize the IndexShardServer.
+
+        Args:
+            index: Slice of the text index owned by this shard
+            host: Host to bind the HTTP server to
+            port: Port to bind the HTTP server to
+            listen_socket: Already listening socket, host and port are ignored
+        """
+        if listen_socket:
+            self.server = ThreadingHTTPServer(listen_socket.getsockname(), IndexShardRequestHandler, bind_and_activate=False)
+            self.server.socket = listen_socket
+        else:
+            self.server = ThreadingHTTPServer((host, port), IndexShardRequestHandler)
+        self.server.daemon_threads = True
+        self.server.index = index
+
+    def watch_segments(self, config: Config, shard_number: int, shard_count: int):
+        """
+        Reload the slice of the shard when articles are added to or deleted from the text segments, in a background thread.
+
+        Args:
+            config: Application configuration the slice was loaded with
+            shard_number: Number of the shard
+            shard_count: Total number of shards
+        """
+        if not config.folder_text_segments:
+            return
+        store = TextSegmentStore(config.folder_text_segments)
+
+        def watch():
+            generation = store.read_manifest()['generation'] if store.exists() else None
+            while True:
+                time.sleep(config.segment_reload_interval)
+                try:
+                    if not store.exists() or store.read_manifest()['generation'] == generation:
+                        continue
+                    generation = store.read_manifest()['generation']
+                    # Searches in progress keep using the previous slice
+                    self.server.index = load_shard_index(config, shard_number, shard_count)
+                    print(f"Reloaded index shard with {self.server.index.article_count} articles")
+                except Exception as e:
+                    print(f"Error reloading index shard: {e}")
+
+        threading.Thread(target=watch, name="index-shard-segments", daemon=True).start()
+
+    def serve_forever(self):
+        """Serve search requests until interrupted."""
+        host, port = self.server.server_address[:2]
+        index = self.server.index
+        print(f"Index shard with {index.article_count} articles and {index.chunk_count} chunks listening on http://{host}:{port}")
+        try:
+            self.server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.server.server_close()
+
+
+def _serve_shard(config: Config, shard_number: int, shard_count: int, listen_socket: socket.socket):
+    """Entry point of a local shard process."""
+    server = IndexShardServer(load_shard_index(config, shard_number, shard_count), listen_socket=listen_socket)
+    server.watch_segments(config, shard_number, shard_count)
+    server.serve_forever()
+
+
+def start_local_shards(config: Config, shard_count: int, host: str = "127.0.0.1",
+                       startup_timeout: float = 120.0) -> tuple[list[str], list[multiprocessing.Process]]:
+    """
+    Start shard servers as local processes, standing in for index nodes on separate machines.
+    Sockets are bound before the processes start, so the shards get free ports without coordination.
+
+    Args:
+        config: Application configuration
+        shard_count: Number of shard processes
+        host: Host to bind the shard servers to
+        startup_timeout: Seconds to wait for all shards to load their slices
+
+    Returns:
+        Tuple of (shard URLs, shard processes)
+    """
+    has_segments = bool(config.folder_text_segments) and TextSegmentStore(config.folder_text_segments).exists()
+    if not has_segments and not TextQueryAssistant.binary_index_is_current(config):
+        # The binary index is saved once here instead of by every shard at the same time
+        TextQueryAssistant.load_index(config)
+
+    context = multiprocessing.get_context('spawn')
+    urls = []
+    processes = []
+    for shard_number in range(shard_count):
+        listen_socket = socket.create_server((host, 0))
+        urls.append(f"http://{host}:{listen_socket.getsockname()[1]}")
+        process = context.Process(target=_serve_shard, args=(config, shard_number, shard_count, listen_socket), daemon=True)
+        process.start()
+        # The child process has its own copy of the socket
+        listen_socket.close()
+        processes.append(process)
+
+    # Requests queue on the sockets until the shards have loaded their slices
+    deadline = time.monotonic() + startup_timeout
+    for url, process in zip(urls, processes):
+        try:
+            requests.get(f"{url}/health", timeout=max(0.1, deadline - time.monotonic())).raise_for_status()
+        except requests.RequestException as e:
+            print(f"❌ Index shard {url} did not start: {e}")
+
+    print(f"Started {shard_count} local index shards")
+    return urls, processes
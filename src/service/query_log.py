@@ -0,0 +1,82 @@
+import json
+import threading
+import time
+from pathlib import Path
+
+from src.models.recorded_client import decode_embedding, encode_embedding
+
+
+class QueryLog:
+    """
+    Compact JSONL log of answered questions for reproducing the workload.
+    Question lines hold the expanded queries, keywords, generated SQL, retrieved chunk ids, stage timings
+    and chat completion responses, query embeddings are written once per text on separate lines.
+    """
+
+    def __init__(self, path: Path):
+        """
+        Initialize the QueryLog.
+
+        Args:
+            path: Path to the JSONL log file, appended to if it exists
+        """
+        self.path = path
+        self.lock = threading.Lock()
+        self.logged_embeddings = None
+
+    def _append(self, record: dict):
+        """Append one line, the caller holds the lock."""
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n')
+
+    def add_embedding(self, model: str, text: str, embedding: list[float]):
+        """
+        Log a query embedding unless the same text is already logged.
+
+        Args:
+            model: Embeddings model name
+            text: Embedded text
+            embedding: Embedding vector
+        """
+        with self.lock:
+            if self.logged_embeddings is None:
+                self.logged_embeddings = set(self.read()[1])
+            if (model, text) in self.logged_embeddings:
+                return
+            self.logged_embeddings.add((model, text))
+            self._append({"type": "embedding", "model": model, "text": text, "embedding": encode_embedding(embedding)})
+
+    def add_question(self, record: dict):
+        """
+        Log an answered question.
+
+        Args:
+            record: Question, options, trace of the stages and recorded chat completions
+        """
+        with self.lock:
+            self._append({"type": "question", "time": round(time.time(), 3), **record})
+
+    def read(self) -> tuple[list[dict], dict[tuple[str, str], list[float]]]:
+        """
+        Read the log, skipping a line cut off by an interrupted write.
+
+        Returns:
+            Tuple of (question records in order, embeddings by (model, text))
+        """
+        questions = []
+        embeddings = {}
+        if not self.path.exists():
+            return questions, embeddings
+
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if record.get('type') == 'embedding':
+                    embeddings[(record['model'], record['text'])] = decode_embedding(record['embedding'])
+                elif record.get('type') == 'question':
+                    questions.append(record)
+
+        return questions, embeddings
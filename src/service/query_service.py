@@ -0,0 +1,262 @@
+import copy
+import json
+import multiprocessing
+import socket
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from src.assistants.query_assistant import QueryAssistant
+from src.config.config import Config
+
+
+class QueryRequestHandler(BaseHTTPRequestHandler):
+    """HTTP request handler exposing the query assistant as JSON endpoints."""
+
+    # Keep connections open between requests of the same client
+    protocol_version = "HTTP/1.1"
+    # Limits of the request fields
+    MAX_TOP_K = 100
+    MAX_PROFILED_QUESTIONS = 1000
+
+    def do_GET(self):
+        """Handle GET requests, only the health check is supported."""
+        if self.path == "/health":
+            health = self.server.query_service.health()
+            # Orchestration only routes traffic to, and keeps, a ready service
+            self._send_json(HTTPStatus.OK if health['status'] == "ok" else HTTPStatus.SERVICE_UNAVAILABLE, health)
+        else:
+            self._send_json(HTTPStatus.NOT_FOUND, {"error": f"Unknown endpoint {self.path}"})
+
+    def do_POST(self):
+        """Handle POST requests to /ask, /search and /profile."""
+        if self.path == "/profile":
+            self._profile()
+            return
+
+        routes = {
+            "/ask": self.server.query_service.ask,
+            "/search": self.server.query_service.search,
+        }
+        route = routes.get(self.path)
+        if not route:
+            self._send_json(HTTPStatus.NOT_FOUND, {"error": f"Unknown endpoint {self.path}"})
+            return
+
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            payload = json.loads(self.rfile.read(length) or b"{}")
+            question = str(payload.get("question", "")).strip()
+            top_k = self._int_field(payload, "top_k", 5, 1, self.MAX_TOP_K)
+            fast_mode = self._bool_field(payload, "fast")
+        except (ValueError, TypeError, AttributeError) as e:
+            self._send_json(HTTPStatus.BAD_REQUEST, {"error": f"Invalid request body: {e}"})
+            return
+
+        if not question:
+            self._send_json(HTTPStatus.BAD_REQUEST, {"error": "Field 'question' is required"})
+            return
+
+        try:
+            self._send_json(HTTPStatus.OK, route(question, top_k, fast_mode))
+        except Exception as e:
+            self._send_json(HTTPStatus.INTERNAL_SERVER_ERROR, {"error": str(e)})
+
+    def _profile(self):
+        """Profile the next questions of this process."""
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            questions = self._int_field(json.loads(self.rfile.read(length) or b"{}"), "questions", 1, 0, self.MAX_PROFILED_QUESTIONS)
+        except (ValueError, TypeError, AttributeError) as e:
+            self._send_json(HTTPStatus.BAD_REQUEST, {"error": f"Invalid request body: {e}"})
+            return
+
+        self.server.query_service.assistant.profiler.request(questions)
+        self._send_json(HTTPStatus.OK, {"profiled_questions": questions})
+
+    @staticmethod
+    def _int_field(payload: dict, name: str, default: int, minimum: int, maximum: int) -> int:
+        """Integer field of the request body, raising ValueError or TypeError if it is not a number in the range."""
+        value = int(payload.get(name, default))
+        if not minimum <= value <= maximum:
+            raise ValueError(f"Field '{name}' must be between {minimum} and {maximum}")
+        return value
+
+    @staticmethod
+    def _bool_field(payload: dict, name: str) -> bool:
+        """Optional boolean field of the request body, None if missing, raising ValueError if it is not a JSON boolean."""
+        value = payload.get(name)
+        if value is not None and not isinstance(value, bool):
+            raise ValueError(f"Field '{name}' must be true or false")
+        return value
+
+    def _send_json(self, status: HTTPStatus, body: dict):
+        """Serialize body to JSON and send it with the given status."""
+        content = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+
+class QueryService:
+    """Long-running HTTP service that answers questions from a single warm query assistant."""
+
+    def __init__(self, assistant: QueryAssistant, host: str = "127.0.0.1", port: int = 8000,
+                 listen_socket: socket.socket = None):
+        """
+        Initialize the QueryService.
+
+        Args:
+            assistant: Query assistant with loaded indexes, shared by all requests
+            host: Host to bind the HTTP server to
+            port: Port to bind the HTTP server to
+            listen_socket: Already listening socket shared with other worker processes, host and port are ignored
+        """
+        self.assistant = assistant
+        if listen_socket:
+            self.server = ThreadingHTTPServer(listen_socket.getsockname(), QueryRequestHandler, bind_and_activate=False)
+            self.server.socket = listen_socket
+        else:
+            self.server = ThreadingHTTPServer((host, port), QueryRequestHandler)
+        self.server.daemon_threads = True
+        self.server.query_service = self
+
+    def health(self) -> dict:
+        """
+        Report whether the assistant has finished starting up.
+
+        Returns:
+            JSON serializable dictionary with status 'ok', 'starting' or 'failed', startup timings in seconds
+            and the error of a failed startup
+        """
+        if self.assistant.startup_error:
+            return {
+                "status": "failed",
+                "error": str(self.assistant.startup_error),
+                "startup_timings": self.assistant.startup_timings
+            }
+        return {
+            "status": "ok" if self.assistant.is_ready else "starting",
+            "startup_timings": self.assistant.startup_timings
+        }
+
+    def ask(self, question: str, top_k: int = 5, fast_mode: bool = None) -> dict:
+        """
+        Answer a question with SQL and text search.
+
+        Args:
+            question: User's question
+            top_k: Number of top text search results to use
+            fast_mode: Whether to expand the question locally without API call
+
+        Returns:
+            JSON serializable dictionary with answer, debug sections and statistics
+        """
+        result = self.assistant.ask(question, top_k=top_k, fast_mode=fast_mode)
+        result['statistics'] = result['statistics'].to_dict()
+        return result
+
+    def search(self, question: str, top_k: int = 5, fast_mode: bool = None) -> dict:
+        """
+        Search articles without generating an answer.
+
+        Args:
+            question: User's question
+            top_k: Number of top results to return for each search method
+            fast_mode: Whether to expand the question locally without API call
+
+        Returns:
+            JSON serializable dictionary with semantic and keyword results and statistics
+        """
+        self.assistant.wait_until_ready()
+        semantic_results, keyword_results, query_debug, statistics = self.assistant.text_assistant.search(
+            question, top_k, fast_mode=fast_mode)
+
+        return {
+            "question": question,
+            "semantic_results": [{**result, 'similarity': float(result['similarity'])} for result in semantic_results],
+            "keyword_results": keyword_results,
+            "query_debug": "\n".join(query_debug),
+            "statistics": statistics.to_dict()
+        }
+
+    def serve_forever(self):
+        """Serve requests until interrupted, each request is handled in its own thread."""
+        host, port = self.server.server_address[:2]
+        print(f"\nQuery service listening on http://{host}:{port} (POST /ask, POST /search, GET /health)")
+        try:
+            self.server.serve_forever()
+        except KeyboardInterrupt:
+            print("\n\nShutting down query service 👋")
+        finally:
+            self.server.server_close()
+
+
+def _serve_worker(config: Config, listen_socket: socket.socket):
+    """Entry point of a worker process, serving requests from the shared listening socket."""
+    QueryService(QueryAssistant(config), listen_socket=listen_socket).serve_forever()
+
+
+def serve_with_workers(config: Config, host: str, port: int, workers: int):
+    """
+    Serve requests from several worker processes accepting connections on the same socket.
+    The data is prepared once by this process, which loads the text index without a query assistant and shares it:
+    the embeddings are placed in shared memory and the texts stay memory-mapped from files, so workers do not hold their own copy.
+    Workers search the index as loaded at the start, articles added or deleted later are served after a restart.
+
+    Args:
+        config: Application configuration
+        host: Host to bind the HTTP server to
+        port: Port to bind the HTTP server to
+        workers: Number of worker processes
+    """
+    from openai import OpenAI
+    from src.assistants.text_query_assistant import TextQueryAssistant
+    from src.models.rate_limiter import PRIORITY_BULK, RateLimiter
+
+    # Workers skip the data preparation instead of running it concurrently
+    client = RateLimiter(config.rate_limits, max_retries=config.api_max_retries).client(
+        OpenAI(api_key=config.open_ai_api_key, max_retries=0), PRIORITY_BULK)
+    QueryAssistant.prepare_data(config, client)
+    worker_config = copy.copy(config)
+    worker_config.prepare_data = False
+    shared_blocks = []
+
+    if config.text_local_shards:
+        # Workers search the index shard servers, local shards started by this process are shared by all workers
+        from src.service.index_shard_server import start_local_shards
+        worker_config.text_index_shards, _ = start_local_shards(config, config.text_local_shards)
+        worker_config.text_local_shards = 0
+    elif not config.text_index_shards:
+        index = TextQueryAssistant.load_index(config)
+        TextQueryAssistant.build_coarse(config, index)
+        # Texts of an index combined from segments are written once to files, the others are mapped from their own files
+        worker_config.text_shared_index = index.to_shared_memory(Path(config.folder_ready) / "text_index_shared")
+        shared_blocks = index.shared_blocks
+        shared_size = sum(block.size for block in shared_blocks)
+        print(f"Placed {shared_size / 1024 / 1024:.1f} MB of the text index in shared memory, "
+              f"texts are memory-mapped from {len(worker_config.text_shared_index.get('files', {}))} files")
+        # Release the private copy of the index, workers attach to the shared one
+        del index
+
+    listen_socket = socket.create_server((host, port), backlog=128)
+    print(f"\nQuery service listening on http://{host}:{port} with {workers} workers")
+
+    context = multiprocessing.get_context('spawn')
+    processes = [context.Process(target=_serve_worker, args=(worker_config, listen_socket), daemon=True) for _ in range(workers)]
+    try:
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        print("\n\nShutting down query service workers 👋")
+        for process in processes:
+            process.join(timeout=5)
+    finally:
+        listen_socket.close()
+        for block in shared_blocks:
+            block.close()
+            block.unlink()
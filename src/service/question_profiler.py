@@ -0,0 +1,147 @@
+import cProfile
+import io
+import itertools
+import pstats
+import threading
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable
+
+
+class QuestionProfiler:
+    """
+    Profiles the next questions on request with cProfile and tracemalloc, writing a report of the top functions
+    and allocation sites of each question. Until questions are requested only a counter is checked.
+
+    cProfile covers the thread answering the question, work in other threads such as hedged requests
+    or the speculative query expansion is not included. Allocations are tracked for the whole process,
+    so profiled questions are answered one at a time, and allocations of unprofiled questions answered concurrently
+    are included in the report, which states how many of them started during the profile.
+    """
+
+    def __init__(self, folder: Path, questions: int = 0, top_count: int = 30):
+        """
+        Initialize the QuestionProfiler.
+
+        Args:
+            folder: Folder for the reports, created when the first report is written
+            questions: Number of questions to profile from the start
+            top_count: Number of functions and allocation sites in each report
+        """
+        self.folder = folder
+        self.remaining = questions
+        self.top_count = top_count
+        self.lock = threading.Lock()
+        # tracemalloc and the profiler of the previous question must be stopped before the next one starts
+        self.profile_lock = threading.Lock()
+        self.numbers = itertools.count(1)
+        # Unprofiled questions started while a question is profiled, their allocations are traced too
+        self.profiling = False
+        self.concurrent = 0
+
+    def request(self, questions: int):
+        """
+        Profile the next questions, replacing an earlier request.
+
+        Args:
+            questions: Number of questions to profile, 0 to stop profiling
+        """
+        with self.lock:
+            self.remaining = max(0, questions)
+        print(f"Profiling the next {self.remaining} questions, reports are written to {self.folder}")
+
+    def _take(self) -> bool:
+        """Whether the next question is profiled, counting it."""
+        with self.lock:
+            if self.remaining <= 0:
+                return False
+            self.remaining -= 1
+            return True
+
+    def answer(self, question: str, answer: Callable[[], dict]) -> dict:
+        """
+        Answer a question, under the profilers if profiling is requested.
+
+        Args:
+            question: User's question, written to the report
+            answer: Function answering the question and returning the result of the query assistant
+
+        Returns:
+            Result of the answer function, with the report path in 'profile' if profiled
+        """
+        # Unlocked check, so questions are not slowed down while profiling is off
+        if not self.remaining or not self._take():
+            if self.profiling:
+                with self.lock:
+                    self.concurrent += 1
+            return answer()
+
+        with self.profile_lock:
+            profiler = cProfile.Profile()
+            with self.lock:
+                self.profiling = True
+                self.concurrent = 0
+            tracemalloc.start()
+            start_time = time.perf_counter()
+            result = None
+            error = None
+            profiler.enable()
+            try:
+                result = answer()
+            except Exception as e:
+                error = e
+            finally:
+                profiler.disable()
+                elapsed = time.perf_counter() - start_time
+                snapshot = tracemalloc.take_snapshot()
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                with self.lock:
+                    self.profiling = False
+                    concurrent = self.concurrent
+
+            path = self._write_report(question, elapsed, peak, concurrent, profiler, snapshot, result, error)
+            print(f"Profile of the question written to {path}")
+
+        if error:
+            raise error
+        result['profile'] = str(path)
+        return result
+
+    def _write_report(self, question: str, elapsed: float, peak: int, concurrent: int, profiler: cProfile.Profile,
+                      snapshot: tracemalloc.Snapshot, result: dict, error: Exception) -> Path:
+        """Write the text report and the raw profile, e.g. for snakeviz, returning the report path."""
+        self.folder.mkdir(parents=True, exist_ok=True)
+        path = self.folder / f"profile-{time.strftime('%Y%m%d-%H%M%S')}-{next(self.numbers)}.txt"
+        profiler.dump_stats(path.with_suffix('.prof'))
+
+        report = io.StringIO()
+        report.write(f"Question: {question}\n")
+        report.write(f"Answered in {elapsed:.3f}s, peak traced memory {peak / 1024 / 1024:.1f} MB\n")
+        report.write(f"Memory is traced for the whole process, allocations of questions answered concurrently are included, "
+                     f"{concurrent} other questions started during this profile\n")
+        if error:
+            report.write(f"Failed: {error}\n")
+        if result and result.get('trace'):
+            stages = ", ".join(f"{stage} {seconds * 1000:.1f}ms" for stage, seconds in result['trace']['timings'].items())
+            report.write(f"Stages: {stages}\n")
+
+        for title, sort in (("cumulative time", pstats.SortKey.CUMULATIVE), ("own time", pstats.SortKey.TIME)):
+            report.write(f"\n{'='*80}\nTOP FUNCTIONS BY {title.upper()}\n{'='*80}\n")
+            pstats.Stats(profiler, stream=report).strip_dirs().sort_stats(sort).print_stats(self.top_count)
+
+        # Allocations of the profilers themselves are left out
+        snapshot = snapshot.filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, cProfile.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ))
+        report.write(f"\n{'='*80}\nTOP ALLOCATION SITES STILL ALLOCATED AT THE END OF THE QUESTION\n{'='*80}\n")
+        for statistic in snapshot.statistics('lineno')[:self.top_count]:
+            frame = statistic.traceback[0]
+            report.write(f"{statistic.size / 1024:>10.1f} KB {statistic.count:>8} blocks  {frame.filename}:{frame.lineno}\n")
+
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(report.getvalue())
+        return path
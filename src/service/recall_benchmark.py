@@ -0,0 +1,236 @@
+import copy
+import json
+import os
+import platform
+import statistics
+import time
+from pathlib import Path
+
+import numpy as np
+
+from src.assistants.text_query_assistant import TextQueryAssistant
+from src.config.config import Config
+from src.models.recorded_client import decode_embedding, encode_embedding
+from src.service.batch_runner import BatchRunner
+
+
+class RecallBenchmark:
+    """
+    Recall and latency of the approximate semantic search settings, measured against the exact search of the same chunks.
+    Each question is searched with its own embedding, the embeddings are cached in a file, so only new questions
+    make API calls. The coarse embeddings are rebuilt on the loaded index for every setting.
+    """
+
+    # Settings of the coarse search swept for each chunk strategy, dimensions not below the embedding size are skipped
+    COARSE_METHODS = ('truncate', 'pca')
+    COARSE_DIMENSIONS = (64, 128, 256, 512)
+    COARSE_QUANTIZATIONS = (None, 'int8')
+    COARSE_CANDIDATES = (50, 100, 200, 500, 1000)
+    EMBEDDINGS_BATCH_SIZE = 100
+
+    def __init__(self, config: Config, questions_path: Path, top_k: int = 10, min_recall: float = 0.95, cache_path: Path = None):
+        """
+        Initialize the RecallBenchmark.
+
+        Args:
+            config: Application configuration with the prepared articles
+            questions_path: JSONL or CSV file with a 'question' field, as read by the batch mode
+            top_k: Number of results compared with the exact search
+            min_recall: Recall the fastest recommended setting has to reach
+            cache_path: JSONL file of the cached question embeddings, defaults to question_embeddings.jsonl in the ready folder
+        """
+        self.config = config
+        self.questions_path = questions_path
+        self.top_k = top_k
+        self.min_recall = min_recall
+        self.cache_path = cache_path or Path(config.folder_ready) / "question_embeddings.jsonl"
+
+    def _embeddings(self, questions: list[str]) -> np.ndarray:
+        """Normalized embeddings of the questions, the ones missing from the cache are generated and appended to it."""
+        model = self.config.model_embeddings.model_name
+        cached = {}
+        if self.cache_path.exists():
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    if record.get('model') == model:
+                        cached[record['text']] = decode_embedding(record['embedding'])
+
+        missing = list(dict.fromkeys(question for question in questions if question not in cached))
+        if missing:
+            from openai import OpenAI
+            client = OpenAI(api_key=self.config.open_ai_api_key)
+            print(f"⏳ Embedding {len(missing)} questions, {len(questions) - len(missing)} are cached")
+            with open(self.cache_path, 'a', encoding='utf-8') as f:
+                for start in range(0, len(missing), self.EMBEDDINGS_BATCH_SIZE):
+                    batch = missing[start:start + self.EMBEDDINGS_BATCH_SIZE]
+                    response = client.embeddings.create(model=model, input=batch)
+                    for question, item in zip(batch, response.data):
+                        cached[question] = item.embedding
+                        f.write(json.dumps({"model": model, "text": question,
+                                            "embedding": encode_embedding(item.embedding)}, ensure_ascii=False) + "\n")
+
+        queries = np.array([cached[question] for question in questions], dtype=np.float32)
+        queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+        return queries
+
+    def _assistant(self, use_sentence_chunks: bool) -> TextQueryAssistant:
+        """Text assistant searching the local index exactly, without API, shards or aggregation."""
+        config = copy.copy(self.config)
+        config.text_index_shards = []
+        config.text_local_shards = 0
+        config.text_shared_index = None
+        config.embeddings_batch_wait = None
+        config.speculative_retrieval = False
+        config.semantic_search_shards = 1
+        config.semantic_aggregation = None
+        config.coarse_dimensions = None
+        config.file_articles_idf = None
+        if use_sentence_chunks:
+            # The text segments and the binary index hold the length chunks, sentence chunks get their own binary index
+            config.folder_text_segments = None
+            config.folder_text_index = Path(config.folder_ready) / "text_index_sentences"
+        return TextQueryAssistant(None, config, use_sentence_chunks=use_sentence_chunks)
+
+    def _measure(self, assistant: TextQueryAssistant, queries: np.ndarray, candidates: int = None) -> tuple[list[list], dict]:
+        """Search every question, returning the (article id, chunk text) of the results of each and the latency percentiles."""
+        def search(number):
+            return assistant.semantic_search([], self.top_k, candidates, queries=queries[number:number + 1])
+
+        # The first searches warm up caches and memory-mapped pages
+        for number in range(min(3, len(queries))):
+            search(number)
+        results = []
+        latencies = []
+        for number in range(len(queries)):
+            start_time = time.perf_counter()
+            chunks = search(number)
+            latencies.append(time.perf_counter() - start_time)
+            results.append([(chunk['id'], chunk['text']) for chunk in chunks])
+
+        latencies.sort()
+        return results, {
+            "median_ms": round(statistics.median(latencies) * 1000, 3),
+            "p95_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000, 3),
+        }
+
+    @staticmethod
+    def _recall(results: list[list], truth: list[list]) -> float:
+        """Mean share of the ground truth results found, per question."""
+        return round(statistics.mean(len(set(found) & set(expected)) / len(expected) if expected else 1.0
+                                     for found, expected in zip(results, truth)), 4)
+
+    def _measurement(self, assistant: TextQueryAssistant, results: list[list], latencies: dict, truth: list[list],
+                     article_truth: list[set], settings: dict, candidates: int = None) -> dict:
+        """Recall, latency and memory of the results of the current index settings."""
+        return {
+            **settings,
+            "candidates": candidates or None,
+            "recall": self._recall(results, truth),
+            "article_recall": self._recall([{article for article, _ in found} for found in results], article_truth),
+            **latencies,
+            "resident_index_mb": round(assistant.index.resident_nbytes / 1024 / 1024, 1),
+            "coarse_mb": round(assistant.index.coarse_nbytes / 1024 / 1024, 2),
+        }
+
+    def _sweep(self, assistant: TextQueryAssistant, queries: np.ndarray, article_truth: list[set] = None) -> tuple[list[dict], list[set]]:
+        """
+        Measure the exact search and every coarse search setting of one chunk strategy.
+
+        Args:
+            assistant: Text assistant with the loaded index of the chunk strategy
+            queries: Normalized question embeddings, one row per question
+            article_truth: Articles of the exact results of the reference chunk strategy, None if this is the reference
+
+        Returns:
+            Tuple of (measurements, articles of the exact results)
+        """
+        index = assistant.index
+        exact, latencies = self._measure(assistant, queries, candidates=0)
+        article_truth = article_truth or [{article for article, _ in found} for found in exact]
+
+        measurements = [self._measurement(assistant, exact, latencies, exact, article_truth, {"method": "exact"})]
+        dimensions = index.embeddings.shape[1]
+        for method in self.COARSE_METHODS:
+            for coarse_dimensions in (value for value in self.COARSE_DIMENSIONS if value < dimensions):
+                for quantization in self.COARSE_QUANTIZATIONS:
+                    start_time = time.time()
+                    index.build_coarse(coarse_dimensions, method, quantization=quantization)
+                    settings = {"method": method, "dimensions": coarse_dimensions, "quantization": quantization or "float32",
+                                "build_s": round(time.time() - start_time, 3)}
+                    for candidates in (value for value in self.COARSE_CANDIDATES if self.top_k <= value < index.chunk_count):
+                        results, latencies = self._measure(assistant, queries, candidates)
+                        measurements.append(self._measurement(assistant, results, latencies, exact, article_truth, settings, candidates))
+                    print(f"Measured {method} {coarse_dimensions} {settings['quantization']}")
+        return measurements, article_truth
+
+    def run(self, report_path: Path = None) -> dict:
+        """
+        Measure the exact and approximate search of the length chunks, and of the sentence chunks if they are prepared.
+        Article recall of both strategies is measured against the articles of the exact search of the length chunks.
+
+        Args:
+            report_path: Path of the JSON report to write (None to only print it)
+
+        Returns:
+            Report with the measurements of every chunk strategy and setting
+        """
+        questions = [item['question'] for item in BatchRunner.read_questions(self.questions_path)]
+        if not questions:
+            print("No questions to evaluate")
+            return {}
+        queries = self._embeddings(questions)
+
+        report = {
+            "environment": {"python": platform.python_version(), "numpy": np.__version__, "cpus": os.cpu_count(),
+                            "machine": platform.machine()},
+            "questions": len(questions),
+            "top_k": self.top_k,
+            "strategies": {}
+        }
+        assistant = self._assistant(use_sentence_chunks=False)
+        measurements, article_truth = self._sweep(assistant, queries)
+        report["strategies"]["length chunks"] = {"chunks": assistant.index.chunk_count, "measurements": measurements}
+        del assistant
+
+        if Path(self.config.file_articles_sentences).exists():
+            assistant = self._assistant(use_sentence_chunks=True)
+            measurements, _ = self._sweep(assistant, queries, article_truth)
+            report["strategies"]["sentence chunks"] = {"chunks": assistant.index.chunk_count, "measurements": measurements}
+            del assistant
+        else:
+            print(f"Sentence chunks are not prepared, {self.config.file_articles_sentences} is not evaluated")
+
+        self.print_report(report, self.min_recall)
+        if report_path:
+            with open(report_path, 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+            print(f"Recall report written to {report_path}")
+        return report
+
+    @staticmethod
+    def print_report(report: dict, min_recall: float = 0.95):
+        """Print recall, latency and memory of every setting, and the fastest setting reaching the minimum recall."""
+        print("\n" + "="*116)
+        print(f"RECALL BENCHMARK ({report['questions']} questions, top {report['top_k']})")
+        print("="*116)
+        for strategy, result in report['strategies'].items():
+            print(f"\n{strategy} ({result['chunks']} chunks)")
+            print(f"{'Setting':<38} {'recall':>8} {'articles':>9} {'median ms':>10} {'p95 ms':>10} {'index MB':>10} {'coarse MB':>10}")
+            fastest = None
+            for measurement in result['measurements']:
+                setting = measurement['method']
+                if measurement.get('candidates'):
+                    setting = (f"{setting} {measurement['dimensions']} {measurement['quantization']} "
+                               f"{measurement['candidates']} candidates")
+                print(f"{setting:<38} {measurement['recall']:>8.3f} {measurement['article_recall']:>9.3f} "
+                      f"{measurement['median_ms']:>10.3f} {measurement['p95_ms']:>10.3f} {measurement['resident_index_mb']:>10.1f} "
+                      f"{measurement['coarse_mb']:>10.2f}")
+                if measurement['recall'] >= min_recall and (not fastest or measurement['median_ms'] < fastest[1]['median_ms']):
+                    fastest = (setting, measurement)
+            if fastest:
+                print(f"Fastest with recall of at least {min_recall}: {fastest[0]}")
+        print("="*116)
@@ -0,0 +1,390 @@
+import copy
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import statistics
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+from src.assistants.text_index import TextIndex, TextStore
+from src.assistants.text_segment_store import TextSegmentStore
+from src.config.config import Config
+
+
+# Search settings compared by the benchmark, applied on top of the configuration
+SEARCH_MODES = {
+    "exact": {},
+    "shards": {"semantic_search_shards": os.cpu_count() or 1},
+    "aggregation max": {"semantic_aggregation": "max"},
+    "aggregation sum": {"semantic_aggregation": "sum"},
+    "coarse truncate": {"coarse_method": "truncate"},
+    "coarse pca": {"coarse_method": "pca"},
+    "coarse int8": {"coarse_method": "truncate", "coarse_quantization": "int8"},
+    "keyword": {},
+}
+
+
+def _peak_rss_mb() -> float:
+    """Peak resident memory of the current process in MB."""
+    # The high-water mark of the process memory, unlike ru_maxrss it does not include the parent's before the fork
+    try:
+        with open('/proc/self/status', 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _measure(config: Config, mode: str, queries: list[np.ndarray], keywords: list[list[str]],
+             top_k: int) -> dict:
+    """
+    Load the index with the text assistant in a fresh process and time the searches of one mode.
+
+    Args:
+        config: Configuration pointing at the synthetic corpus, with the settings of the mode
+        mode: Load path or search mode being measured
+        queries: Normalized embeddings of the query versions of each query, empty to measure only the load
+        keywords: Keywords of each query for the keyword search
+        top_k: Number of results per search
+
+    Returns:
+        Load time, peak memory and search latencies
+    """
+    from src.assistants.text_query_assistant import TextQueryAssistant
+
+    start_time = time.perf_counter()
+    assistant = TextQueryAssistant(None, config, use_sentence_chunks=False)
+    result = {
+        "load_s": round(time.perf_counter() - start_time, 3),
+        "chunks": assistant.index.chunk_count,
+        "index_mb": round(assistant.index.nbytes / 1024 / 1024, 1),
+        "resident_index_mb": round(assistant.index.resident_nbytes / 1024 / 1024, 1),
+    }
+
+    if queries:
+        def search(number):
+            if mode == "keyword":
+                return assistant.keyword_search(keywords[number], top_k)
+            return assistant.semantic_search([], top_k, queries=queries[number])
+
+        # The first searches warm up caches and memory-mapped pages
+        for number in range(min(3, len(queries))):
+            search(number)
+        latencies = []
+        for number in range(len(queries)):
+            search_start = time.perf_counter()
+            search(number)
+            latencies.append(time.perf_counter() - search_start)
+        latencies.sort()
+        result.update({
+            "queries": len(latencies),
+            "median_ms": round(statistics.median(latencies) * 1000, 3),
+            "p95_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000, 3),
+            "mean_ms": round(statistics.mean(latencies) * 1000, 3),
+        })
+
+    result["peak_rss_mb"] = round(_peak_rss_mb(), 1)
+    return result
+
+
+class _TextStoreWriter:
+    """Texts appended block by block to a buffer file and a memory-mapped offsets table, so the store can be larger than the memory."""
+
+    def __init__(self, path: Path, count: int):
+        """
+        Initialize the _TextStoreWriter.
+
+        Args:
+            path: Path of the buffer file, the offsets are written next to it
+            count: Number of texts that will be added
+        """
+        self.path = path
+        self.file = open(path, 'wb')
+        self.offsets = np.lib.format.open_memmap(path.with_suffix('.offsets.npy'), mode='w+', dtype=np.int64, shape=(count + 1,))
+        self.count = 0
+
+    def add(self, texts: list[str]):
+        """Append the texts to the store."""
+        encoded = [text.encode('utf-8') for text in texts]
+        self.offsets[self.count + 1:self.count + 1 + len(encoded)] = self.offsets[self.count] + np.cumsum([len(item) for item in encoded])
+        self.file.write(b''.join(encoded))
+        self.count += len(encoded)
+
+    def close(self) -> TextStore:
+        """Finish writing and return the store with the buffer memory-mapped."""
+        self.file.close()
+        return TextStore(np.memmap(self.path, dtype=np.uint8, mode='r'), self.offsets)
+
+
+class SearchBenchmark:
+    """
+    Offline benchmark of the text assistant on synthetic corpora of configurable size.
+    Corpora of random unit embeddings and generated texts are written in the prepared data formats,
+    then every load path and search mode is measured in a fresh process, so the peak memory of each is separate.
+    No API calls are made: query embeddings are perturbed chunk embeddings and keywords are drawn from the vocabulary.
+    """
+
+    # Words per chunk and chunks per article of the generated texts
+    CHUNK_WORDS = 40
+    ARTICLE_CHUNKS = 8
+    VOCABULARY_SIZE = 20000
+    # Query versions per query, as produced by the query expansion
+    QUERY_VERSIONS = 4
+
+    def __init__(self, config: Config, folder: Path, dimensions: int = 1536, queries: int = 50, top_k: int = 5,
+                 json_limit: int = 20000, seed: int = 0):
+        """
+        Initialize the SearchBenchmark.
+
+        Args:
+            config: Application configuration, its search settings are the baseline of every mode
+            folder: Folder for the generated corpora, reused by later runs with the same size and dimensions
+            dimensions: Number of embedding dimensions
+            queries: Number of timed queries per mode
+            top_k: Number of results per search
+            json_limit: Largest corpus in chunks also written as JSON, larger ones are only loaded from text segments
+            seed: Random seed of the corpus and the queries
+        """
+        self.config = config
+        self.folder = folder
+        self.dimensions = dimensions
+        self.queries = queries
+        self.top_k = top_k
+        self.json_limit = json_limit
+        self.seed = seed
+
+    def _vocabulary(self) -> np.ndarray:
+        """Generated words, drawn with a Zipf distribution like natural text."""
+        rng = np.random.default_rng(self.seed)
+        letters = np.array(list("abcdefghijklmnopqrstuvwxyz"))
+        return np.array([''.join(rng.choice(letters, rng.integers(3, 11))) for _ in range(self.VOCABULARY_SIZE)])
+
+    def _word_ids(self, rng: np.random.Generator, count: int) -> np.ndarray:
+        """Vocabulary positions of generated words, frequent words first."""
+        return np.minimum(rng.zipf(1.3, count) - 1, self.VOCABULARY_SIZE - 1)
+
+    def generate(self, chunk_count: int) -> Path:
+        """
+        Generate a corpus as text segments, and as JSON files if it is not larger than the JSON limit.
+        An existing corpus is reused if it was generated with the same seed and JSON limit.
+
+        Args:
+            chunk_count: Number of chunks
+
+        Returns:
+            Folder of the corpus
+        """
+        corpus = self.folder / f"{chunk_count}x{self.dimensions}"
+        try:
+            with open(corpus / "corpus.json", 'r', encoding='utf-8') as f:
+                existing = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            existing = None
+        if existing:
+            if existing.get('seed') == self.seed and existing.get('json') == (chunk_count <= self.json_limit):
+                return corpus
+            print(f"Corpus of {chunk_count} chunks was generated with other settings, generating it again")
+
+        start_time = time.time()
+        shutil.rmtree(corpus, ignore_errors=True)
+        corpus.mkdir(parents=True)
+        rng = np.random.default_rng(self.seed + chunk_count)
+        vocabulary = self._vocabulary()
+
+        # Embeddings are written in blocks to a memory-mapped file, so the corpus can be larger than the memory
+        embeddings = np.lib.format.open_memmap(corpus / "embeddings.tmp.npy", mode='w+', dtype=np.float32,
+                                               shape=(chunk_count, self.dimensions))
+        block_size = max(1, 2 ** 24 // self.dimensions)
+        for start in range(0, chunk_count, block_size):
+            block = rng.standard_normal((min(block_size, chunk_count - start), self.dimensions), dtype=np.float32)
+            embeddings[start:start + len(block)] = block / np.linalg.norm(block, axis=1, keepdims=True)
+        embeddings.flush()
+
+        # Texts are written block by block straight into the buffer files of the text stores, an article is the text of its chunks
+        article_count = -(-chunk_count // self.ARTICLE_CHUNKS)
+        chunk_articles = (np.arange(chunk_count) // self.ARTICLE_CHUNKS).astype(np.int32)
+        writers = {name: _TextStoreWriter(corpus / f"{name}.tmp.bin", chunk_count if name == "chunk_texts" else article_count)
+                   for name in ("chunk_texts", "article_ids", "article_titles", "article_texts")}
+        block_size = 100000 - 100000 % self.ARTICLE_CHUNKS
+        for start in range(0, chunk_count, block_size):
+            count = min(block_size, chunk_count - start)
+            words = vocabulary[self._word_ids(rng, count * self.CHUNK_WORDS)].reshape(count, self.CHUNK_WORDS)
+            chunk_texts = [' '.join(row) for row in words]
+            writers["chunk_texts"].add(chunk_texts)
+            first_article = start // self.ARTICLE_CHUNKS
+            numbers = range(first_article, first_article + -(-count // self.ARTICLE_CHUNKS))
+            writers["article_ids"].add([f"synthetic-{number}" for number in numbers])
+            writers["article_titles"].add([f"Synthetic article {number}" for number in numbers])
+            writers["article_texts"].add([' '.join(chunk_texts[offset:offset + self.ARTICLE_CHUNKS])
+                                          for offset in range(0, count, self.ARTICLE_CHUNKS)])
+        stores = {name: writer.close() for name, writer in writers.items()}
+
+        if chunk_count <= self.json_limit:
+            with open(corpus / "articles_raw.json", 'w', encoding='utf-8') as f:
+                json.dump([{"id": stores["article_ids"][number], "title": stores["article_titles"][number],
+                            "text": stores["article_texts"][number]} for number in range(article_count)], f, ensure_ascii=False)
+            # Chunk records are written one by one, in the format of the text data preparator
+            with open(corpus / "chunks.json", 'w', encoding='utf-8') as f:
+                f.write('[')
+                for position, text in enumerate(stores["chunk_texts"]):
+                    article = int(chunk_articles[position])
+                    record = {"chunk_id": position, "article_id": stores["article_ids"][article],
+                              "article_title": stores["article_titles"][article],
+                              "chunk_index": position % self.ARTICLE_CHUNKS, "text": text,
+                              "embedding": embeddings[position].tolist()}
+                    f.write((',' if position else '') + json.dumps(record, ensure_ascii=False))
+                f.write(']')
+
+        index = TextIndex(embeddings, chunk_articles, stores["chunk_texts"], stores["article_ids"], stores["article_titles"],
+                          stores["article_texts"])
+        TextSegmentStore(corpus / "segments").add(index)
+        del index, embeddings, stores, writers
+        for path in corpus.glob("*.tmp.*"):
+            path.unlink()
+
+        with open(corpus / "corpus.json", 'w', encoding='utf-8') as f:
+            json.dump({"chunks": chunk_count, "articles": article_count, "dimensions": self.dimensions,
+                       "json": chunk_count <= self.json_limit, "seed": self.seed}, f, indent=2)
+        print(f"Generated corpus of {chunk_count} chunks in {time.time() - start_time:.2f}s")
+        return corpus
+
+    def _queries(self, corpus: Path) -> tuple[list[np.ndarray], list[list[str]]]:
+        """Query versions near random chunks of the corpus, and keywords drawn from the vocabulary."""
+        rng = np.random.default_rng(self.seed + 1)
+        store = TextSegmentStore(corpus / "segments")
+        # Only the embeddings of the chosen chunks are read
+        embeddings = np.load(store.folder / store.read_manifest()['segments'][0]['name'] / "embeddings.npy", mmap_mode='r')
+        positions = rng.choice(len(embeddings), self.queries, replace=len(embeddings) < self.queries)
+        queries = []
+        for position in positions:
+            versions = embeddings[position] + rng.standard_normal((self.QUERY_VERSIONS, self.dimensions), dtype=np.float32) * 0.05
+            queries.append(versions / np.linalg.norm(versions, axis=1, keepdims=True))
+        # Keywords of medium frequency, neither stop words nor absent from the corpus
+        vocabulary = self._vocabulary()
+        keywords = [list(rng.choice(vocabulary[50:1050], 3, replace=False)) for _ in range(self.queries)]
+        return queries, keywords
+
+    def _config(self, corpus: Path, settings: dict, segments: bool, text_index: Path = None) -> Config:
+        """Configuration of the assistant loading the corpus, without API, keyword statistics or index shards."""
+        config = copy.copy(self.config)
+        config.file_articles_length = corpus / "chunks.json"
+        config.file_articles_raw = corpus / "articles_raw.json"
+        config.folder_text_segments = corpus / "segments" if segments else None
+        config.folder_text_index = text_index
+        config.file_articles_idf = None
+        config.text_index_shards = []
+        config.text_local_shards = 0
+        config.text_shared_index = None
+        config.embeddings_batch_wait = None
+        config.speculative_retrieval = False
+        config.semantic_search_shards = 1
+        config.semantic_aggregation = None
+        config.coarse_dimensions = None
+        config.coarse_quantization = None
+        for name, value in settings.items():
+            setattr(config, name, value)
+        if settings.get('coarse_method'):
+            config.coarse_dimensions = self.config.coarse_dimensions or max(32, self.dimensions // 6)
+        return config
+
+    def _run_process(self, config: Config, mode: str, queries: list[np.ndarray], keywords: list[list[str]]) -> dict:
+        """Measure in a fresh process, reporting a failure instead of stopping the benchmark."""
+        context = multiprocessing.get_context('spawn')
+        try:
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                return executor.submit(_measure, config, mode, queries, keywords, self.top_k).result()
+        except Exception as e:
+            print(f"❌ {mode} failed: {e}")
+            return {"error": str(e)}
+
+    def run(self, sizes: list[int], report_path: Path = None, baseline_path: Path = None) -> dict:
+        """
+        Generate the corpora and measure every load path and search mode.
+
+        Args:
+            sizes: Corpus sizes in chunks
+            report_path: Path of the JSON report to write (None to only print it)
+            baseline_path: Report of an earlier run to compare with
+
+        Returns:
+            Report with the load and search measurements of every corpus
+        """
+        report = {
+            "environment": {"python": platform.python_version(), "numpy": np.__version__, "cpus": os.cpu_count(),
+                            "machine": platform.machine()},
+            "dimensions": self.dimensions,
+            "queries": self.queries,
+            "top_k": self.top_k,
+            "corpora": {}
+        }
+        for size in sizes:
+            corpus = self.generate(size)
+            queries, keywords = self._queries(corpus)
+            with open(corpus / "corpus.json", 'r', encoding='utf-8') as f:
+                has_json = json.load(f)['json']
+
+            loads = {}
+            if has_json:
+                # First start parses the JSON and saves the binary index, later starts load the binary index
+                text_index = corpus / "text_index"
+                shutil.rmtree(text_index, ignore_errors=True)
+                loads["json"] = self._run_process(self._config(corpus, {}, False, text_index), "json", [], [])
+                loads["binary index"] = self._run_process(self._config(corpus, {}, False, text_index), "binary index", [], [])
+            loads["segments"] = self._run_process(self._config(corpus, {}, True), "segments", [], [])
+
+            searches = {}
+            for mode, settings in SEARCH_MODES.items():
+                if mode == "shards" and settings['semantic_search_shards'] < 2:
+                    continue
+                searches[mode] = self._run_process(self._config(corpus, settings, True), mode, queries, keywords)
+
+            report["corpora"][str(size)] = {"loads": loads, "searches": searches}
+
+        baseline = None
+        if baseline_path:
+            with open(baseline_path, 'r', encoding='utf-8') as f:
+                baseline = json.load(f)
+
+        self.print_report(report, baseline)
+        if report_path:
+            with open(report_path, 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+            print(f"Benchmark report written to {report_path}")
+        return report
+
+    @staticmethod
+    def print_report(report: dict, baseline: dict = None):
+        """Print the load and search measurements, with the change of the median latency against a baseline."""
+        print("\n" + "="*96)
+        print(f"SEARCH BENCHMARK ({report['dimensions']} dimensions, {report['queries']} queries, top {report['top_k']})")
+        print("="*96)
+        for size, corpus in report['corpora'].items():
+            reference = (baseline or {}).get('corpora', {}).get(size, {})
+            print(f"\n{size} chunks")
+            print(f"{'Load':<18} {'seconds':>10} {'index MB':>10} {'resident MB':>12} {'peak RSS MB':>12}")
+            for mode, result in corpus['loads'].items():
+                if 'error' in result:
+                    print(f"{mode:<18} failed: {result['error']}")
+                    continue
+                print(f"{mode:<18} {result['load_s']:>10.2f} {result['index_mb']:>10.1f} {result['resident_index_mb']:>12.1f} "
+                      f"{result['peak_rss_mb']:>12.1f}")
+            print(f"{'Search':<18} {'median ms':>10} {'p95 ms':>10} {'setup s':>12} {'peak RSS MB':>12} {'change':>10}")
+            for mode, result in corpus['searches'].items():
+                if 'error' in result:
+                    print(f"{mode:<18} failed: {result['error']}")
+                    continue
+                line = (f"{mode:<18} {result['median_ms']:>10.3f} {result['p95_ms']:>10.3f} {result['load_s']:>12.2f} "
+                        f"{result['peak_rss_mb']:>12.1f}")
+                previous = reference.get('searches', {}).get(mode, {}).get('median_ms')
+                if previous:
+                    line += f" {(result['median_ms'] - previous) / previous * 100:>+9.1f}%"
+                print(line)
+        print("="*96)
@@ -0,0 +1,130 @@
+import copy
+import json
+import statistics
+import time
+from pathlib import Path
+
+from src.assistants.query_assistant import QueryAssistant
+from src.config.config import Config
+from src.models.recorded_client import ReplayClient
+from src.service.query_log import QueryLog
+
+
+class WorkloadReplay:
+    """
+    Re-runs the questions of a query log against the current code, answering API calls with the recorded responses.
+    With API latency removed the stage timings measure only the local work, so reports of runs
+    before and after a change can be compared as a performance regression gate.
+    """
+
+    def __init__(self, config: Config, query_log_path: Path, repeats: int = 1):
+        """
+        Initialize the WorkloadReplay.
+
+        Args:
+            config: Application configuration including models and paths
+            query_log_path: Path to the query log with the recorded workload
+            repeats: Number of times the workload is replayed, timings of all runs are combined
+        """
+        self.config = config
+        self.query_log_path = query_log_path
+        self.repeats = repeats
+
+    @staticmethod
+    def _summarize(samples: list[float]) -> dict:
+        """Median, 95th percentile and total of stage timings in milliseconds."""
+        ordered = sorted(samples)
+        return {
+            "count": len(ordered),
+            "median_ms": round(statistics.median(ordered) * 1000, 3),
+            "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 3),
+            "total_ms": round(sum(ordered) * 1000, 3)
+        }
+
+    def run(self, report_path: Path = None, baseline_path: Path = None) -> dict:
+        """
+        Replay the logged questions in order and report the stage timings.
+
+        Args:
+            report_path: Path of the JSON report to write (None to only print it)
+            baseline_path: Report of an earlier replay to compare the timings with
+
+        Returns:
+            Report with stage timings, changed outputs and how the recorded responses were matched
+        """
+        questions, embeddings = QueryLog(self.query_log_path).read()
+        if not questions:
+            raise RuntimeError(f"No questions in query log {self.query_log_path}")
+
+        completions = {call['key']: call for question in questions for call in question.get('llm', [])}
+        client = ReplayClient(completions, embeddings)
+
+        # Replayed questions are not logged again and load before the first question is timed
+        config = copy.copy(self.config)
+        config.file_query_log = None
+        config.background_startup = False
+        assistant = QueryAssistant(config, openai_client=client)
+
+        stage_samples = {}
+        changed = {"sql_queries": 0, "chunks": 0, "keyword_articles": 0}
+        start_time = time.time()
+        for run in range(self.repeats):
+            for record in questions:
+                client.begin_question(record.get('llm', []))
+                trace = assistant.ask(record['question'], top_k=record.get('top_k', 5), fast_mode=record.get('fast_mode'))['trace']
+                for stage, seconds in trace['timings'].items():
+                    stage_samples.setdefault(stage, []).append(seconds)
+                if run == 0:
+                    for field in changed:
+                        if trace.get(field) != record['trace'].get(field):
+                            changed[field] += 1
+
+        recorded_samples = {}
+        for record in questions:
+            for stage, seconds in record['trace']['timings'].items():
+                recorded_samples.setdefault(stage, []).append(seconds)
+
+        report = {
+            "query_log": str(self.query_log_path),
+            "questions": len(questions),
+            "repeats": self.repeats,
+            "elapsed_s": round(time.time() - start_time, 3),
+            "stages": {stage: self._summarize(samples) for stage, samples in stage_samples.items()},
+            "recorded_stages": {stage: self._summarize(samples) for stage, samples in recorded_samples.items()},
+            "changed_outputs": changed,
+            "responses": dict(client.matches)
+        }
+        baseline = None
+        if baseline_path:
+            with open(baseline_path, 'r', encoding='utf-8') as f:
+                baseline = json.load(f)
+
+        self.print_report(report, baseline)
+        if report_path:
+            with open(report_path, 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+            print(f"Replay report written to {report_path}")
+        return report
+
+    @staticmethod
+    def print_report(report: dict, baseline: dict = None):
+        """Print the replayed stage timings, compared with the recorded ones or a baseline replay."""
+        reference = baseline['stages'] if baseline else report['recorded_stages']
+        reference_name = "baseline" if baseline else "recorded"
+
+        print("\n" + "="*80)
+        print(f"WORKLOAD REPLAY ({report['questions']} questions x {report['repeats']})")
+        print("="*80)
+        print(f"{'Stage':<20} {'median ms':>12} {'p95 ms':>12} {reference_name + ' median':>18} {'change':>10}")
+        for stage, summary in report['stages'].items():
+            line = f"{stage:<20} {summary['median_ms']:>12.3f} {summary['p95_ms']:>12.3f}"
+            if stage in reference:
+                previous = reference[stage]['median_ms']
+                change = f"{(summary['median_ms'] - previous) / previous * 100:+.1f}%" if previous else ""
+                line += f" {previous:>18.3f} {change:>10}"
+            print(line)
+        print("="*80)
+
+        changed = ", ".join(f"{field} {count}" for field, count in report['changed_outputs'].items() if count)
+        print(f"Questions with changed outputs: {changed or 'none'}")
+        print(f"Recorded responses: {', '.join(f'{match} {count}' for match, count in report['responses'].items())}")